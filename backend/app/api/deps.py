@@ -1,21 +1,18 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import JWTError
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.models.user import User
-from app.core.rbac import has_permission, has_any_permission, has_role
+from app.core.rbac import get_permission_snapshot
+from app.core.principal import AuthenticatedPrincipal, get_principal
+from app.core.token_service import token_service
 
 security = HTTPBearer(auto_error=False)
 
-def get_current_user(
-    request: Request,
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from cookie or Authorization header"""
+def _get_token_user_id(request: Request, credentials: Optional[HTTPAuthorizationCredentials]) -> int:
+    """Extract and validate the access token, returning its user id"""
     token = None
     
     # Try to get token from cookie first
@@ -32,20 +29,24 @@ def get_current_user(
         )
     
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-    except JWTError:
+        payload = token_service.verify(token, "access")
+        user_id: int = int(payload["sub"])
+    except (JWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
     
+    return user_id
+
+def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user from cookie or Authorization header"""
+    user_id = _get_token_user_id(request, credentials)
+    
     user = db.query(User).filter(User.id == user_id).first()
     
     if user is None:
@@ -56,12 +57,60 @@ def get_current_user(
     
     return user
 
+def get_current_principal(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: Session = Depends(get_db)
+) -> AuthenticatedPrincipal:
+    """Get the authenticated principal without loading the full user row.
+
+    Use this instead of get_current_user when the endpoint only needs the
+    identity, status, rank or balances; the full row is loaded lazily if any
+    other attribute is touched.
+    """
+    user_id = _get_token_user_id(request, credentials)
+    
+    principal = get_principal(db, user_id)
+    
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    return principal
+
+def get_stream_user_id(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> int:
+    """Authenticate a long-lived response (e.g. an event stream).
+
+    The user is checked with a session that is closed straight away, so the
+    open connection never holds a database connection.
+    """
+    user_id = _get_token_user_id(request, credentials)
+    
+    db = SessionLocal()
+    try:
+        principal = get_principal(db, user_id)
+    finally:
+        db.close()
+    
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    return user_id
+
 def get_admin_user(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
-) -> User:
+) -> AuthenticatedPrincipal:
     """Require admin role using RBAC"""
-    if has_role(db, current_user, 'super_admin'):
+    if get_permission_snapshot(db, current_user).has_role('super_admin'):
         return current_user
     
     raise HTTPException(
@@ -72,10 +121,10 @@ def get_admin_user(
 def require_permission(permission: str):
     """Dependency factory to require a specific permission"""
     def _check_permission(
-        current_user: User = Depends(get_current_user),
+        current_user: AuthenticatedPrincipal = Depends(get_current_principal),
         db: Session = Depends(get_db)
-    ) -> User:
-        if not has_permission(db, current_user, permission):
+    ) -> AuthenticatedPrincipal:
+        if not get_permission_snapshot(db, current_user).has_permission(permission):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Permission denied: {permission} required"
@@ -86,10 +135,10 @@ def require_permission(permission: str):
 def require_any_permission(permissions: List[str]):
     """Dependency factory to require any of the specified permissions"""
     def _check_permissions(
-        current_user: User = Depends(get_current_user),
+        current_user: AuthenticatedPrincipal = Depends(get_current_principal),
         db: Session = Depends(get_db)
-    ) -> User:
-        if not has_any_permission(db, current_user, permissions):
+    ) -> AuthenticatedPrincipal:
+        if not get_permission_snapshot(db, current_user).has_any_permission(permissions):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Permission denied: One of {permissions} required"
@@ -100,10 +149,10 @@ def require_any_permission(permissions: List[str]):
 def require_role(role_name: str):
     """Dependency factory to require a specific role"""
     def _check_role(
-        current_user: User = Depends(get_current_user),
+        current_user: AuthenticatedPrincipal = Depends(get_current_principal),
         db: Session = Depends(get_db)
-    ) -> User:
-        if not has_role(db, current_user, role_name):
+    ) -> AuthenticatedPrincipal:
+        if not get_permission_snapshot(db, current_user).has_role(role_name):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Role required: {role_name}"
@@ -114,15 +163,15 @@ def require_role(role_name: str):
 def check_feature_access(feature_name: str):
     """Check if user has access to a specific feature"""
     def _check_access(
-        current_user: User = Depends(get_current_user),
+        current_user: AuthenticatedPrincipal = Depends(get_current_principal),
         db: Session = Depends(get_db)
-    ) -> User:
-        from app.models.activation import UserActivation, ActivationPackage
+    ) -> AuthenticatedPrincipal:
+        from app.models.activation import ActivationPackage
         from datetime import datetime
         from app.services.config_service import get_config
         
         # Admins and super admins bypass all feature access checks
-        if has_role(db, current_user, 'super_admin') or has_role(db, current_user, 'admin'):
+        if get_permission_snapshot(db, current_user).is_admin:
             return current_user
         
         # Check if activation packages are enabled
@@ -144,28 +193,24 @@ def check_feature_access(feature_name: str):
                 detail="Please activate your account to access this feature"
             )
         
-        # Get user's activation
-        activation = db.query(UserActivation).filter(
-            UserActivation.user_id == current_user.id
-        ).first()
-        
-        if not activation or activation.status != "active":
+        # Activation state is carried on the principal
+        if current_user.activation_status != "active":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Please activate your account to access this feature"
             )
         
         # Check if activation has expired
-        if activation.expires_at and datetime.utcnow() > activation.expires_at:
+        if current_user.activation_expires_at and datetime.utcnow() > current_user.activation_expires_at:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Your subscription has expired. Please renew to access this feature"
             )
         
         # Check if package includes this feature
-        if activation.package_id:
+        if current_user.activation_package_id:
             package = db.query(ActivationPackage).filter(
-                ActivationPackage.id == activation.package_id
+                ActivationPackage.id == current_user.activation_package_id
             ).first()
             
             if package and package.allowed_features:
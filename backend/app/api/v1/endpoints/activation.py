@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.activation import UserActivation, ActivationPackage
 from app.schemas.activation import (
@@ -22,7 +23,7 @@ def get_activation_packages(db: Session = Depends(get_db)):
 
 @router.get("/status", response_model=UserActivationResponse)
 def get_activation_status(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's activation status"""
@@ -59,7 +60,7 @@ def get_activation_status(
 @router.post("/request", response_model=dict)
 def request_activation(
     request: ActivationRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Request account activation with payment"""
@@ -111,7 +112,7 @@ def request_activation(
 @router.post("/link-transaction/{transaction_id}")
 def link_transaction_to_activation(
     transaction_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Link payment transaction to activation record"""
@@ -10,12 +10,10 @@ from app.models.payout import Payout, PayoutStatus
 from app.models.verification import UserVerification, VerificationStatus
 from app.schemas.transaction import TransactionResponse
 from app.schemas.payout import PayoutResponse
-from app.schemas.admin import AdminStatsResponse, ManualTransaction, RefundRequest, PayoutApproval, PayoutRejection
-from app.services.transaction_service import refund_transaction, fail_transaction
+from app.schemas.admin import AdminStatsResponse, ManualTransaction, RefundRequest, BulkRefundRequest, PayoutApproval, PayoutRejection
+from app.services.transaction_service import refund_transaction, refund_transactions, fail_transaction
 from app.services.payout_service import approve_payout, complete_payout, reject_payout
-from app.services.email_service import send_payout_processed_email
 from app.utils.activity import log_activity
-import asyncio
 
 router = APIRouter()
 
@@ -127,6 +125,23 @@ def admin_refund_transaction(
     
     return {"message": "Transaction refunded successfully"}
 
+@router.post("/transactions/refund")
+def admin_refund_transactions(
+    refund_request: BulkRefundRequest,
+    admin: User = Depends(require_permission("transactions:refund")),
+    db: Session = Depends(get_db)
+):
+    """Admin: Refund several transactions at once"""
+    if not refund_request.transaction_ids:
+        raise HTTPException(status_code=400, detail="No transactions given")
+    
+    result = refund_transactions(db, refund_request.transaction_ids, refund_request.reason)
+    
+    if not result["refunded"]:
+        raise HTTPException(status_code=400, detail="Cannot refund transactions")
+    
+    return {"message": f"{len(result['refunded'])} transactions refunded successfully", **result}
+
 @router.post("/transactions/{transaction_id}/fail")
 def admin_fail_transaction(
     transaction_id: int,
@@ -190,8 +205,6 @@ def admin_complete_payout(
     if not payout:
         raise HTTPException(status_code=404, detail="Payout not found")
     
-    user = db.query(User).filter(User.id == payout.user_id).first()
-    
     success = complete_payout(
         db,
         payout_id,
@@ -202,18 +215,6 @@ def admin_complete_payout(
     if not success:
         raise HTTPException(status_code=400, detail="Cannot complete payout")
     
-    # Send payout processed email
-    if user:
-        asyncio.create_task(send_payout_processed_email(
-            user.email,
-            "approved",
-            float(payout.amount),
-            payout.payout_method,
-            completion.external_transaction_id or payout.payout_reference,
-            "1-3 business days",
-            db
-        ))
-    
     return {"message": "Payout completed successfully"}
 
 @router.post("/payouts/{payout_id}/reject")
@@ -228,25 +229,11 @@ def admin_reject_payout(
     if not payout:
         raise HTTPException(status_code=404, detail="Payout not found")
     
-    user = db.query(User).filter(User.id == payout.user_id).first()
-    
     success = reject_payout(db, payout_id, admin.id, rejection.reason)
     
     if not success:
         raise HTTPException(status_code=400, detail="Cannot reject payout")
     
-    # Send payout rejected email
-    if user:
-        asyncio.create_task(send_payout_processed_email(
-            user.email,
-            "rejected",
-            float(payout.amount),
-            payout.payout_method,
-            payout.payout_reference,
-            "N/A",
-            db
-        ))
-    
     return {"message": "Payout rejected successfully"}
 
 @router.get("/verifications")
@@ -13,7 +13,8 @@ from app.schemas.activation import (
     ActivationPackageUpdate
 )
 from app.services.transaction_service import complete_purchase_transaction, fail_transaction
-from app.services.email_service import send_account_activated_email, send_payment_received_email
+from app.services.email_service import send_payment_received_email
+from app.services.outbox import enqueue_email
 from slugify import slugify
 
 router = APIRouter()
@@ -249,15 +250,14 @@ def approve_activation_payment(
             user.is_active = True
             user.deactivated_at = None
             
-            # Send account activated email
-            import asyncio
-            asyncio.create_task(send_account_activated_email(
-                user.email,
-                user.full_name or "User",
-                package.name,
-                float(package.price),
-                db
-            ))
+            if package:
+                enqueue_email(
+                    db, "account_activated",
+                    email=user.email,
+                    user_name=user.full_name or "User",
+                    package_name=package.name,
+                    package_price=float(package.price)
+                )
         
         db.commit()
     
@@ -331,15 +331,13 @@ def assign_package_to_users(
         user.is_active = True
         user.deactivated_at = None
         
-        # Send account activated email
-        import asyncio
-        asyncio.create_task(send_account_activated_email(
-            user.email,
-            user.full_name or "User",
-            package.name,
-            float(package.price),
-            db
-        ))
+        enqueue_email(
+            db, "account_activated",
+            email=user.email,
+            user_name=user.full_name or "User",
+            package_name=package.name,
+            package_price=float(package.price)
+        )
         
         activated_users.append(user.email)
     
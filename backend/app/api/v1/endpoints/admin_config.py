@@ -8,7 +8,7 @@ from app.models.user import User
 from app.models.system_config import SystemConfig
 from app.models.payment_gateway import PaymentGateway
 from app.schemas.payment_gateway import PaymentGatewayCreate, PaymentGatewayUpdate, PaymentGatewayResponse
-from app.services.config_service import get_config, set_config, get_all_configs, delete_config
+from app.services.config_service import get_config, set_config, get_all_configs, delete_config, get_config_cache_stats
 from app.utils.activity import log_activity
 
 router = APIRouter()
@@ -30,6 +30,13 @@ def admin_get_all_configs(
     """Admin: Get all system configurations"""
     return get_all_configs(db, public_only=False)
 
+@router.get("/config/cache/stats")
+def admin_get_config_cache_stats(
+    admin: User = Depends(require_permission("config:view"))
+):
+    """Admin: Get configuration cache hit/miss counters"""
+    return get_config_cache_stats()
+
 @router.get("/config/{key}")
 def admin_get_config(
     key: str,
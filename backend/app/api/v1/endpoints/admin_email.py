@@ -7,8 +7,10 @@ from app.api.deps import require_permission
 from app.models.user import User
 from app.services.config_service import get_config
 from app.services.config_service import set_config
+from app.services.outbox import outbox_stats
+from app.services.email_service import deliver_email
+from app.services.email_transport import get_email_transport
 from app.utils.activity import log_activity
-import resend
 
 router = APIRouter()
 
@@ -41,6 +43,14 @@ def update_email_settings(
     log_activity(db, admin.id, "email_settings_updated")
     return {"message": "Email settings updated successfully"}
 
+@router.get("/email-outbox")
+def get_email_outbox(
+    admin: User = Depends(require_permission("config:email_settings")),
+    db: Session = Depends(get_db)
+):
+    """Admin: Outbox backlog and failed deliveries"""
+    return outbox_stats(db)
+
 class TestEmailRequest(BaseModel):
     email: EmailStr
 
@@ -51,19 +61,17 @@ async def send_test_email(
     db: Session = Depends(get_db)
 ):
     """Admin: Send test email"""
-    api_key = get_config(db, "resend_api_key", "")
-    from_email = get_config(db, "from_email", "")
-    
-    if not api_key:
-        return {"success": False, "message": "Resend API key not configured"}
+    if get_email_transport(db) is None:
+        return {"success": False, "message": "Email delivery not configured"}
     
-    resend.api_key = api_key
-    resend.Emails.send({
-        "from": from_email,
-        "to": request.email,
-        "subject": "Test Email - Rest Empire",
-        "html": "<h1>Test Email</h1><p>This is a test email from Rest Empire. Your email configuration is working correctly!</p>"
-    })
+    sent = await deliver_email(
+        db,
+        request.email,
+        "Test Email - Rest Empire",
+        "<h1>Test Email</h1><p>This is a test email from Rest Empire. Your email configuration is working correctly!</p>"
+    )
+    if not sent:
+        return {"success": False, "message": "Email provider did not accept the test email"}
     
     log_activity(db, admin.id, "test_email_sent")
     return {"success": True, "message": "Test email sent successfully"}
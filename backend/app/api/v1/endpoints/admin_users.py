@@ -7,11 +7,11 @@ from pydantic import BaseModel, EmailStr
 from app.core.database import get_db
 from app.api.deps import require_permission
 from app.models.user import User
-from app.models.team import TeamMember
 from app.schemas.user import UserResponse
 from app.utils.activity import log_activity
+from app.services.closure_service import add_member_closure
 from app.core.security import get_password_hash
-from app.core.rbac import has_role
+from app.core.rbac import has_role, invalidate_user_permissions
 import secrets
 
 router = APIRouter()
@@ -88,8 +88,7 @@ def admin_create_user(
     db.refresh(user)
     
     # Create team relationships (closure table)
-    team_self = TeamMember(user_id=user.id, ancestor_id=user.id, depth=0, path=str(user.id))
-    db.add(team_self)
+    add_member_closure(db, user.id)
     
     # Assign activation package if provided
     if user_data.package_id:
@@ -280,6 +279,9 @@ def admin_update_user(
     db.commit()
     db.refresh(user)
     
+    if user_data.role_ids is not None:
+        invalidate_user_permissions(db, user_id)
+    
     # Log activity
     log_activity(
         db, user.id, "admin_updated_user",
@@ -488,6 +490,20 @@ def admin_get_overview_stats(
         "total_bonuses_paid": float(total_bonuses)
     }
 
+@router.get("/genealogy/consistency")
+def admin_check_genealogy_index(
+    limit: Optional[int] = Query(None, ge=1, description="Only check the first N users"),
+    admin: User = Depends(require_permission("users:list")),
+    db: Session = Depends(get_db)
+):
+    """Admin: Compare the in-memory genealogy index with the team_members closure table"""
+    from app.core.genealogy import genealogy_index
+    
+    return {
+        "index": genealogy_index.stats(),
+        "check": genealogy_index.check_consistency(db, limit=limit)
+    }
+
 @router.get("/verifications")
 def admin_get_verifications(
     admin: User = Depends(require_permission("users:list")),
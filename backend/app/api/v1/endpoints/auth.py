@@ -5,8 +5,8 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.core.database import get_db
 from app.core.security import (
-    verify_password, get_password_hash, create_access_token, 
-    create_refresh_token, generate_verification_token, generate_reset_token,
+    verify_and_update_password, get_password_hash, get_password_hash_async, create_token_pair,
+    generate_verification_token, generate_reset_token,
     set_auth_cookies, clear_auth_cookies
 )
 from app.models.user import User
@@ -17,9 +17,10 @@ from app.schemas.user import (
 )
 from app.services.email_service import send_verification_email, send_password_reset_email, send_welcome_email, send_team_member_joined_email
 from app.utils.activity import log_activity
+from app.services.closure_service import add_member_closure
 from app.services.config_service import get_config
-from jose import jwt, JWTError
-from app.core.config import settings
+from jose import JWTError
+from app.core.token_service import token_service
 import secrets
 
 router = APIRouter()
@@ -59,7 +60,7 @@ async def register(user_data: UserCreate, request: Request, db: Session = Depend
     # Create user
     user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash_async(user_data.password),
         full_name=user_data.full_name,
         phone_number=user_data.phone_number,
         referral_code=secrets.token_urlsafe(8),
@@ -69,25 +70,13 @@ async def register(user_data: UserCreate, request: Request, db: Session = Depend
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    # Create team relationships (closure table)
-    team_self = TeamMember(user_id=user.id, ancestor_id=user.id, depth=0, path=str(user.id))
-    db.add(team_self)
+    db.flush()
     
-    if sponsor:
-        sponsor_ancestors = db.query(TeamMember).filter(TeamMember.user_id == sponsor.id).all()
-        for ancestor_rel in sponsor_ancestors:
-            team_rel = TeamMember(
-                user_id=user.id,
-                ancestor_id=ancestor_rel.ancestor_id,
-                depth=ancestor_rel.depth + 1,
-                path=f"{ancestor_rel.path}.{user.id}"
-            )
-            db.add(team_rel)
+    # Create team relationships (closure table) in the same transaction
+    add_member_closure(db, user.id, sponsor.id if sponsor else None)
     
     db.commit()
+    db.refresh(user)
     
     # Log activity
     log_activity(
@@ -126,12 +115,20 @@ async def register(user_data: UserCreate, request: Request, db: Session = Depend
 def login(credentials: UserLogin, request: Request, response: Response, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == credentials.email).first()
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = verify_and_update_password(credentials.password, user.hashed_password)
+    
+    if not verified:
         # Log failed attempt
         if user:
             log_activity(db, user.id, "login_failed", ip_address=request.client.host)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade the stored hash if the bcrypt work factor has changed
+    if new_hash:
+        user.hashed_password = new_hash
+    
     # Update last login
     user.last_login = datetime.utcnow()
     db.commit()
@@ -145,8 +142,7 @@ def login(credentials: UserLogin, request: Request, response: Response, db: Sess
     log_activity(db, user.id, "login_success", ip_address=request.client.host)
     
     # Create tokens
-    access_token = create_access_token(data={"sub": str(user.id)}, db=db)
-    refresh_token = create_refresh_token(data={"sub": str(user.id)}, db=db)
+    access_token, refresh_token = create_token_pair(user.id, db=db)
     
     # Set tokens in httpOnly cookies
     from app.core.storage import ENVIRONMENT
@@ -162,18 +158,14 @@ def login(credentials: UserLogin, request: Request, response: Response, db: Sess
 @limiter.limit("10/minute")
 def refresh_token(token_data: TokenRefresh, request: Request, response: Response, db: Session = Depends(get_db)):
     try:
-        payload = jwt.decode(token_data.refresh_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        token_type: str = payload.get("type")
-        
-        if token_type != "refresh":
-            raise HTTPException(status_code=401, detail="Invalid token type")
-        
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
+        payload = token_service.verify(token_data.refresh_token, token_type=None)
+        user_id: int = int(payload["sub"])
+    except (JWTError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid token")
     
+    if payload.get("type") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid token type")
+    
     user = db.query(User).filter(User.id == user_id).first()
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
@@ -182,8 +174,7 @@ def refresh_token(token_data: TokenRefresh, request: Request, response: Response
     log_activity(db, user.id, "token_refreshed")
     
     # Create new tokens
-    access_token = create_access_token(data={"sub": str(user.id)}, db=db)
-    new_refresh_token = create_refresh_token(data={"sub": str(user.id)}, db=db)
+    access_token, new_refresh_token = create_token_pair(user.id, db=db)
     
     # Set tokens in httpOnly cookies
     from app.core.storage import ENVIRONMENT
@@ -4,7 +4,8 @@ from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.bonus import Bonus, BonusType, BonusStatus
 from app.schemas.bonus import BonusResponse, BonusSummary
@@ -17,7 +18,7 @@ def get_bonuses(
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's bonus history"""
@@ -41,7 +42,7 @@ def get_bonuses(
 
 @router.get("/summary", response_model=BonusSummary)
 def get_bonus_summary(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get bonus summary statistics"""
@@ -93,7 +94,7 @@ def get_bonus_summary(
 @router.get("/{bonus_id}", response_model=BonusResponse)
 def get_bonus_details(
     bonus_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get detailed information about a specific bonus"""
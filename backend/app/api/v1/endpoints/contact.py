@@ -50,8 +50,8 @@ async def submit_contact_message(
     db: Session = Depends(deps.get_db)
 ):
     """Submit contact form message (public endpoint)"""
-    import resend
     from app.services.config_service import get_config
+    from app.services.email_service import deliver_email
     from datetime import datetime, timedelta
     
     # Rate limiting: Check if email sent message in last 5 minutes
@@ -87,17 +87,12 @@ async def submit_contact_message(
     
     # Send email notification to admin
     try:
-        api_key = get_config(db, "resend_api_key")
-        from_email = get_config(db, "from_email", "noreply@restempire.com")
         admin_email = get_config(db, "admin_email", "admin@restempire.com")
-        
-        if api_key:
-            resend.api_key = api_key
-            resend.Emails.send({
-                "from": from_email,
-                "to": admin_email,
-                "subject": f"New Contact Form: {message_data.subject}",
-                "html": f"""
+        await deliver_email(
+            db,
+            admin_email,
+            f"New Contact Form: {message_data.subject}",
+            f"""
                 <h2>New Contact Form Submission</h2>
                 <p><strong>Name:</strong> {message_data.name}</p>
                 <p><strong>Email:</strong> {message_data.email}</p>
@@ -105,7 +100,7 @@ async def submit_contact_message(
                 <p><strong>Message:</strong></p>
                 <p>{message_data.message}</p>
                 """
-            })
+        )
     except Exception as e:
         pass  # Don't fail if email fails
     
@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from datetime import datetime, timedelta
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.bonus import Bonus
 from app.models.payout import Payout
@@ -27,7 +28,7 @@ RANK_REQUIREMENTS = {
 
 @router.get("/stats")
 def get_dashboard_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get dashboard statistics for current user."""
@@ -79,7 +80,7 @@ def get_dashboard_stats(
         "recent_earnings_30d": float(recent_bonuses),
         "pending_payouts": float(pending_payouts),
         "team_size": team_stats.get("total_team", 0),
-        "first_line_count": team_stats.get("first_line", 0),
+        "first_line_count": team_stats.get("first_line_count", 0),
         "current_rank": current_rank,
         "rank_progress": {
             "percentage": max(0, progress_percentage),
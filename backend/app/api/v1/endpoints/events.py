@@ -9,7 +9,7 @@ import qrcode.image.svg
 import json
 from datetime import datetime
 from app.core.database import get_db
-from app.api.deps import get_current_user, check_feature_access
+from app.api.deps import get_current_user, get_current_principal, check_feature_access
 from app.models.user import User
 from app.models.event import EventType, EventStatus
 from app.schemas.event import (
@@ -36,22 +36,21 @@ def list_events(
     db: Session = Depends(get_db)
 ):
     """Get all events (public endpoint - returns only public events if not authenticated)"""
-    from app.core.rbac import has_role
+    from app.core.rbac import get_permission_snapshot
     
     # Try to get current user if authenticated
     current_user = None
     is_admin = False
     if credentials:
         try:
-            current_user = get_current_user(request, credentials, db)
-            is_admin = has_role(db, current_user, 'super_admin') or has_role(db, current_user, 'admin')
+            current_user = get_current_principal(request, credentials, db)
+            is_admin = get_permission_snapshot(db, current_user).is_admin
         except:
             pass
     
     # If not authenticated or requesting public only, filter for public events
     if not current_user or public_only:
         from app.models.event import Event
-        from datetime import datetime
         
         query = db.query(Event).filter(Event.is_public == True)
         
@@ -69,21 +68,14 @@ def list_events(
         return events
     
     if not is_admin:
-        # Check feature access for regular users
-        from app.models.activation import UserActivation
-        from datetime import datetime
-        
+        # Check feature access for regular users (activation comes with the principal)
         if not current_user.is_active:
             raise HTTPException(status_code=403, detail="Please activate your account to access this feature")
         
-        activation = db.query(UserActivation).filter(
-            UserActivation.user_id == current_user.id
-        ).first()
-        
-        if not activation or activation.status != "active":
+        if current_user.activation_status != "active":
             raise HTTPException(status_code=403, detail="Please activate your account to access this feature")
         
-        if activation.expires_at and datetime.utcnow() > activation.expires_at:
+        if current_user.activation_expires_at and datetime.utcnow() > current_user.activation_expires_at:
             raise HTTPException(status_code=403, detail="Your subscription has expired")
     
     events = get_events(
@@ -123,9 +115,9 @@ def get_events_stats(
     db: Session = Depends(get_db)
 ):
     """Get event statistics"""
-    from app.core.rbac import has_role
+    from app.core.rbac import get_permission_snapshot
     
-    is_admin = has_role(db, current_user, 'super_admin') or has_role(db, current_user, 'admin')
+    is_admin = get_permission_snapshot(db, current_user).is_admin
     
     if not is_admin:
         from app.models.activation import UserActivation
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal, get_stream_user_id
+from app.core.config import settings
+from app.core.live_events import live_events
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.notification import Notification
 from app.models.notification_preferences import NotificationPreferences
 from app.schemas.notification import NotificationResponse, NotificationStats
 from app.schemas.notification_preferences import NotificationPreferencesResponse, NotificationPreferencesUpdate
-from app.services.notification_service import mark_as_read, mark_all_as_read, get_unread_count
+from app.services.notification_service import mark_as_read, mark_all_as_read, delete_notification as delete_user_notification, get_notification_counts
 
 router = APIRouter()
 
@@ -17,7 +21,7 @@ def get_notifications(
     unread_only: bool = False,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's notifications"""
@@ -32,24 +36,39 @@ def get_notifications(
 
 @router.get("/stats", response_model=NotificationStats)
 def get_notification_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get notification statistics"""
-    total = db.query(Notification).filter(Notification.user_id == current_user.id).count()
-    unread = get_unread_count(db, current_user.id)
-    read = total - unread
+    counts = get_notification_counts(db, current_user.id)
     
     return NotificationStats(
-        total=total,
-        unread=unread,
-        read=read
+        total=counts["total"],
+        unread=counts["unread"],
+        read=max(counts["total"] - counts["unread"], 0)
+    )
+
+@router.get("/stream")
+def stream_notifications(user_id: int = Depends(get_stream_user_id)):
+    """Server-sent events for new notifications, balance changes and payout updates"""
+    if not settings.LIVE_EVENTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Live events are disabled")
+    
+    return StreamingResponse(
+        live_events.stream(user_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Keeps GZipMiddleware from buffering the stream
+            "Content-Encoding": "identity"
+        }
     )
 
 @router.post("/{notification_id}/read")
 def mark_notification_read(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Mark a notification as read"""
@@ -62,7 +81,7 @@ def mark_notification_read(
 
 @router.post("/read-all")
 def mark_all_notifications_read(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Mark all notifications as read"""
@@ -73,26 +92,18 @@ def mark_all_notifications_read(
 @router.delete("/{notification_id}")
 def delete_notification(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Delete a notification"""
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user.id
-    ).first()
-    
-    if not notification:
+    if not delete_user_notification(db, notification_id, current_user.id):
         raise HTTPException(status_code=404, detail="Notification not found")
     
-    db.delete(notification)
-    db.commit()
-    
     return {"message": "Notification deleted"}
 
 @router.get("/preferences", response_model=NotificationPreferencesResponse)
 def get_notification_preferences(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's notification preferences"""
@@ -112,7 +123,7 @@ def get_notification_preferences(
 @router.put("/preferences", response_model=NotificationPreferencesResponse)
 def update_notification_preferences(
     preferences: NotificationPreferencesUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Update user's notification preferences"""
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from app.api.deps import get_current_user, get_db
+from app.api.deps import get_current_principal, get_db
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.services.optimized_team_service import OptimizedTeamService
 from app.schemas.team import TeamMemberResponse, TeamStatsResponse, LegBreakdownResponse
@@ -12,7 +13,7 @@ router = APIRouter()
 
 @router.get("/stats", response_model=TeamStatsResponse)
 def get_team_stats_optimized(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get comprehensive team statistics with optimized queries"""
@@ -34,7 +35,7 @@ def get_team_stats_optimized(
 @router.get("/members", response_model=List[TeamMemberResponse])
 def get_team_members_optimized(
     depth: Optional[int] = Query(None, ge=1, le=15, description="Maximum depth to retrieve"),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get team members with preloaded statistics"""
@@ -60,7 +61,7 @@ def get_team_members_optimized(
 
 @router.get("/legs", response_model=LegBreakdownResponse)
 def get_leg_breakdown_optimized(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get optimized leg breakdown for rank calculations"""
@@ -80,7 +81,7 @@ def get_leg_breakdown_optimized(
 @router.get("/performance/{user_id}")
 def get_member_performance(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get performance data for a specific team member"""
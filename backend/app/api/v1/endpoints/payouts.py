@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
-from app.api.deps import get_current_user, check_feature_access
+from app.api.deps import get_current_principal, check_feature_access
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.payout import Payout, PayoutStatus
 from app.schemas.payout import (
@@ -10,8 +11,6 @@ from app.schemas.payout import (
     BankAccountDetails, CryptoAccountDetails
 )
 from app.services.payout_service import create_payout_request
-from app.services.email_service import send_payout_request_email
-import asyncio
 
 router = APIRouter()
 
@@ -48,14 +47,7 @@ def request_payout(
             payout.account_details,
             idempotency_key=idempotency_key
         )
-        
-        # Send payout request email
-        asyncio.create_task(send_payout_request_email(
-            current_user.email,
-            float(payout.amount),
-            db
-        ))
-        
+
         return payout_record
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -65,7 +57,7 @@ def get_payouts(
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's payout history"""
@@ -81,7 +73,7 @@ def get_payouts(
 @router.get("/{payout_id}", response_model=PayoutResponse)
 def get_payout_details(
     payout_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get payout details"""
@@ -12,7 +12,7 @@ from app.schemas.rbac import (
     RoleResponse, RoleCreate, RoleUpdate, PermissionResponse,
     UserRoleAssign, UserRoleResponse
 )
-from app.core.rbac import has_role
+from app.core.rbac import has_role, invalidate_user_permissions, invalidate_all_permissions
 
 router = APIRouter()
 
@@ -172,6 +172,7 @@ def update_role(
     
     db.commit()
     db.refresh(role)
+    invalidate_all_permissions(db)
     
     # Get permissions
     role_perms = db.query(Permission).join(
@@ -214,6 +215,7 @@ def delete_role(
     
     db.delete(role)
     db.commit()
+    invalidate_all_permissions(db)
     
     return {"message": "Role deleted successfully"}
 
@@ -289,6 +291,7 @@ def assign_roles_to_user(
         db.add(user_role)
     
     db.commit()
+    invalidate_user_permissions(db, user_id)
     
     return {"message": f"Assigned {len(role_data.role_ids)} role(s) to user"}
 
@@ -310,5 +313,6 @@ def remove_role_from_user(
     
     db.delete(user_role)
     db.commit()
+    invalidate_user_permissions(db, user_id)
     
     return {"message": "Role removed from user"}
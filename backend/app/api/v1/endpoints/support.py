@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.support import SupportTicket, SupportResponse, TicketStatus
 from app.schemas.support import SupportTicketCreate, SupportTicketResponse
@@ -13,7 +14,7 @@ router = APIRouter()
 @router.post("/tickets", response_model=dict)
 def create_support_ticket(
     ticket_data: SupportTicketCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Create a new support ticket"""
@@ -37,7 +38,7 @@ def create_support_ticket(
 
 @router.get("/tickets")
 def get_user_tickets(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's support tickets with responses"""
@@ -76,7 +77,7 @@ def get_user_tickets(
 @router.get("/tickets/{ticket_id}", response_model=SupportTicketResponse)
 def get_ticket_details(
     ticket_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get specific ticket details"""
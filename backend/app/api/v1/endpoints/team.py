@@ -3,15 +3,19 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
+from dataclasses import asdict
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.team import TeamMember
 from app.schemas.team import TeamMemberInfo, TeamStats, TeamLegBreakdown, LegStats
 from app.services.team_service import (
-    get_team_members, get_first_line, get_team_size,
-    calculate_leg_breakdown
+    get_team_members, get_first_line, get_team_size, get_team_sizes,
+    get_downline_depths, get_downline_ids, is_in_downline, get_leg_breakdown
 )
+from app.services.turnover_ledger import get_pending_turnover
+from app.services.team_aggregate_service import get_team_aggregate, get_pending_member_counts
 
 router = APIRouter()
 
@@ -20,7 +24,7 @@ def get_team_tree(
     depth: Optional[int] = Query(None, ge=1, le=15),
     cursor: Optional[int] = Query(None, description="Last user_id from previous page"),
     limit: int = Query(50, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get team tree with cursor-based pagination - optimized for large teams"""
@@ -48,15 +52,7 @@ def get_team_tree(
     
     # Batch get team sizes
     user_ids = [tm.user_id for tm in team_members]
-    team_sizes = db.query(
-        TeamMember.ancestor_id,
-        func.count(TeamMember.user_id).label('size')
-    ).filter(
-        TeamMember.ancestor_id.in_(user_ids),
-        TeamMember.depth > 0
-    ).group_by(TeamMember.ancestor_id).all()
-    
-    size_map = {ancestor_id: size for ancestor_id, size in team_sizes}
+    size_map = get_team_sizes(db, user_ids)
     
     result = []
     for tm in team_members:
@@ -78,7 +74,7 @@ def get_team_tree(
 
 @router.get("/first-line", response_model=List[TeamMemberInfo])
 def get_first_line_members(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get direct referrals (first line) - optimized"""
@@ -105,15 +101,12 @@ def get_first_line_members(
     ).all()
     turnover_map = {uid: float(t) if t else 0 for uid, t in turnovers}
     
+    # Include turnover not yet folded in by the ledger aggregator
+    for uid, pending in get_pending_turnover(db, user_ids).items():
+        turnover_map[uid] = turnover_map.get(uid, 0) + pending["personal"]
+    
     # Batch get team sizes
-    team_sizes = db.query(
-        TeamMember.ancestor_id,
-        func.count(TeamMember.user_id).label('size')
-    ).filter(
-        TeamMember.ancestor_id.in_(user_ids),
-        TeamMember.depth > 0
-    ).group_by(TeamMember.ancestor_id).all()
-    size_map = {ancestor_id: size for ancestor_id, size in team_sizes}
+    size_map = get_team_sizes(db, user_ids)
     
     result = []
     for user in first_line:
@@ -135,15 +128,28 @@ def get_first_line_members(
 
 @router.get("/stats", response_model=TeamStats)
 def get_team_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get team statistics - optimized without loading all members"""
-    # Total team size - single count query
-    total_team_size = db.query(func.count(TeamMember.user_id)).filter(
-        TeamMember.ancestor_id == current_user.id,
-        TeamMember.depth > 0
-    ).scalar() or 0
+    pending_turnover = get_pending_turnover(db, [current_user.id])[current_user.id]["total"]
+    
+    # Precomputed aggregates make this a single-row lookup
+    aggregate = get_team_aggregate(db, current_user.id)
+    if aggregate is not None:
+        pending = get_pending_member_counts(db, current_user.id)
+        team_size = aggregate.team_size + pending["team_size"]
+        active_members = aggregate.active_count + pending["active_count"]
+        return TeamStats(
+            total_team_size=team_size,
+            first_line_count=aggregate.first_line_count + pending["first_line_count"],
+            active_members=active_members,
+            inactive_members=team_size - active_members,
+            total_team_turnover=float(aggregate.team_turnover or 0) + pending_turnover
+        )
+    
+    # Total team size - genealogy index or single count query
+    total_team_size = get_team_size(db, current_user.id)
     
     # First line count - single count query
     first_line_count = db.query(func.count(User.id)).filter(
@@ -169,6 +175,7 @@ def get_team_stats(
     ).scalar()
     
     total_turnover = float(user_team) if user_team else 0
+    total_turnover += pending_turnover
     
     return TeamStats(
         total_team_size=total_team_size,
@@ -180,24 +187,24 @@ def get_team_stats(
 
 @router.get("/legs", response_model=TeamLegBreakdown)
 def get_leg_breakdown(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get turnover breakdown by legs"""
-    breakdown = calculate_leg_breakdown(db, current_user.id)
+    breakdown = get_leg_breakdown(db, current_user.id)
     
-    first_leg = LegStats(**breakdown["first_leg"]) if breakdown["first_leg"] else None
-    second_leg = LegStats(**breakdown["second_leg"]) if breakdown["second_leg"] else None
+    first_leg = LegStats(**asdict(breakdown.first_leg)) if breakdown.first_leg else None
+    second_leg = LegStats(**asdict(breakdown.second_leg)) if breakdown.second_leg else None
     
     other_legs = LegStats(
         member_id=0,
         member_name="Other Legs Combined",
-        team_size=breakdown["other_legs"]["count"],
-        turnover=breakdown["other_legs"]["turnover"],
-        percentage=breakdown["other_legs"]["percentage"]
+        team_size=len(breakdown.other_legs),
+        turnover=breakdown.other_legs_turnover,
+        percentage=sum(leg.percentage for leg in breakdown.other_legs)
     )
     
-    all_legs = [LegStats(**leg) for leg in breakdown["all_legs"]]
+    all_legs = [LegStats(**asdict(leg)) for leg in breakdown.legs]
     
     return TeamLegBreakdown(
         first_leg=first_leg,
@@ -214,16 +221,12 @@ def search_team(
     is_verified: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Search and filter team members - optimized"""
-    # Get member IDs in one query
-    member_ids_query = db.query(TeamMember.user_id).filter(
-        TeamMember.ancestor_id == current_user.id,
-        TeamMember.depth > 0
-    )
-    member_ids = [row[0] for row in member_ids_query.all()]
+    # Get member IDs (from the genealogy index when loaded)
+    member_ids = get_downline_ids(db, current_user.id)
     
     if not member_ids:
         return []
@@ -254,14 +257,7 @@ def search_team(
     user_ids = [u.id for u in users]
     
     # Batch get depths
-    depths = db.query(
-        TeamMember.user_id,
-        TeamMember.depth
-    ).filter(
-        TeamMember.user_id.in_(user_ids),
-        TeamMember.ancestor_id == current_user.id
-    ).all()
-    depth_map = {uid: d for uid, d in depths}
+    depth_map = get_downline_depths(db, current_user.id, user_ids)
     
     # Batch get turnovers
     turnovers = db.query(
@@ -273,15 +269,12 @@ def search_team(
     ).all()
     turnover_map = {uid: float(t) if t else 0 for uid, t in turnovers}
     
+    # Include turnover not yet folded in by the ledger aggregator
+    for uid, pending in get_pending_turnover(db, user_ids).items():
+        turnover_map[uid] = turnover_map.get(uid, 0) + pending["personal"]
+    
     # Batch get team sizes
-    team_sizes = db.query(
-        TeamMember.ancestor_id,
-        func.count(TeamMember.user_id).label('size')
-    ).filter(
-        TeamMember.ancestor_id.in_(user_ids),
-        TeamMember.depth > 0
-    ).group_by(TeamMember.ancestor_id).all()
-    size_map = {ancestor_id: size for ancestor_id, size in team_sizes}
+    size_map = get_team_sizes(db, user_ids)
     
     result = []
     for user in users:
@@ -304,17 +297,12 @@ def search_team(
 @router.get("/member/{member_id}/children", response_model=List[TeamMemberInfo])
 def get_member_children(
     member_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get direct children of a specific team member - lazy loading optimized"""
     # Verify access
-    is_in_team = db.query(TeamMember.user_id).filter(
-        TeamMember.user_id == member_id,
-        TeamMember.ancestor_id == current_user.id
-    ).first()
-    
-    if not is_in_team and member_id != current_user.id:
+    if member_id != current_user.id and not is_in_downline(db, current_user.id, member_id):
         raise HTTPException(status_code=403, detail="Member not in your team")
     
     # Get children
@@ -326,14 +314,7 @@ def get_member_children(
     user_ids = [u.id for u in children]
     
     # Batch get depths
-    depths = db.query(
-        TeamMember.user_id,
-        TeamMember.depth
-    ).filter(
-        TeamMember.user_id.in_(user_ids),
-        TeamMember.ancestor_id == current_user.id
-    ).all()
-    depth_map = {uid: d for uid, d in depths}
+    depth_map = get_downline_depths(db, current_user.id, user_ids)
     
     # Batch get turnovers
     turnovers = db.query(
@@ -345,15 +326,12 @@ def get_member_children(
     ).all()
     turnover_map = {uid: float(t) if t else 0 for uid, t in turnovers}
     
+    # Include turnover not yet folded in by the ledger aggregator
+    for uid, pending in get_pending_turnover(db, user_ids).items():
+        turnover_map[uid] = turnover_map.get(uid, 0) + pending["personal"]
+    
     # Batch get team sizes
-    team_sizes = db.query(
-        TeamMember.ancestor_id,
-        func.count(TeamMember.user_id).label('size')
-    ).filter(
-        TeamMember.ancestor_id.in_(user_ids),
-        TeamMember.depth > 0
-    ).group_by(TeamMember.ancestor_id).all()
-    size_map = {ancestor_id: size for ancestor_id, size in team_sizes}
+    size_map = get_team_sizes(db, user_ids)
     
     result = []
     for user in children:
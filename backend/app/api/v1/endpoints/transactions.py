@@ -4,7 +4,8 @@ from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.schemas.transaction import TransactionResponse, RecentTransaction
@@ -12,6 +13,7 @@ from app.services.transaction_service import (
     create_purchase_transaction, complete_purchase_transaction,
     fail_transaction, get_transaction_stats
 )
+from app.services.purchase_completion import get_completion_status
 
 router = APIRouter()
 
@@ -28,7 +30,7 @@ class TransactionStats(BaseModel):
 @router.post("/purchase", response_model=TransactionResponse)
 def create_purchase(
     purchase: PurchaseCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Create a new purchase transaction"""
@@ -51,7 +53,7 @@ def create_purchase(
 @router.post("/{transaction_id}/complete")
 def complete_transaction(
     transaction_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Complete a pending transaction (webhook/callback)"""
@@ -68,7 +70,27 @@ def complete_transaction(
     if not success:
         raise HTTPException(status_code=400, detail="Cannot complete transaction")
     
-    return {"message": "Transaction completed successfully"}
+    return {
+        "message": "Transaction completed successfully",
+        "completion_status": get_completion_status(db, transaction)["status"]
+    }
+
+@router.get("/{transaction_id}/completion")
+def get_transaction_completion(
+    transaction_id: int,
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Progress of the background work after a purchase is completed"""
+    transaction = db.query(Transaction).filter(
+        Transaction.id == transaction_id,
+        Transaction.user_id == current_user.id
+    ).first()
+    
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    return get_completion_status(db, transaction)
 
 @router.get("/", response_model=List[TransactionResponse])
 def get_transactions(
@@ -76,7 +98,7 @@ def get_transactions(
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get user's transaction history"""
@@ -95,7 +117,7 @@ def get_transactions(
 @router.get("/recent", response_model=List[RecentTransaction])
 def get_recent_transactions(
     limit: int = Query(10, ge=1, le=50),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get recent transactions"""
@@ -107,7 +129,7 @@ def get_recent_transactions(
 
 @router.get("/stats", response_model=TransactionStats)
 def get_user_transaction_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get transaction statistics"""
@@ -117,7 +139,7 @@ def get_user_transaction_stats(
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 def get_transaction(
     transaction_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get transaction details"""
@@ -6,13 +6,12 @@ from app.core.database import get_db
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.core.sanitization import sanitize_text
-from app.models.team import TeamMember
 from app.models.transaction import Transaction, TransactionStatus
 from app.models.bonus import Bonus, BonusStatus
 from app.models.payout import Payout, PayoutStatus
 from app.schemas.user import UserResponse, PasswordChange
 from app.schemas.profile import ProfileUpdate, EmailChange, DashboardStats, ReferralInfo, SponsorInfo
-from app.core.security import verify_password, get_password_hash, generate_verification_token
+from app.core.security import verify_password, verify_password_async, get_password_hash, generate_verification_token
 from app.services.email_service import send_verification_email
 from app.utils.activity import log_activity
 from app.core.config import settings
@@ -94,7 +93,7 @@ async def change_email(
     request: Request = None
 ):
     # Verify password
-    if not verify_password(email_data.password, current_user.hashed_password):
+    if not await verify_password_async(email_data.password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect password")
     
     # Check new email not already in use
@@ -166,16 +165,6 @@ def get_dashboard_stats(
         "Royal Crown": {"turnover": 1000000, "next_rank": None, "next_turnover": None}
     }
     
-    team_size = db.query(TeamMember).filter(
-        TeamMember.ancestor_id == current_user.id,
-        TeamMember.depth > 0
-    ).count()
-    
-    first_line_count = db.query(TeamMember).filter(
-        TeamMember.ancestor_id == current_user.id,
-        TeamMember.depth == 1
-    ).count()
-    
     pending_payouts = db.query(func.sum(Payout.amount)).filter(
         Payout.user_id == current_user.id,
         Payout.status.in_([PayoutStatus.pending, PayoutStatus.approved])
@@ -193,6 +182,8 @@ def get_dashboard_stats(
     ).first()
     
     team_stats = OptimizedTeamService.get_team_stats_bulk(db, current_user.id)
+    team_size = team_stats["total_team"]
+    first_line_count = team_stats["first_line_count"]
     current_rank = current_user.current_rank or "Amber"
     rank_info = RANK_REQUIREMENTS.get(current_rank, RANK_REQUIREMENTS["Amber"])
     user_turnover = team_stats.get("total_turnover", 0)
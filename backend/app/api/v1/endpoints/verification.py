@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import AuthenticatedPrincipal
 from app.models.user import User
 from app.models.verification import UserVerification, VerificationStatus
 from app.utils.activity import log_activity
@@ -30,7 +31,7 @@ async def submit_verification(
     business_name: str = Form(None),
     business_type: str = Form(None),
     business_reg_number: str = Form(None),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     # Save document file
@@ -73,7 +74,7 @@ async def submit_verification(
 
 @router.get("/status")
 def get_verification_status(
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     verification = db.query(UserVerification).filter(
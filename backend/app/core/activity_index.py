@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "activity:events"
+PENDING_EVENTS_KEY = "activity_events"
+EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(value: Optional[datetime]) -> int:
+    return max(int((value - EPOCH).total_seconds()), 1) if value else 0
+
+
+def _counts_as_active(is_active, activity_status) -> bool:
+    return bool(is_active) and activity_status == "active"
+
+
+class ActivityIndex:
+    """In-memory copy of every user's activity state, indexed by user id.
+
+    A bitmap marks users that count as active (is_active and activity
+    status "active") and a parallel array holds last activity as epoch
+    seconds (0 = never), so filtering an upline is array work instead of a
+    users query. ORM writes to the activity columns update the index after
+    commit and are broadcast over Redis to the other workers; queries
+    return None until the index is loaded so callers can fall back to SQL.
+    """
+
+    def __init__(self, client=None, max_age: float = 900.0):
+        self.client = client
+        self.max_age = max_age
+
+        self._lock = threading.RLock()
+        self._ready = False
+        self._loading = False
+        self._built_at = 0.0
+        self._subscriber: Optional[threading.Thread] = None
+
+        self._active = bytearray()
+        self._last_seen = array("I")
+        self._replay: Optional[List[Tuple[int, bool, int]]] = None  # updates seen during a load
+
+    # Building
+
+    def load(self, db: Session):
+        """(Re)load activity state from the users table"""
+        with self._lock:
+            # Updates committed after the SELECT are not in its rows
+            self._replay = []
+        try:
+            rows = db.query(User.id, User.is_active, User.activity_status, User.last_activity_date).all()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        size = max((row.id for row in rows), default=0) + 1
+        active = bytearray((size + 7) // 8)
+        last_seen = array("I", [0]) * size
+        for user_id, is_active, activity_status, last_activity in rows:
+            if _counts_as_active(is_active, activity_status):
+                active[user_id >> 3] |= 1 << (user_id & 7)
+            last_seen[user_id] = _epoch_seconds(last_activity)
+
+        with self._lock:
+            self._active = active
+            self._last_seen = last_seen
+            replay, self._replay = self._replay or [], None
+            for user_id, is_active, seen in replay:
+                self._set(user_id, is_active, seen)
+            self._ready = True
+            self._built_at = time.monotonic()
+        logger.info(f"Activity index loaded: {len(rows)} users, {len(replay)} replayed")
+
+    def load_in_background(self):
+        """Load without blocking the caller; queries fall back to SQL meanwhile"""
+        from app.core.database import SessionLocal
+
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            db = SessionLocal()
+            try:
+                self.load(db)
+            except Exception as e:
+                logger.warning(f"Activity index load failed: {e}")
+            finally:
+                db.close()
+                with self._lock:
+                    self._loading = False
+
+        self._ensure_subscriber()
+        threading.Thread(target=run, name="activity-index-load", daemon=True).start()
+
+    # Change events
+
+    def update(self, user_id: int, active: bool, last_seen: int, broadcast: bool = True):
+        """Record a user's activity state (last_seen in epoch seconds)"""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((user_id, active, last_seen))
+            if self._ready:
+                self._set(user_id, active, last_seen)
+        if broadcast:
+            self._publish(f"set:{user_id}:{int(active)}:{last_seen}")
+
+    def _set(self, user_id: int, active: bool, last_seen: int):
+        if user_id >= len(self._last_seen):
+            self._last_seen.extend(array("I", [0]) * (user_id + 1 - len(self._last_seen)))
+        if (user_id >> 3) >= len(self._active):
+            self._active.extend(bytearray((user_id >> 3) + 1 - len(self._active)))
+        self._last_seen[user_id] = last_seen
+        if active:
+            self._active[user_id >> 3] |= 1 << (user_id & 7)
+        else:
+            self._active[user_id >> 3] &= ~(1 << (user_id & 7)) & 0xFF
+
+    def _publish(self, message: str):
+        if self.client is None:
+            return
+        try:
+            self.client.publish(EVENTS_CHANNEL, message)
+        except Exception as e:
+            logger.warning(f"Failed to broadcast activity event: {e}")
+
+    def _ensure_subscriber(self):
+        if self.client is None or self._subscriber is not None:
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            self._subscriber = threading.Thread(
+                target=self._listen, name="activity-events", daemon=True
+            )
+            self._subscriber.start()
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                backoff = 1.0
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        _, user_id, active, last_seen = message["data"].split(":")
+                        self.update(int(user_id), active == "1", int(last_seen), broadcast=False)
+            except Exception as e:
+                logger.warning(f"Activity event subscriber error: {e}. Reconnecting in {backoff}s")
+                # Events may have been missed while disconnected
+                self.load_in_background()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    # Queries (None means "not loaded, ask the database")
+
+    @property
+    def ready(self) -> bool:
+        if self._ready and self.max_age and time.monotonic() - self._built_at > self.max_age:
+            # Periodic safety reload; keep serving the current copy meanwhile
+            self._built_at = time.monotonic()
+            self.load_in_background()
+        return self._ready
+
+    def is_active(self, user_id: int) -> Optional[bool]:
+        if not self.ready:
+            return None
+        byte = user_id >> 3
+        return byte < len(self._active) and bool(self._active[byte] & (1 << (user_id & 7)))
+
+    def active_ids(self, user_ids: Iterable[int]) -> Optional[Set[int]]:
+        """The given users that count as active"""
+        if not self.ready:
+            return None
+        with self._lock:
+            active, size = self._active, len(self._active)
+            return {
+                user_id for user_id in user_ids
+                if (user_id >> 3) < size and active[user_id >> 3] & (1 << (user_id & 7))
+            }
+
+    def active_since(self, user_ids: Iterable[int], cutoff: datetime) -> Optional[Set[int]]:
+        """The given users whose last activity is at or after cutoff"""
+        if not self.ready:
+            return None
+        threshold = _epoch_seconds(cutoff)
+        with self._lock:
+            last_seen, size = self._last_seen, len(self._last_seen)
+            return {
+                user_id for user_id in user_ids
+                if user_id < size and last_seen[user_id] and last_seen[user_id] >= threshold
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "active": sum(bin(byte).count("1") for byte in self._active),
+                "age_seconds": round(time.monotonic() - self._built_at, 1) if self._ready else None,
+            }
+
+
+activity_index = ActivityIndex(client=redis_client, max_age=settings.ACTIVITY_INDEX_MAX_AGE)
+
+
+# Activity changes are applied after their transaction commits. They are
+# collected and broadcast even when this process hasn't loaded the index
+# (API workers writing for Celery, say); update() skips only the local copy.
+
+@event.listens_for(Session, "after_flush")
+def _collect_activity_changes(session, flush_context):
+    pending: Dict[int, tuple] = session.info.setdefault(PENDING_EVENTS_KEY, {})
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        if obj in session.new or any(
+            attrs[name].history.has_changes()
+            for name in ("is_active", "activity_status", "last_activity_date")
+        ):
+            pending[obj.id] = (
+                _counts_as_active(obj.is_active, obj.activity_status),
+                _epoch_seconds(obj.last_activity_date)
+            )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_activity_changes(session):
+    pending = session.info.pop(PENDING_EVENTS_KEY, None)
+    if not pending:
+        return
+    for user_id, (active, last_seen) in pending.items():
+        activity_index.update(user_id, active, last_seen)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_activity_changes(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
@@ -22,6 +22,78 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
+
+    # System config cache
+    CONFIG_CACHE_SIZE: int = 512
+    CONFIG_CACHE_LOCAL_TTL: float = 60.0  # seconds; safety net if pub/sub drops a message
+    CONFIG_CACHE_SHARED_TTL: int = 3600  # seconds
+
+    # RBAC permission snapshot cache
+    RBAC_CACHE_TTL: int = 300  # seconds
+
+    # Authenticated principal cache
+    PRINCIPAL_CACHE_TTL: int = 900  # seconds
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12  # stored hashes with a different cost are rehashed on login
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64  # hashes queued beyond this are rejected with 503
+
+    # JWT verification
+    TOKEN_VERIFY_CACHE_SIZE: int = 4096  # recently verified tokens kept until they expire
+
+    # Team turnover ledger
+    TURNOVER_WRITE_BEHIND: bool = True  # False applies purchase turnover to the upline immediately
+    TURNOVER_FLUSH_INTERVAL: float = 10.0  # seconds between aggregator runs
+    TURNOVER_BATCH_SIZE: int = 5000
+
+    # Team aggregates
+    TEAM_AGGREGATE_FLUSH_INTERVAL: float = 10.0  # seconds between runs counting new registrations into the upline
+    TEAM_AGGREGATE_BATCH_SIZE: int = 5000
+
+    # In-memory genealogy (sponsor tree) index
+    GENEALOGY_INDEX_ENABLED: bool = True
+    GENEALOGY_INDEX_REBUILD_THRESHOLD: int = 1000  # new members before the Euler tour is rebuilt
+    GENEALOGY_INDEX_MAX_AGE: float = 3600.0  # seconds; full reload from the database as a safety net
+    GENEALOGY_PATH_CACHE_SIZE: int = 200000  # cached upline paths before the cache is reset
+    ACTIVITY_INDEX_ENABLED: bool = True
+    ACTIVITY_INDEX_MAX_AGE: float = 900.0  # seconds; full reload from the database as a safety net
+    
+    # Unilevel bonus worker
+    BONUS_WORKER_ENABLED: bool = True  # False pays purchase bonuses inside the request
+    BONUS_BATCH_SIZE: int = 200
+    BONUS_BATCH_MAX_WAIT: float = 0.5  # seconds a batch stays open after its first purchase
+    BONUS_RECOVERY_DELAY: float = 120.0  # seconds before an unmarked purchase is swept up
+    BONUS_MAX_ATTEMPTS: int = 5  # failures before a purchase is moved to the dead-letter list
+    INFINITY_CHUNK_SIZE: int = 1000  # eligible users paid per checkpointed chunk
+    
+    # Purchase completion pipeline
+    PURCHASE_SAGA_ENABLED: bool = True  # False runs the completion steps inside the request
+    PURCHASE_SAGA_MAX_ATTEMPTS: int = 5
+    PURCHASE_SAGA_RETRY_DELAY: float = 30.0  # seconds before the first retry, doubled after each failure
+    PURCHASE_SAGA_STALE_AFTER: float = 300.0  # seconds before a running job is considered abandoned
+    
+    # Email/notification outbox
+    OUTBOX_BATCH_SIZE: int = 100  # messages claimed per dispatcher pass
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_DELAY: float = 30.0  # seconds before the first retry, doubled after each failure
+    OUTBOX_DISPATCH_INTERVAL: float = 5.0  # seconds between dispatcher runs
+    
+    # Email delivery
+    EMAIL_BACKEND: str = "resend"  # resend, smtp (uses the smtp_* admin settings) or file
+    EMAIL_FILE_PATH: str = "emails.jsonl"  # where the file backend appends messages
+    EMAIL_CONCURRENCY: int = 10  # provider requests in flight per process
+    EMAIL_RATE_LIMIT: float = 2.0  # provider requests per second per process, 0 = unlimited
+    EMAIL_MAX_RETRIES: int = 3  # retries after a 429, 5xx or connection error
+    EMAIL_TIMEOUT: float = 10.0
+    
+    # Notification counters
+    NOTIFICATION_COUNTS_TTL: int = 86400  # seconds a user's cached total/unread counts live in Redis
+    
+    # Live event streams (/notifications/stream)
+    LIVE_EVENTS_ENABLED: bool = True
+    LIVE_EVENTS_HEARTBEAT: float = 15.0  # seconds between keep-alive comments on idle streams
+    LIVE_EVENTS_QUEUE_SIZE: int = 100  # undelivered events per stream before it is told to resync
     
     # Application
     APP_NAME: str = "Rest Empire API"
@@ -0,0 +1,219 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+VALUE_KEY = "config:value:{key}"
+VERSION_KEY = "config:version:{key}"
+INVALIDATION_CHANNEL = "config:invalidate"
+
+# Marker for keys that are known to be absent from system_config, so that
+# missing optional settings don't fall through to the database every time.
+_MISSING = object()
+
+
+class ConfigCache:
+    """Two-tier cache for system_config values.
+
+    Tier 1 is a per-process LRU, tier 2 is a shared Redis copy. Every key has
+    a version counter in Redis that is bumped on write; values stamped with an
+    older version are ignored, and the bump is broadcast over pub/sub so other
+    workers drop their local copy.
+    """
+
+    def __init__(self, client=None, maxsize: int = 512, local_ttl: float = 60.0, shared_ttl: int = 3600):
+        self.client = client
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+        self._subscriber: Optional[threading.Thread] = None
+
+        self._stats = {
+            "local_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+        }
+
+    # Lookup
+
+    def get(self, key: str, loader: Callable[[], Optional[str]]) -> Optional[str]:
+        """Return the cached value for key, calling loader on a full miss"""
+        self._ensure_subscriber()
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._local.move_to_end(key)
+                self._stats["local_hits"] += 1
+                return None if entry[0] is _MISSING else entry[0]
+            generation = self._generations.get(key, 0)
+
+        version = None
+        if self.client is not None:
+            try:
+                raw, version = self.client.mget(VALUE_KEY.format(key=key), VERSION_KEY.format(key=key))
+                version = int(version or 0)
+                if raw is not None:
+                    payload = json.loads(raw)
+                    if payload.get("v") == version:
+                        value = payload.get("value", None)
+                        self._store_local(key, value if value is not None else _MISSING, generation)
+                        with self._lock:
+                            self._stats["shared_hits"] += 1
+                        return value
+            except Exception as e:
+                logger.warning(f"Config cache shared tier unavailable: {e}")
+                version = None
+
+        value = loader()
+        with self._lock:
+            self._stats["misses"] += 1
+        self._store_local(key, value if value is not None else _MISSING, generation)
+
+        if self.client is not None and version is not None:
+            try:
+                self.client.set(
+                    VALUE_KEY.format(key=key),
+                    json.dumps({"v": version, "value": value}),
+                    ex=self.shared_ttl
+                )
+            except Exception as e:
+                logger.warning(f"Failed to populate shared config cache for {key}: {e}")
+
+        return value
+
+    def _store_local(self, key: str, value: Any, generation: int):
+        with self._lock:
+            # An invalidation arrived while the value was being loaded; the
+            # value may predate the write, so don't keep it.
+            if self._generations.get(key, 0) != generation:
+                return
+            self._local[key] = (value, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    # Invalidation
+
+    def invalidate(self, key: str):
+        """Drop key everywhere after a write to system_config"""
+        self._drop_local(key)
+        with self._lock:
+            self._stats["invalidations"] += 1
+
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline()
+                pipe.incr(VERSION_KEY.format(key=key))
+                pipe.delete(VALUE_KEY.format(key=key))
+                pipe.publish(INVALIDATION_CHANNEL, key)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to broadcast config invalidation for {key}: {e}")
+
+        self._notify(key)
+
+    def clear(self):
+        """Drop every locally cached value"""
+        with self._lock:
+            for key in self._local:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._local.clear()
+        self._notify(None)
+
+    def _drop_local(self, key: str):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._local.pop(key, None)
+
+    # Change listeners
+
+    def add_listener(self, callback: Callable[[Optional[str]], None]):
+        """Register a callback run with the changed key (None means everything)"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def _notify(self, key: Optional[str]):
+        for callback in list(self._listeners):
+            try:
+                callback(key)
+            except Exception as e:
+                logger.error(f"Config change listener failed: {e}", exc_info=True)
+
+    # Pub/sub fan-out
+
+    def _ensure_subscriber(self):
+        if self.client is None or self._subscriber is not None:
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            self._subscriber = threading.Thread(
+                target=self._listen, name="config-cache-invalidation", daemon=True
+            )
+            self._subscriber.start()
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached before the subscription was live may have
+                # missed an invalidation.
+                self.clear()
+                backoff = 1.0
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        key = message["data"]
+                        self._drop_local(key)
+                        with self._lock:
+                            self._stats["remote_invalidations"] += 1
+                        self._notify(key)
+            except Exception as e:
+                logger.warning(f"Config invalidation subscriber error: {e}. Reconnecting in {backoff}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    # Metrics
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_size"] = len(self._local)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        stats["shared_tier"] = self.client is not None
+        return stats
+
+
+config_cache = ConfigCache(
+    client=redis_client,
+    maxsize=settings.CONFIG_CACHE_SIZE,
+    local_ttl=settings.CONFIG_CACHE_LOCAL_TTL,
+    shared_ttl=settings.CONFIG_CACHE_SHARED_TTL
+)
@@ -0,0 +1,573 @@
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "genealogy:events"
+PENDING_EVENTS_KEY = "genealogy_events"
+NONE = -1
+
+
+class GenealogyIndex:
+    """Array-backed, in-memory copy of the sponsor tree.
+
+    Arrays are indexed directly by user id (ids are dense serials): parent
+    (sponsor id), depth, and Euler-tour tin/tout, where a subtree is the
+    contiguous tour range [tin, tout]. Nodes registered since the last tour
+    build are kept in a small overflow set and resolved by walking parents,
+    and the tour is rebuilt once that set grows past a threshold.
+
+    The team_members closure table stays the source of truth; every query
+    method returns None when the index is not loaded, or does not know the
+    user yet (its registration event is still on its way), so callers can
+    fall back to SQL. Changes are broadcast over Redis so every worker stays
+    current.
+    """
+
+    def __init__(self, client=None, rebuild_threshold: int = 1000, max_age: float = 3600.0, path_cache_size: int = 200000):
+        self.client = client
+        self.rebuild_threshold = rebuild_threshold
+        self.max_age = max_age
+        self.path_cache_size = path_cache_size
+
+        self._lock = threading.RLock()
+        self._ready = False
+        self._loading = False
+        self._built_at = 0.0
+        self._subscriber: Optional[threading.Thread] = None
+
+        self._parent = array("i")
+        self._depth = array("i")
+        self._tin = array("i")
+        self._tout = array("i")
+        self._order = array("i")  # tour position -> user id
+        self._level_tins: List[array] = []  # absolute depth -> sorted tins
+        self._recent: Dict[int, int] = {}  # user id -> sponsor id, not yet in the tour
+        self._paths: Dict[Tuple[int, int], array] = {}  # (user id, max depth) -> upline ids
+        self._replay: Optional[List[Tuple[int, int]]] = None  # registrations seen during a load
+        self._generation = 0  # bumped by every invalidation
+
+    # Building
+
+    def load(self, db: Session) -> bool:
+        """(Re)load the sponsor tree from the users table.
+
+        Returns False, leaving the index not ready, when a sponsor change or
+        deletion was invalidated while the rows were being read; the caller
+        should load again.
+        """
+        with self._lock:
+            # Registrations committed after the SELECT are not in its rows
+            self._replay = []
+            generation = self._generation
+        try:
+            rows = db.query(User.id, User.sponsor_id).all()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        size = max((row.id for row in rows), default=0) + 1
+        parent = array("i", [NONE]) * size
+        present = bytearray(size)
+        for user_id, sponsor_id in rows:
+            parent[user_id] = sponsor_id if sponsor_id is not None else NONE
+            present[user_id] = 1
+        tour = self._build_tour(parent, present)
+
+        with self._lock:
+            if self._generation != generation:
+                # The rows may predate a sponsor change; don't serve them
+                self._replay = None
+                logger.info("Genealogy index changed during load; reloading")
+                return False
+            self._parent = parent
+            self._install(tour)
+            self._recent = {}
+            self._paths = {}
+            replay, self._replay = self._replay or [], None
+            for user_id, sponsor_id in replay:
+                self._insert(user_id, sponsor_id)
+            self._ready = True
+            self._built_at = time.monotonic()
+        logger.info(f"Genealogy index loaded: {len(rows)} users, {len(replay)} replayed")
+        return True
+
+    def load_in_background(self):
+        """Load without blocking the caller; queries fall back to SQL meanwhile"""
+        from app.core.database import SessionLocal
+
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def run():
+            db = SessionLocal()
+            try:
+                # Each retry means another invalidation landed mid-load
+                while not self.load(db):
+                    db.rollback()
+            except Exception as e:
+                logger.warning(f"Genealogy index load failed: {e}")
+            finally:
+                db.close()
+                with self._lock:
+                    self._loading = False
+
+        self._ensure_subscriber()
+        threading.Thread(target=run, name="genealogy-index-load", daemon=True).start()
+
+    @staticmethod
+    def _build_tour(parent: array, present: bytearray):
+        size = len(parent)
+        # Children in CSR form: child_ids[child_start[p]:child_start[p + 1]]
+        counts = array("i", [0]) * (size + 1)
+        roots = []
+        is_root = bytearray(size)
+        for user_id in range(size):
+            if not present[user_id]:
+                continue
+            sponsor_id = parent[user_id]
+            if sponsor_id == NONE or sponsor_id >= size or not present[sponsor_id]:
+                is_root[user_id] = 1
+                roots.append(user_id)
+            else:
+                counts[sponsor_id + 1] += 1
+        child_start = array("i", [0]) * (size + 1)
+        for i in range(size):
+            child_start[i + 1] = child_start[i] + counts[i + 1]
+        child_ids = array("i", [0]) * child_start[size]
+        fill = array("i", child_start)
+        for user_id in range(size):
+            if present[user_id] and not is_root[user_id]:
+                sponsor_id = parent[user_id]
+                child_ids[fill[sponsor_id]] = user_id
+                fill[sponsor_id] += 1
+
+        depth = array("i", [NONE]) * size
+        tin = array("i", [NONE]) * size
+        tout = array("i", [NONE]) * size
+        order = array("i")
+        level_tins: List[array] = []
+
+        for root in roots:
+            depth[root] = 0
+            stack = [(root, False)]
+            while stack:
+                user_id, done = stack.pop()
+                if done:
+                    tout[user_id] = len(order) - 1
+                    continue
+                tin[user_id] = len(order)
+                order.append(user_id)
+                d = depth[user_id]
+                if d == len(level_tins):
+                    level_tins.append(array("i"))
+                level_tins[d].append(tin[user_id])
+                stack.append((user_id, True))
+                for i in range(child_start[user_id + 1] - 1, child_start[user_id] - 1, -1):
+                    child = child_ids[i]
+                    depth[child] = d + 1
+                    stack.append((child, False))
+
+        return depth, tin, tout, order, level_tins
+
+    def _install(self, tour):
+        self._depth, self._tin, self._tout, self._order, self._level_tins = tour
+
+    def _rebuild_tour(self):
+        with self._lock:
+            source = self._parent
+            parent = array("i", source)
+            known = array("i", self._depth)
+            folded = set(self._recent)
+        present = bytearray(len(parent))
+        for user_id in range(min(len(parent), len(known))):
+            if known[user_id] != NONE:
+                present[user_id] = 1
+        tour = self._build_tour(parent, present)
+
+        with self._lock:
+            if self._parent is not source:
+                # A reload replaced the tree meanwhile; its tour is newer
+                return
+            depth, tin, tout = tour[0], tour[1], tour[2]
+            # Keep nodes that registered while the tour was being built
+            for user_id, sponsor_id in self._recent.items():
+                if user_id not in folded:
+                    for values in (depth, tin, tout):
+                        self._grow(values, user_id)
+                    depth[user_id] = depth[sponsor_id] + 1 if sponsor_id != NONE else 0
+            self._install(tour)
+            for user_id in folded:
+                self._recent.pop(user_id, None)
+        logger.info(f"Genealogy tour rebuilt with {len(folded)} new members")
+
+    # Change events
+
+    def add_member(self, user_id: int, sponsor_id: Optional[int], broadcast: bool = True):
+        """Record a newly registered user"""
+        sponsor = sponsor_id if sponsor_id is not None else NONE
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((user_id, sponsor))
+            if self._ready:
+                self._insert(user_id, sponsor)
+                rebuild = len(self._recent) >= self.rebuild_threshold
+            else:
+                rebuild = False
+        if broadcast:
+            self._publish(f"add:{user_id}:{sponsor_id if sponsor_id is not None else ''}")
+        if rebuild:
+            threading.Thread(target=self._rebuild_tour, name="genealogy-tour-rebuild", daemon=True).start()
+
+    def _insert(self, user_id: int, sponsor: int):
+        # A member whose sponsor is unknown (events arriving out of order)
+        # stays unknown too; queries for it fall back to SQL until a reload
+        if self._known(user_id) or (sponsor != NONE and not self._known(sponsor)):
+            return
+        for values in (self._parent, self._depth, self._tin, self._tout):
+            self._grow(values, user_id)
+        self._parent[user_id] = sponsor
+        self._depth[user_id] = self._depth[sponsor] + 1 if sponsor != NONE else 0
+        self._recent[user_id] = sponsor
+
+    def invalidate(self, broadcast: bool = True):
+        """Drop the index after a sponsor change or deletion and reload it.
+
+        A load already running notices the new generation and starts over
+        instead of installing rows read before the change.
+        """
+        with self._lock:
+            was_ready = self._ready
+            self._ready = False
+            self._generation += 1
+        if broadcast:
+            self._publish("reload")
+        if was_ready:
+            self.load_in_background()
+
+    @staticmethod
+    def _grow(values: array, user_id: int):
+        if user_id >= len(values):
+            values.extend(array("i", [NONE]) * (user_id + 1 - len(values)))
+
+    def _publish(self, message: str):
+        if self.client is None:
+            return
+        try:
+            self.client.publish(EVENTS_CHANNEL, message)
+        except Exception as e:
+            logger.warning(f"Failed to broadcast genealogy event: {e}")
+
+    def _ensure_subscriber(self):
+        if self.client is None or self._subscriber is not None:
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            self._subscriber = threading.Thread(
+                target=self._listen, name="genealogy-events", daemon=True
+            )
+            self._subscriber.start()
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                backoff = 1.0
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._apply_remote(message["data"])
+            except Exception as e:
+                logger.warning(f"Genealogy event subscriber error: {e}. Reconnecting in {backoff}s")
+                # Events may have been missed while disconnected
+                self.invalidate(broadcast=False)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _apply_remote(self, message: str):
+        if message == "reload":
+            self.invalidate(broadcast=False)
+        elif message.startswith("add:"):
+            _, user_id, sponsor_id = message.split(":")
+            self.add_member(int(user_id), int(sponsor_id) if sponsor_id else None, broadcast=False)
+
+    # Queries (None means "not loaded or user not known, ask the database")
+
+    @property
+    def ready(self) -> bool:
+        if self._ready and self.max_age and time.monotonic() - self._built_at > self.max_age:
+            # Periodic safety reload; keep serving the current copy meanwhile
+            self._built_at = time.monotonic()
+            self.load_in_background()
+        return self._ready
+
+    def _known(self, user_id: int) -> bool:
+        return 0 <= user_id < len(self._depth) and self._depth[user_id] != NONE
+
+    def ancestors(self, user_id: int, max_depth: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+        """(ancestor_id, relative depth) pairs from the sponsor upwards; O(depth)"""
+        if not self.ready:
+            return None
+        with self._lock:
+            if not self._known(user_id):
+                return None
+            chain = []
+            current = self._parent[user_id]
+            level = 1
+            while current != NONE and (max_depth is None or level <= max_depth):
+                chain.append((current, level))
+                current = self._parent[current]
+                level += 1
+            return chain
+
+    def ancestor_path(self, user_id: int, max_depth: int = 15) -> Optional[array]:
+        """Upline ids as a compact array; the ancestor at level n is path[n - 1].
+
+        Paths are cached: a sponsor change or deletion reloads the index,
+        and new registrations never change an existing member's upline.
+        """
+        if not self.ready:
+            return None
+        key = (user_id, max_depth)
+        with self._lock:
+            path = self._paths.get(key)
+            if path is not None:
+                return path
+            if not self._known(user_id):
+                # The registration event may still be on its way
+                return None
+            path = array("I")
+            current = self._parent[user_id]
+            while current != NONE and len(path) < max_depth:
+                path.append(current)
+                current = self._parent[current]
+            if len(self._paths) >= self.path_cache_size:
+                self._paths = {}
+            self._paths[key] = path
+            return path
+
+    def ancestor_paths(self, user_ids: Iterable[int], max_depth: int = 15) -> Optional[Dict[int, array]]:
+        """Paths for the users the index knows; the others are left out"""
+        if not self.ready:
+            return None
+        paths = {}
+        for user_id in user_ids:
+            path = self.ancestor_path(user_id, max_depth)
+            if path is not None:
+                paths[user_id] = path
+        return paths
+
+    def depth_below(self, ancestor_id: int, user_id: int) -> Optional[int]:
+        """Levels between ancestor and user, or -1 if user is not in the downline"""
+        if not self.ready:
+            return None
+        with self._lock:
+            if not (self._known(ancestor_id) and self._known(user_id)):
+                return None
+            if self._is_descendant(ancestor_id, user_id):
+                return self._depth[user_id] - self._depth[ancestor_id]
+            return NONE
+
+    def is_in_downline(self, ancestor_id: int, user_id: int) -> Optional[bool]:
+        """Whether user is strictly below ancestor; O(1) for toured nodes"""
+        depth = self.depth_below(ancestor_id, user_id)
+        return None if depth is None else depth > 0
+
+    def _is_descendant(self, ancestor_id: int, user_id: int) -> bool:
+        # Inclusive: a node is its own descendant
+        current = user_id
+        while current != NONE and self._tin[current] == NONE:
+            if current == ancestor_id:
+                return True
+            current = self._parent[current]
+        if current == NONE:
+            return False
+        if current == ancestor_id:
+            return True
+        a_tin = self._tin[ancestor_id]
+        return a_tin != NONE and a_tin <= self._tin[current] <= self._tout[ancestor_id]
+
+    def team_size(self, user_id: int) -> Optional[int]:
+        """Downline size (excluding the user); O(1) plus recent registrations"""
+        if not self.ready:
+            return None
+        with self._lock:
+            if not self._known(user_id):
+                return None
+            size = 0
+            if self._tin[user_id] != NONE:
+                size = self._tout[user_id] - self._tin[user_id]
+            size += sum(
+                1 for recent_id in self._recent
+                if recent_id != user_id and self._is_descendant(user_id, recent_id)
+            )
+            return size
+
+    def team_sizes(self, user_ids: Iterable[int]) -> Optional[Dict[int, int]]:
+        """Sizes for the users the index knows; the others are left out"""
+        if not self.ready:
+            return None
+        sizes = {}
+        for user_id in user_ids:
+            size = self.team_size(user_id)
+            if size is not None:
+                sizes[user_id] = size
+        return sizes
+
+    def level_counts(self, user_id: int, max_levels: Optional[int] = None) -> Optional[Dict[int, int]]:
+        """Downline member count per relative level; O(levels * log n)"""
+        if not self.ready:
+            return None
+        with self._lock:
+            if not self._known(user_id):
+                return None
+            counts: Dict[int, int] = {}
+            base = self._depth[user_id]
+            tin, tout = self._tin[user_id], self._tout[user_id]
+            if tin != NONE:
+                level = 1
+                while base + level < len(self._level_tins) and (max_levels is None or level <= max_levels):
+                    tins = self._level_tins[base + level]
+                    count = bisect_right(tins, tout) - bisect_left(tins, tin)
+                    if count:
+                        counts[level] = count
+                    level += 1
+            for recent_id in self._recent:
+                level = self._depth[recent_id] - base
+                if level > 0 and (max_levels is None or level <= max_levels) and self._is_descendant(user_id, recent_id):
+                    counts[level] = counts.get(level, 0) + 1
+            return counts
+
+    def downline_ids(self, user_id: int, max_depth: Optional[int] = None) -> Optional[List[int]]:
+        """All user ids in the downline (optionally limited to max_depth levels)"""
+        if not self.ready:
+            return None
+        with self._lock:
+            if not self._known(user_id):
+                return None
+            base = self._depth[user_id]
+            ids = []
+            tin = self._tin[user_id]
+            if tin != NONE:
+                for member_id in self._order[tin + 1:self._tout[user_id] + 1]:
+                    if max_depth is None or self._depth[member_id] - base <= max_depth:
+                        ids.append(member_id)
+            for recent_id in self._recent:
+                level = self._depth[recent_id] - base
+                if level > 0 and (max_depth is None or level <= max_depth) and self._is_descendant(user_id, recent_id):
+                    ids.append(recent_id)
+            return ids
+
+    # Consistency
+
+    def check_consistency(self, db: Session, limit: Optional[int] = None) -> Dict:
+        """Compare the index against the team_members closure table"""
+        from app.models.team import TeamMember
+
+        if not self.ready:
+            return {"ready": False}
+
+        query = db.query(
+            TeamMember.user_id, TeamMember.ancestor_id, TeamMember.depth
+        ).filter(TeamMember.depth > 0).order_by(TeamMember.user_id)
+        if limit:
+            user_ids = [row[0] for row in db.query(TeamMember.user_id).filter(
+                TeamMember.depth == 0
+            ).order_by(TeamMember.user_id).limit(limit).all()]
+            query = query.filter(TeamMember.user_id.in_(user_ids))
+        else:
+            user_ids = [row[0] for row in db.query(TeamMember.user_id).filter(TeamMember.depth == 0).all()]
+
+        closure: Dict[int, set] = {user_id: set() for user_id in user_ids}
+        for user_id, ancestor_id, depth in query.yield_per(10000):
+            closure.setdefault(user_id, set()).add((ancestor_id, depth))
+
+        mismatched = [
+            user_id for user_id, expected in closure.items()
+            if set(self.ancestors(user_id) or []) != expected
+        ]
+        if mismatched:
+            logger.warning(f"Genealogy index disagrees with team_members for {len(mismatched)} users")
+        return {
+            "ready": True,
+            "checked": len(closure),
+            "mismatched_count": len(mismatched),
+            "mismatched": mismatched[:100]
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "members": len(self._order) + len(self._recent),
+                "pending_tour_inserts": len(self._recent),
+                "cached_paths": len(self._paths),
+                "max_depth": max(len(self._level_tins) - 1, 0),
+                "age_seconds": round(time.monotonic() - self._built_at, 1) if self._ready else None,
+            }
+
+
+genealogy_index = GenealogyIndex(
+    client=redis_client,
+    rebuild_threshold=settings.GENEALOGY_INDEX_REBUILD_THRESHOLD,
+    max_age=settings.GENEALOGY_INDEX_MAX_AGE,
+    path_cache_size=settings.GENEALOGY_PATH_CACHE_SIZE
+)
+
+
+# New users are added after their transaction commits; sponsor changes and
+# deletions reload the index. Changes are broadcast even when this process
+# hasn't loaded the index; only the local update is skipped.
+
+@event.listens_for(Session, "after_flush")
+def _collect_genealogy_changes(session, flush_context):
+    pending = session.info.setdefault(PENDING_EVENTS_KEY, {"added": [], "reload": False})
+    for obj in session.new:
+        if isinstance(obj, User):
+            pending["added"].append((obj.id, obj.sponsor_id))
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.sponsor_id.history.has_changes():
+            pending["reload"] = True
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            pending["reload"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_genealogy_changes(session):
+    pending = session.info.pop(PENDING_EVENTS_KEY, None)
+    if not pending:
+        return
+    if pending["reload"]:
+        genealogy_index.invalidate()
+        return
+    for user_id, sponsor_id in pending["added"]:
+        genealogy_index.add_member(user_id, sponsor_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_genealogy_changes(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
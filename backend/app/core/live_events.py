@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "live:events"
+PENDING_EVENTS_KEY = "live_events"
+BALANCE_COLUMNS = {"balance_ngn": "NGN", "balance_usdt": "USDT"}
+
+
+class LiveEventHub:
+    """Fans out per-user events to server-sent event streams.
+
+    Committed events are published to one Redis channel; every node keeps a
+    single subscription and routes each event to the bounded in-memory
+    queues of that user's open streams, so an idle stream costs a queue and
+    a suspended coroutine, not a connection or a DB session. Without Redis
+    events are delivered to streams in this process only.
+    """
+
+    def __init__(self, client=None, redis_url: str = None, queue_size: int = 100, heartbeat: float = 15.0):
+        self.client = client
+        self.redis_url = redis_url
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+
+        self._streams: Dict[int, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    # Publishing (any thread)
+
+    def publish(self, events: List[Dict]):
+        """Send committed events ({"user_id", "type", "data"}) to every node"""
+        if not events:
+            return
+        self._stats["published"] += len(events)
+        if self.client is not None:
+            try:
+                self.client.publish(EVENTS_CHANNEL, json.dumps(events))
+                return
+            except Exception as e:
+                logger.warning(f"Failed to publish live events: {e}")
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._dispatch, events)
+
+    # Delivery (event loop)
+
+    def _dispatch(self, events: List[Dict]):
+        for item in events:
+            for queue in self._streams.get(item["user_id"], ()):
+                try:
+                    queue.put_nowait(item)
+                    self._stats["delivered"] += 1
+                except asyncio.QueueFull:
+                    # A stalled client gets one resync marker instead of an
+                    # unbounded backlog
+                    self._stats["dropped"] += 1
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait({"user_id": item["user_id"], "type": "resync", "data": {}})
+
+    async def _listen(self):
+        from redis import asyncio as aioredis
+
+        backoff = 1.0
+        while True:
+            client = pubsub = None
+            try:
+                client = aioredis.from_url(self.redis_url, decode_responses=True)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Live event subscriber error: {e}. Reconnecting in {backoff}s")
+                # Streams may have missed events; let clients refetch
+                self._dispatch([{"user_id": user_id, "type": "resync", "data": {}} for user_id in list(self._streams)])
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                        await client.aclose()
+                    except Exception:
+                        pass
+
+    def _register(self, user_id: int) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is not loop:
+                self._loop = loop
+                self._listener = None
+        if self._listener is None and self.client is not None and self.redis_url:
+            self._listener = loop.create_task(self._listen())
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._streams.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def _unregister(self, user_id: int, queue: asyncio.Queue):
+        queues = self._streams.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._streams[user_id]
+
+    async def stream(self, user_id: int) -> AsyncIterator[str]:
+        """Server-sent event frames for one user until the client disconnects"""
+        queue = self._register(user_id)
+        try:
+            yield f"retry: 5000\nevent: ready\ndata: {{}}\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing idle connections
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {item['type']}\ndata: {json.dumps(item['data'])}\n\n"
+        finally:
+            self._unregister(user_id, queue)
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "streams": sum(len(queues) for queues in self._streams.values()),
+            "users": len(self._streams),
+        }
+
+
+live_events = LiveEventHub(
+    client=redis_client,
+    redis_url=settings.REDIS_URL,
+    queue_size=settings.LIVE_EVENTS_QUEUE_SIZE,
+    heartbeat=settings.LIVE_EVENTS_HEARTBEAT
+)
+
+
+def stage_event(db: Session, user_id: int, event_type: str, data: Dict):
+    """Push an event to the user's streams once the current transaction commits"""
+    db.info.setdefault(PENDING_EVENTS_KEY, []).append({"user_id": user_id, "type": event_type, "data": data})
+
+
+# Balance changes made through the ORM (payouts, single-user updates) are
+# picked up here; bulk ledger updates stage their own events
+
+@event.listens_for(Session, "after_flush")
+def _collect_balance_changes(session, flush_context):
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        for column, currency in BALANCE_COLUMNS.items():
+            if attrs[column].history.has_changes():
+                stage_event(session, obj.id, "balance", {"currency": currency, "balance": float(getattr(obj, column) or 0)})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    pending = session.info.pop(PENDING_EVENTS_KEY, None)
+    if pending and settings.LIVE_EVENTS_ENABLED:
+        live_events.publish(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
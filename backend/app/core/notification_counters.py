@@ -0,0 +1,111 @@
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+COUNTS_KEY = "notifications:counts:{user_id}"
+PENDING_DELTAS_KEY = "notification_count_deltas"
+
+# Only adjust counters that exist; a missing hash is rebuilt from the
+# table on the next read, so increments never resurrect a partial one
+_APPLY_DELTA = """
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('hincrby', KEYS[1], 'total', ARGV[1])
+    redis.call('hincrby', KEYS[1], 'unread', ARGV[2])
+end
+return 0
+"""
+
+
+class NotificationCounters:
+    """Per-user total/unread notification counts kept in Redis.
+
+    Counts are loaded from the table on a miss and then adjusted by deltas
+    applied after each commit that writes, reads or deletes notifications.
+    The TTL bounds any drift from a delta racing a reload. Without Redis
+    every read falls through to the loader.
+    """
+
+    def __init__(self, client=None, ttl: int = 86400):
+        self.client = client
+        self.ttl = ttl
+        self._script = client.register_script(_APPLY_DELTA) if client is not None else None
+
+    def get(self, user_id: int, loader: Callable[[], Tuple[int, int]]) -> Dict[str, int]:
+        """{"total", "unread"} for a user, calling loader() -> (total, unread) on a miss"""
+        key = COUNTS_KEY.format(user_id=user_id)
+        if self.client is not None:
+            try:
+                cached = self.client.hgetall(key)
+                if "total" in cached and "unread" in cached:
+                    return {"total": max(int(cached["total"]), 0), "unread": max(int(cached["unread"]), 0)}
+            except Exception as e:
+                logger.warning(f"Notification counters unavailable: {e}")
+                return self._counts(loader())
+
+        counts = self._counts(loader())
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline()
+                pipe.hset(key, mapping=counts)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to store notification counters: {e}")
+        return counts
+
+    @staticmethod
+    def _counts(loaded: Tuple[int, int]) -> Dict[str, int]:
+        total, unread = loaded
+        return {"total": int(total or 0), "unread": int(unread or 0)}
+
+    def apply(self, deltas: Dict[int, list]):
+        """Apply {user_id: [total_delta, unread_delta]} to existing counters"""
+        if self.client is None or not deltas:
+            return
+        try:
+            pipe = self.client.pipeline()
+            for user_id, (total, unread) in deltas.items():
+                if total or unread:
+                    self._script(keys=[COUNTS_KEY.format(user_id=user_id)], args=[total, unread], client=pipe)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update notification counters: {e}")
+            # Stale counters are worse than a recount
+            self.invalidate(deltas.keys())
+
+    def invalidate(self, user_ids):
+        if self.client is None:
+            return
+        try:
+            self.client.delete(*[COUNTS_KEY.format(user_id=user_id) for user_id in user_ids])
+        except Exception as e:
+            logger.warning(f"Failed to invalidate notification counters: {e}")
+
+
+notification_counters = NotificationCounters(client=redis_client, ttl=settings.NOTIFICATION_COUNTS_TTL)
+
+
+def stage_count_delta(db: Session, user_id: int, total: int = 0, unread: int = 0):
+    """Adjust a user's counters once the current transaction commits"""
+    delta = db.info.setdefault(PENDING_DELTAS_KEY, {}).setdefault(user_id, [0, 0])
+    delta[0] += total
+    delta[1] += unread
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_count_deltas(session):
+    deltas = session.info.pop(PENDING_DELTAS_KEY, None)
+    if deltas:
+        notification_counters.apply(deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_count_deltas(session):
+    session.info.pop(PENDING_DELTAS_KEY, None)
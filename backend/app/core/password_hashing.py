@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import bcrypt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HashingOverloadedError(RuntimeError):
+    """Raised when too many password hashes are already queued"""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL, so a small pool of threads keeps hashing off the
+    event loop (and off the request threadpool) while capping how many CPU
+    cores a login or registration storm can take. Work beyond max_pending is
+    rejected instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "rehashed": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+            "max_pending_seen": 0,
+        }
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="password-hash"
+                    )
+        return self._executor
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HashingOverloadedError("Password hashing queue is full")
+            self._pending += 1
+            self._stats["submitted"] += 1
+            self._stats["max_pending_seen"] = max(self._stats["max_pending_seen"], self._pending)
+
+    def _run(self, func: Callable, *args, enqueued_at: float):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._pending -= 1
+                self._stats["completed"] += 1
+                self._stats["total_wait_ms"] += (started - enqueued_at) * 1000
+                self._stats["total_run_ms"] += (finished - started) * 1000
+
+    def _submit(self, func: Callable, *args):
+        self._admit()
+        try:
+            return self.executor.submit(self._run, func, *args, enqueued_at=time.perf_counter())
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    # bcrypt primitives (run on the pool)
+
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    @staticmethod
+    def _verify(plain_password: str, hashed_password: str) -> bool:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    # Sync API, for sync endpoints running on the request threadpool
+
+    def hash(self, password: str) -> str:
+        return self._submit(self._hash, password).result()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._submit(self._verify, plain_password, hashed_password).result()
+
+    # Async API, for async endpoints
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self._hash, password))
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self._submit(self._verify, plain_password, hashed_password))
+
+    # Work factor upgrades
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Check whether a stored hash uses a different work factor"""
+        try:
+            # bcrypt hashes look like $2b$12$<salt+hash>
+            rounds = int(hashed_password.split("$")[2])
+        except (IndexError, ValueError):
+            return True
+        return rounds != self.rounds
+
+    def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password, returning a new hash if the work factor changed"""
+        if not self.verify(plain_password, hashed_password):
+            return False, None
+        if self.needs_rehash(hashed_password):
+            with self._lock:
+                self._stats["rehashed"] += 1
+            return True, self.hash(plain_password)
+        return True, None
+
+    async def verify_and_update_async(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Async variant of verify_and_update"""
+        if not await self.verify_async(plain_password, hashed_password):
+            return False, None
+        if self.needs_rehash(hashed_password):
+            with self._lock:
+                self._stats["rehashed"] += 1
+            return True, await self.hash_async(plain_password)
+        return True, None
+
+    def stats(self) -> Dict:
+        """Queue depth and latency metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+        completed = stats["completed"]
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / completed if completed else 0.0
+        stats["avg_run_ms"] = stats["total_run_ms"] / completed if completed else 0.0
+        stats["workers"] = self.workers
+        stats["max_pending"] = self.max_pending
+        stats["rounds"] = self.rounds
+        return stats
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS
+)
@@ -0,0 +1,206 @@
+from datetime import datetime
+from decimal import Decimal
+from itertools import chain
+from typing import Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.user import User
+from app.models.activation import UserActivation
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_KEY = "principal:{user_id}"
+PRINCIPAL_VERSION_KEY = "principal:version:{user_id}"
+SESSION_INFO_KEY = "principals"
+PENDING_INVALIDATIONS_KEY = "principal_invalidations"
+
+PRINCIPAL_FIELDS = (
+    "id", "email", "full_name", "is_active", "is_verified", "current_rank",
+    "balance_ngn", "balance_usdt", "total_earnings",
+    "activation_status", "activation_package_id", "activation_expires_at",
+    "updated_at",
+)
+_DECIMAL_FIELDS = {"balance_ngn", "balance_usdt", "total_earnings"}
+_DATETIME_FIELDS = {"activation_expires_at", "updated_at"}
+
+
+class AuthenticatedPrincipal:
+    """Slim, cacheable view of the authenticated user.
+
+    Holds the identity, status, rank, balance and activation fields most
+    endpoints need. Any other attribute (or any write) goes to the full
+    `User` row, which is loaded from the request session on first use.
+    """
+
+    __slots__ = PRINCIPAL_FIELDS + ("_db", "_user")
+
+    def __init__(self, db: Session, user: Optional[User] = None, **fields):
+        object.__setattr__(self, "_db", db)
+        object.__setattr__(self, "_user", user)
+        for name in PRINCIPAL_FIELDS:
+            object.__setattr__(self, name, fields.get(name))
+
+    @property
+    def user(self) -> User:
+        """The full ORM row, loaded lazily"""
+        if self._user is None:
+            if self._db is None:
+                raise RuntimeError("Principal is not bound to a session")
+            user = self._db.get(User, self.id)
+            if user is None:
+                raise LookupError(f"User {self.id} no longer exists")
+            object.__setattr__(self, "_user", user)
+        return self._user
+
+    def __getattr__(self, name):
+        # Only reached for attributes that are not principal fields
+        if name.startswith("_") or name == "user":
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+        if name in PRINCIPAL_FIELDS:
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"<AuthenticatedPrincipal id={self.id} email={self.email!r}>"
+
+    def to_cache(self) -> dict:
+        payload = {}
+        for name in PRINCIPAL_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, Decimal):
+                value = str(value)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            payload[name] = value
+        return payload
+
+    @classmethod
+    def from_cache(cls, db: Session, payload: dict) -> "AuthenticatedPrincipal":
+        fields = dict(payload)
+        for name in _DECIMAL_FIELDS:
+            if fields.get(name) is not None:
+                fields[name] = Decimal(fields[name])
+        for name in _DATETIME_FIELDS:
+            if fields.get(name):
+                fields[name] = datetime.fromisoformat(fields[name])
+        return cls(db, **fields)
+
+
+def _load_principal(db: Session, user_id: int) -> Optional[AuthenticatedPrincipal]:
+    row = db.query(
+        User.id, User.email, User.full_name, User.is_active, User.is_verified,
+        User.current_rank, User.balance_ngn, User.balance_usdt, User.total_earnings,
+        User.updated_at,
+        UserActivation.status.label("activation_status"),
+        UserActivation.package_id.label("activation_package_id"),
+        UserActivation.expires_at.label("activation_expires_at")
+    ).outerjoin(
+        UserActivation, UserActivation.user_id == User.id
+    ).filter(User.id == user_id).first()
+
+    if row is None:
+        return None
+    return AuthenticatedPrincipal(db, **row._asdict())
+
+
+def _cache_keys(user_id: int):
+    return PRINCIPAL_KEY.format(user_id=user_id), PRINCIPAL_VERSION_KEY.format(user_id=user_id)
+
+
+def get_principal(db: Session, user_id: int) -> Optional[AuthenticatedPrincipal]:
+    """Resolve the principal for user_id without loading the full user row.
+
+    Principals are memoized on the session for the rest of the request and
+    shared across requests through Redis, stamped with a per-user version that
+    every write to the user (or their activation) bumps.
+    """
+    principals = db.info.setdefault(SESSION_INFO_KEY, {})
+    principal = principals.get(user_id)
+    if principal is not None:
+        return principal
+
+    version = None
+    if redis_client is not None:
+        try:
+            raw, version = redis_client.mget(*_cache_keys(user_id))
+            version = int(version or 0)
+            if raw is not None:
+                payload = json.loads(raw)
+                if payload.get("v") == version:
+                    principal = AuthenticatedPrincipal.from_cache(db, payload["principal"])
+        except Exception as e:
+            logger.warning(f"Principal cache read failed for user {user_id}: {e}")
+            version = None
+
+    if principal is None:
+        principal = _load_principal(db, user_id)
+        if principal is None:
+            return None
+        if version is not None:
+            try:
+                redis_client.set(
+                    PRINCIPAL_KEY.format(user_id=user_id),
+                    json.dumps({"v": version, "principal": principal.to_cache()}),
+                    ex=settings.PRINCIPAL_CACHE_TTL
+                )
+            except Exception as e:
+                logger.warning(f"Principal cache write failed for user {user_id}: {e}")
+
+    principals[user_id] = principal
+    return principal
+
+
+def mark_principals_stale(db: Session, user_ids: Iterable[int]):
+    """Invalidate principals when db commits, for writes that bypass the ORM"""
+    db.info.setdefault(PENDING_INVALIDATIONS_KEY, set()).update(user_ids)
+
+
+def invalidate_principals(user_ids: Iterable[int]):
+    """Drop cached principals immediately"""
+    user_ids = [uid for uid in set(user_ids) if uid is not None]
+    if not user_ids or redis_client is None:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            principal_key, version_key = _cache_keys(user_id)
+            pipe.incr(version_key)
+            pipe.delete(principal_key)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Principal cache invalidation failed: {e}")
+
+
+# ORM writes to users and user_activations are picked up automatically: ids are
+# collected at flush time and invalidated once the transaction commits.
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session, flush_context):
+    pending = session.info.setdefault(PENDING_INVALIDATIONS_KEY, set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, User):
+            pending.add(obj.id)
+        elif isinstance(obj, UserActivation):
+            pending.add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_principal_changes(session):
+    pending = session.info.pop(PENDING_INVALIDATIONS_KEY, None)
+    if pending:
+        memo = session.info.get(SESSION_INFO_KEY, {})
+        for user_id in pending:
+            memo.pop(user_id, None)
+        invalidate_principals(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_changes(session):
+    session.info.pop(PENDING_INVALIDATIONS_KEY, None)
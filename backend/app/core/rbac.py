@@ -1,14 +1,57 @@
-from typing import List, Set
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional, Set, Tuple
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.redis import redis_client
 from app.models.user import User
 from app.models.permission import Permission
 from app.models.role import Role
 from app.models.user_role import UserRole
 from app.models.user_permission import UserPermission
 from app.models.role_permission import RolePermission
+import json
+import logging
 
-def get_user_permissions(db: Session, user: User) -> Set[str]:
-    """Get all permissions for a user (from roles + direct assignments)"""
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "rbac:snapshot:{user_id}"
+USER_VERSION_KEY = "rbac:version:{user_id}"
+VERSION_KEY = "rbac:version"
+SESSION_INFO_KEY = "rbac_snapshots"
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    """Compiled roles and permissions of one user"""
+    user_id: int
+    roles: FrozenSet[str]
+    permissions: FrozenSet[str]
+
+    def has_permission(self, permission: str) -> bool:
+        return permission in self.permissions
+
+    def has_any_permission(self, permissions: Iterable[str]) -> bool:
+        return any(p in self.permissions for p in permissions)
+
+    def has_all_permissions(self, permissions: Iterable[str]) -> bool:
+        return all(p in self.permissions for p in permissions)
+
+    def has_role(self, role_name: str) -> bool:
+        return role_name in self.roles
+
+    @property
+    def is_admin(self) -> bool:
+        return "super_admin" in self.roles or "admin" in self.roles
+
+def _load_user_roles(db: Session, user_id: int) -> Set[str]:
+    rows = db.query(Role.name).join(
+        UserRole, UserRole.role_id == Role.id
+    ).filter(
+        UserRole.user_id == user_id,
+        Role.is_active == True
+    ).all()
+    return {r[0] for r in rows}
+
+def _load_user_permissions(db: Session, user_id: int) -> Set[str]:
     permissions = set()
     
     # Get permissions from roles
@@ -17,7 +60,7 @@ def get_user_permissions(db: Session, user: User) -> Set[str]:
     ).join(
         UserRole, UserRole.role_id == RolePermission.role_id
     ).filter(
-        UserRole.user_id == user.id,
+        UserRole.user_id == user_id,
         Permission.is_active == True
     ).all()
     
@@ -27,7 +70,7 @@ def get_user_permissions(db: Session, user: User) -> Set[str]:
     user_perms = db.query(Permission.name, UserPermission.granted).join(
         UserPermission, UserPermission.permission_id == Permission.id
     ).filter(
-        UserPermission.user_id == user.id,
+        UserPermission.user_id == user_id,
         Permission.is_active == True
     ).all()
     
@@ -40,20 +83,122 @@ def get_user_permissions(db: Session, user: User) -> Set[str]:
     
     return permissions
 
+def _cache_keys(user_id: int) -> List[str]:
+    return [SNAPSHOT_KEY.format(user_id=user_id), VERSION_KEY, USER_VERSION_KEY.format(user_id=user_id)]
+
+def _cache_get(user_id: int) -> Tuple[Optional[PermissionSnapshot], Optional[List[int]]]:
+    """Return the cached snapshot (if still current) and the current versions"""
+    if redis_client is None:
+        return None, None
+    try:
+        raw, version, user_version = redis_client.mget(*_cache_keys(user_id))
+    except Exception as e:
+        logger.warning(f"RBAC cache read failed for user {user_id}: {e}")
+        return None, None
+    
+    # Snapshots are stamped with the global and per-user versions they were
+    # built under; any bump since then makes them stale.
+    current = [int(version or 0), int(user_version or 0)]
+    if raw is None:
+        return None, current
+    try:
+        payload = json.loads(raw)
+        if payload.get("v") != current:
+            return None, current
+        snapshot = PermissionSnapshot(
+            user_id=user_id,
+            roles=frozenset(payload["roles"]),
+            permissions=frozenset(payload["permissions"])
+        )
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        # A corrupt entry is rebuilt from the database and overwritten
+        logger.warning(f"Ignoring unreadable RBAC cache entry for user {user_id}: {e}")
+        return None, current
+    return snapshot, current
+
+def _cache_set(snapshot: PermissionSnapshot, version: List[int]):
+    try:
+        redis_client.set(
+            SNAPSHOT_KEY.format(user_id=snapshot.user_id),
+            json.dumps({
+                "v": version,
+                "roles": sorted(snapshot.roles),
+                "permissions": sorted(snapshot.permissions)
+            }),
+            ex=settings.RBAC_CACHE_TTL
+        )
+    except Exception as e:
+        logger.warning(f"RBAC cache write failed for user {snapshot.user_id}: {e}")
+
+def load_permission_snapshot(db: Session, user_id: int) -> PermissionSnapshot:
+    """Build a user's permission snapshot from the database"""
+    return PermissionSnapshot(
+        user_id=user_id,
+        roles=frozenset(_load_user_roles(db, user_id)),
+        permissions=frozenset(_load_user_permissions(db, user_id))
+    )
+
+def get_permission_snapshot(db: Session, user: User) -> PermissionSnapshot:
+    """Get a user's permission snapshot.
+
+    The snapshot is memoized on the session, so it is loaded at most once per
+    request, and shared across requests through Redis until an RBAC write
+    invalidates it.
+    """
+    snapshots = db.info.setdefault(SESSION_INFO_KEY, {})
+    snapshot = snapshots.get(user.id)
+    if snapshot is not None:
+        return snapshot
+    
+    # The versions are read before loading, so a concurrent invalidation
+    # makes the copy written below stale instead of being overwritten by it.
+    snapshot, version = _cache_get(user.id)
+    if snapshot is None:
+        snapshot = load_permission_snapshot(db, user.id)
+        if version is not None:
+            _cache_set(snapshot, version)
+    
+    snapshots[user.id] = snapshot
+    return snapshot
+
+def invalidate_user_permissions(db: Session, user_id: int):
+    """Drop cached snapshot after a user's roles or direct permissions change"""
+    db.info.get(SESSION_INFO_KEY, {}).pop(user_id, None)
+    if redis_client is None:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        pipe.incr(USER_VERSION_KEY.format(user_id=user_id))
+        pipe.delete(SNAPSHOT_KEY.format(user_id=user_id))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"RBAC cache invalidation failed for user {user_id}: {e}")
+
+def invalidate_all_permissions(db: Session):
+    """Drop every cached snapshot after a role's permissions or status change"""
+    db.info.pop(SESSION_INFO_KEY, None)
+    if redis_client is None:
+        return
+    try:
+        redis_client.incr(VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"RBAC cache version bump failed: {e}")
+
+def get_user_permissions(db: Session, user: User) -> Set[str]:
+    """Get all permissions for a user (from roles + direct assignments)"""
+    return set(get_permission_snapshot(db, user).permissions)
+
 def has_permission(db: Session, user: User, permission: str) -> bool:
     """Check if user has a specific permission"""
-    user_permissions = get_user_permissions(db, user)
-    return permission in user_permissions
+    return get_permission_snapshot(db, user).has_permission(permission)
 
 def has_any_permission(db: Session, user: User, permissions: List[str]) -> bool:
     """Check if user has any of the specified permissions"""
-    user_permissions = get_user_permissions(db, user)
-    return any(p in user_permissions for p in permissions)
+    return get_permission_snapshot(db, user).has_any_permission(permissions)
 
 def has_all_permissions(db: Session, user: User, permissions: List[str]) -> bool:
     """Check if user has all of the specified permissions"""
-    user_permissions = get_user_permissions(db, user)
-    return all(p in user_permissions for p in permissions)
+    return get_permission_snapshot(db, user).has_all_permissions(permissions)
 
 def get_user_roles(db: Session, user: User) -> List[Role]:
     """Get all roles assigned to a user"""
@@ -66,10 +211,4 @@ def get_user_roles(db: Session, user: User) -> List[Role]:
 
 def has_role(db: Session, user: User, role_name: str) -> bool:
     """Check if user has a specific role"""
-    return db.query(UserRole).join(
-        Role, Role.id == UserRole.role_id
-    ).filter(
-        UserRole.user_id == user.id,
-        Role.name == role_name,
-        Role.is_active == True
-    ).first() is not None
+    return get_permission_snapshot(db, user).has_role(role_name)
@@ -1,41 +1,41 @@
-from datetime import datetime, timedelta
-from jose import jwt, JWTError
-import bcrypt
-from app.core.config import settings
-from app.services.config_service import get_config
+from datetime import timedelta
+from jose import JWTError
+from typing import Optional, Tuple
+from app.core.password_hashing import password_hasher
+from app.core.token_service import token_service
 import secrets
 from fastapi import Response
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return password_hasher.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return password_hasher.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash_async(password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash if the stored one uses an outdated work factor"""
+    return password_hasher.verify_and_update(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None, db=None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        # Get from database only
-        minutes = int(get_config(db, "access_token_expire_minutes") or "30")
-        expire = datetime.utcnow() + timedelta(minutes=minutes)
-    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "type": "access"})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return token_service.create_access_token(data, expires_delta, db=db)
 
 def create_refresh_token(data: dict, db=None) -> str:
-    to_encode = data.copy()
-    # Get from database only
-    days = int(get_config(db, "refresh_token_expire_days") or "7")
-    expire = datetime.utcnow() + timedelta(days=days)
-    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "type": "refresh"})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return token_service.create_refresh_token(data, db=db)
+
+def create_token_pair(user_id: int, db=None) -> Tuple[str, str]:
+    """Create an access and refresh token for a user in one call"""
+    return token_service.create_token_pair(user_id, db=db)
 
 def decode_access_token(token: str) -> dict:
     """Decode and validate JWT access token."""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        return token_service.verify(token, "access")
     except JWTError as e:
         raise Exception(f"Invalid token: {str(e)}")
 
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from jose import jwk, jwt, JWTError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.config_cache import config_cache
+from app.services.config_service import get_config_int
+
+logger = logging.getLogger(__name__)
+
+ACCESS_EXPIRE_KEY = "access_token_expire_minutes"
+REFRESH_EXPIRE_KEY = "refresh_token_expire_days"
+DEFAULT_ACCESS_EXPIRE_MINUTES = 30
+DEFAULT_REFRESH_EXPIRE_DAYS = 7
+
+
+@dataclass(frozen=True)
+class TokenSettings:
+    access_expires: timedelta
+    refresh_expires: timedelta
+
+
+class TokenService:
+    """Issues and verifies JWTs without touching the database per token.
+
+    Expiry settings are read from system_config once and kept until the config
+    cache reports a change to one of them. The signing key is constructed
+    once, and recently verified tokens are remembered until they expire so
+    repeated requests with the same token skip the signature check.
+    """
+
+    def __init__(self, secret_key: str, algorithm: str, verify_cache_size: int = 4096):
+        self.algorithm = algorithm
+        self._key = jwk.construct(secret_key, algorithm)
+        self._settings: Optional[TokenSettings] = None
+        self._verified: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._verify_cache_size = verify_cache_size
+        self._lock = threading.Lock()
+        config_cache.add_listener(self._on_config_change)
+
+    # Settings
+
+    def get_settings(self, db: Optional[Session] = None) -> TokenSettings:
+        token_settings = self._settings
+        if token_settings is not None:
+            return token_settings
+        if db is None:
+            # Nothing to load from; use the defaults without pinning them
+            return TokenSettings(
+                access_expires=timedelta(minutes=DEFAULT_ACCESS_EXPIRE_MINUTES),
+                refresh_expires=timedelta(days=DEFAULT_REFRESH_EXPIRE_DAYS)
+            )
+        token_settings = TokenSettings(
+            access_expires=timedelta(minutes=get_config_int(db, ACCESS_EXPIRE_KEY, DEFAULT_ACCESS_EXPIRE_MINUTES)),
+            refresh_expires=timedelta(days=get_config_int(db, REFRESH_EXPIRE_KEY, DEFAULT_REFRESH_EXPIRE_DAYS))
+        )
+        self._settings = token_settings
+        return token_settings
+
+    def _on_config_change(self, key: Optional[str]):
+        if key is None or key in (ACCESS_EXPIRE_KEY, REFRESH_EXPIRE_KEY):
+            self._settings = None
+            logger.info("Token settings will be reloaded after config change")
+
+    # Issuing
+
+    def _encode(self, data: dict, token_type: str, expires_delta: timedelta) -> str:
+        now = datetime.utcnow()
+        to_encode = data.copy()
+        to_encode.update({"exp": now + expires_delta, "iat": now, "type": token_type})
+        return jwt.encode(to_encode, self._key, algorithm=self.algorithm)
+
+    def create_access_token(self, data: dict, expires_delta: timedelta = None, db: Session = None) -> str:
+        if expires_delta is None:
+            expires_delta = self.get_settings(db).access_expires
+        return self._encode(data, "access", expires_delta)
+
+    def create_refresh_token(self, data: dict, db: Session = None) -> str:
+        return self._encode(data, "refresh", self.get_settings(db).refresh_expires)
+
+    def create_token_pair(self, subject, db: Session = None) -> Tuple[str, str]:
+        """Issue an access and refresh token for subject"""
+        token_settings = self.get_settings(db)
+        data = {"sub": str(subject)}
+        return (
+            self._encode(data, "access", token_settings.access_expires),
+            self._encode(data, "refresh", token_settings.refresh_expires)
+        )
+
+    # Verification
+
+    def verify(self, token: str, token_type: Optional[str] = "access") -> dict:
+        """Decode and validate a token, raising JWTError if it is not usable.
+
+        Pure CPU with no I/O, so it is safe to call from async code.
+        """
+        cache_key = (token, token_type)
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(cache_key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._verified.move_to_end(cache_key)
+                    return dict(entry[0])
+                del self._verified[cache_key]
+
+        payload = jwt.decode(token, self._key, algorithms=[self.algorithm])
+        if token_type is not None and payload.get("type") != token_type:
+            raise JWTError("Invalid token type")
+        if payload.get("sub") is None:
+            raise JWTError("Token has no subject")
+
+        expires_at = payload.get("exp")
+        if expires_at is not None:
+            with self._lock:
+                self._verified[cache_key] = (dict(payload), float(expires_at))
+                while len(self._verified) > self._verify_cache_size:
+                    self._verified.popitem(last=False)
+        return payload
+
+    def clear(self):
+        """Forget loaded settings and verified tokens"""
+        self._settings = None
+        with self._lock:
+            self._verified.clear()
+
+
+token_service = TokenService(
+    secret_key=settings.SECRET_KEY,
+    algorithm=settings.ALGORITHM,
+    verify_cache_size=settings.TOKEN_VERIFY_CACHE_SIZE
+)
@@ -10,6 +10,11 @@ from app.core.config import settings
 from app.api.v1.router import api_router
 from app.core.storage import UPLOAD_DIR, ENVIRONMENT, STORAGE_PATH
 from app.middleware.csrf import CSRFMiddleware
+from app.core.password_hashing import HashingOverloadedError
+from app.core.genealogy import genealogy_index
+from app.core.activity_index import activity_index
+from app.services.email_transport import close_email_transports
+from app.services.email_templates import template_engine
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,6 +34,16 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Shed login/registration load instead of queueing password hashes without bound
+@app.exception_handler(HashingOverloadedError)
+async def hashing_overloaded_handler(request: Request, exc: HashingOverloadedError):
+    logger.warning(f"Password hashing overloaded on {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please try again shortly"},
+        headers={"Retry-After": "1"}
+    )
+
 # Global exception handler to ensure CORS headers on all responses
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -102,6 +117,21 @@ app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+@app.on_event("startup")
+def load_genealogy_index():
+    if settings.GENEALOGY_INDEX_ENABLED:
+        genealogy_index.load_in_background()
+    if settings.ACTIVITY_INDEX_ENABLED:
+        activity_index.load_in_background()
+
+@app.on_event("startup")
+def compile_email_templates():
+    template_engine.load()
+
+@app.on_event("shutdown")
+async def close_email_connections():
+    await close_email_transports()
+
 @app.get("/")
 def root():
     return {
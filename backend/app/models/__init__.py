@@ -3,6 +3,14 @@ from app.models.transaction import Transaction, TransactionType, TransactionStat
 from app.models.bonus import Bonus, BonusType, BonusStatus
 from app.models.rank import Rank
 from app.models.team import TeamMember
+from app.models.turnover_delta import TurnoverDelta
+from app.models.team_aggregate import TeamAggregate
+from app.models.team_aggregate_delta import TeamAggregateDelta
+from app.models.balance_ledger import BalanceLedgerEntry
+from app.models.processed_purchase import ProcessedPurchase
+from app.models.bonus_run import BonusRun
+from app.models.purchase_completion import PurchaseCompletion
+from app.models.outbox import OutboxMessage
 from app.models.team_member import TeamMember as AboutTeamMember
 from app.models.payout import Payout, PayoutStatus
 from app.models.support import SupportTicket, SupportResponse, TicketStatus, TicketPriority
@@ -25,6 +33,14 @@ __all__ = [
     "Bonus", "BonusType", "BonusStatus",
     "Rank",
     "TeamMember",
+    "TurnoverDelta",
+    "TeamAggregate",
+    "TeamAggregateDelta",
+    "BalanceLedgerEntry",
+    "ProcessedPurchase",
+    "BonusRun",
+    "PurchaseCompletion",
+    "OutboxMessage",
     "AboutTeamMember",
     "Payout", "PayoutStatus",
     "SupportTicket", "SupportResponse", "TicketStatus", "TicketPriority",
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class BalanceLedgerEntry(Base):
+    """Audit row for every balance change made by the batched ledger writer"""
+    __tablename__ = "balance_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    currency = Column(String, nullable=False)
+    amount = Column(Numeric(10, 2), nullable=False)
+    balance_after = Column(Numeric(10, 2))
+    reason = Column(String, nullable=False, index=True)
+    reference_id = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
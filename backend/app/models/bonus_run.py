@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Text, UniqueConstraint
+from datetime import datetime
+from app.core.database import Base
+
+class BonusRun(Base):
+    """One periodic bonus payout (e.g. infinity for a month) and its checkpoint"""
+    __tablename__ = "bonus_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bonus_type = Column(String, nullable=False)
+    period = Column(String, nullable=False)  # "YYYY-MM"
+    status = Column(String, nullable=False, default="running")  # running, completed, failed
+
+    base_amount = Column(Numeric(14, 2))  # company volume the run pays from
+    checkpoint_user_id = Column(Integer, nullable=False, default=0)  # last user paid
+    users_paid = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Numeric(14, 2), nullable=False, default=0)
+    error = Column(Text)
+
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint("bonus_type", "period", name="uq_bonus_runs_type_period"),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class ProcessedPurchase(Base):
+    """Marks a purchase whose unilevel bonuses have been paid (exactly once)"""
+    __tablename__ = "processed_purchases"
+
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), primary_key=True)
+    processed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
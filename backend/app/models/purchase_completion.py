@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey
+from datetime import datetime
+from app.core.database import Base
+
+class PurchaseCompletion(Base):
+    """Durable follow-up work for a completed purchase and its step checkpoints"""
+    __tablename__ = "purchase_completions"
+
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    completed_steps = Column(JSON, nullable=False, default=list)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Numeric, DateTime, ForeignKey, JSON
+from datetime import datetime
+from app.core.database import Base
+
+class TeamAggregate(Base):
+    """Precomputed downline statistics, one row per user"""
+    __tablename__ = "team_aggregates"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    team_size = Column(Integer, nullable=False, default=0)
+    first_line_count = Column(Integer, nullable=False, default=0)
+    active_count = Column(Integer, nullable=False, default=0)
+    team_turnover = Column(Numeric(14, 2), nullable=False, default=0)
+    max_depth = Column(Integer, nullable=False, default=0)
+    level_counts = Column(JSON, nullable=False, default=dict)  # {"1": 3, "2": 9, ...}
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    rebuilt_at = Column(DateTime)
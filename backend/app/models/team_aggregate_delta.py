@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.core.database import Base
+
+class TeamAggregateDelta(Base):
+    """Pending registration to count in the upline's team_aggregates; applied in batches"""
+    __tablename__ = "team_aggregate_deltas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    active = Column(Integer, nullable=False, default=0)  # 1 if the member counted as active when registered
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    applied_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Only unapplied deltas are scanned by the aggregator and by reads
+        Index("idx_team_aggregate_deltas_pending", "id", postgresql_where=applied_at.is_(None)),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, Numeric, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.core.database import Base
+
+class TurnoverDelta(Base):
+    """Append-only turnover ledger; rows are folded into team_members in batches"""
+    __tablename__ = "turnover_deltas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    amount = Column(Numeric(12, 2), nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    applied_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Only unapplied deltas are scanned by the aggregator and by reads
+        Index("idx_turnover_deltas_pending", "id", postgresql_where=applied_at.is_(None)),
+    )
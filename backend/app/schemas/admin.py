@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class AdminStatsResponse(BaseModel):
     total_users: int
@@ -20,6 +20,10 @@ class ManualTransaction(BaseModel):
 class RefundRequest(BaseModel):
     reason: str
 
+class BulkRefundRequest(BaseModel):
+    transaction_ids: List[int]
+    reason: str
+
 class PayoutApproval(BaseModel):
     external_transaction_id: Optional[str] = None
     external_response: Optional[dict] = None
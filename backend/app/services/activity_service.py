@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from app.models.user import User
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
+# Registers the listener that keeps team_aggregates.active_count current
+import app.services.team_aggregate_service  # noqa: F401
 
 def update_user_activity(db: Session, user_id: int):
     """Update user's activity status and last_activity_date"""
@@ -0,0 +1,108 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import Numeric, bindparam, insert, text
+from app.models.user import User
+from app.models.balance_ledger import BalanceLedgerEntry
+from app.core.principal import mark_principals_stale
+from app.core.live_events import stage_event
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+BALANCE_COLUMNS = {"NGN": "balance_ngn", "USDT": "balance_usdt"}
+
+
+def _normalize(deltas: Dict[int, Dict[str, float]]) -> Dict[str, List[Tuple[int, Decimal]]]:
+    """Group non-zero deltas by currency, each list sorted by user id"""
+    by_currency: Dict[str, Dict[int, Decimal]] = {}
+    for user_id, amounts in deltas.items():
+        for currency, amount in amounts.items():
+            currency = currency.upper()
+            if currency not in BALANCE_COLUMNS:
+                raise ValueError(f"Invalid currency: {currency}")
+            if not amount:
+                continue
+            per_user = by_currency.setdefault(currency, {})
+            per_user[user_id] = per_user.get(user_id, Decimal("0")) + Decimal(str(amount))
+    # Sorted ids give every writer the same row lock order
+    return {currency: sorted(per_user.items()) for currency, per_user in by_currency.items()}
+
+
+def _apply_currency(db: Session, currency: str, rows: List[Tuple[int, Decimal]]) -> Dict[int, Decimal]:
+    column = BALANCE_COLUMNS[currency]
+    if db.bind.dialect.name == "postgresql":
+        result = db.execute(
+            text(f"""
+                UPDATE users AS u
+                SET {column} = COALESCE(u.{column}, 0) + d.amount,
+                    total_earnings = COALESCE(u.total_earnings, 0) + d.amount
+                FROM unnest(CAST(:ids AS INTEGER[]), CAST(:amounts AS NUMERIC[])) AS d(id, amount)
+                WHERE u.id = d.id
+                RETURNING u.id, u.{column}
+            """),
+            {"ids": [user_id for user_id, _ in rows], "amounts": [amount for _, amount in rows]}
+        ).all()
+    else:
+        db.execute(
+            text(f"""
+                UPDATE users
+                SET {column} = COALESCE({column}, 0) + :amount,
+                    total_earnings = COALESCE(total_earnings, 0) + :amount
+                WHERE id = :id
+            """).bindparams(bindparam("amount", type_=Numeric(10, 2))),
+            [{"id": user_id, "amount": amount} for user_id, amount in rows]
+        )
+        result = db.query(User.id, getattr(User, column)).filter(
+            User.id.in_([user_id for user_id, _ in rows])
+        ).all()
+    return {user_id: balance for user_id, balance in result}
+
+
+def apply_balance_deltas(
+    db: Session,
+    deltas: Dict[int, Dict[str, float]],
+    reason: str,
+    reference_id: Optional[int] = None
+) -> Dict[int, Dict[str, float]]:
+    """Apply balance changes for many users and record an audit row per delta.
+
+    deltas maps user id to {currency: amount}; each currency is applied
+    with one statement (UPDATE ... FROM unnest(ids, amounts) RETURNING on
+    PostgreSQL) and total_earnings moves with it, as in update_user_balance.
+    Returns the new balances as {user_id: {currency: balance}}. Nothing is
+    committed.
+    """
+    by_currency = _normalize(deltas)
+    if not by_currency:
+        return {}
+
+    now = datetime.utcnow()
+    balances: Dict[int, Dict[str, float]] = {}
+    audit_rows = []
+    for currency, rows in sorted(by_currency.items()):
+        new_balances = _apply_currency(db, currency, rows)
+        missing = [user_id for user_id, _ in rows if user_id not in new_balances]
+        if missing:
+            raise ValueError(f"Users not found for balance update: {missing}")
+        for user_id, amount in rows:
+            balance = new_balances[user_id]
+            balances.setdefault(user_id, {})[currency] = float(balance or 0)
+            stage_event(db, user_id, "balance", {
+                "currency": currency, "balance": float(balance or 0), "delta": float(amount), "reason": reason
+            })
+            audit_rows.append({
+                "user_id": user_id,
+                "currency": currency,
+                "amount": amount,
+                "balance_after": balance,
+                "reason": reason,
+                "reference_id": reference_id,
+                "created_at": now
+            })
+
+    db.execute(insert(BalanceLedgerEntry), audit_rows)
+    mark_principals_stale(db, balances.keys())
+    logger.info(f"Applied {len(audit_rows)} balance deltas ({reason})")
+    return balances
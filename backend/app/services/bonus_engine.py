@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import insert, update
 from datetime import datetime, timedelta
 from app.models.user import User
 from app.models.team import TeamMember
@@ -7,6 +8,8 @@ from app.models.bonus import Bonus, BonusType, BonusStatus
 from app.models.rank import Rank
 from app.services.activity_service import check_user_active
 from app.services.config_service import get_config
+from app.services.balance_ledger import apply_balance_deltas
+from app.services.outbox import enqueue_email
 from typing import List
 import json
 
@@ -128,20 +131,14 @@ def calculate_unilevel_bonus(db: Session, transaction_id: int):
                 
                 user = db.query(User).filter(User.id == active_member_id).first()
                 if user:
-                    
-                    # Send bonus earned email (non-blocking)
-                    try:
-                        import asyncio
-                        from app.services.email_service import send_bonus_earned_email
-                        asyncio.create_task(send_bonus_earned_email(
-                            user.email,
-                            f"Unilevel Level {level}",
-                            float(bonus_amount),
-                            new_balance,
-                            db
-                        ))
-                    except Exception as e:
-                        logger.error(f"Failed to send bonus email to {user.email}: {str(e)}")
+                    # Committed with the bonus, sent by the outbox dispatcher
+                    enqueue_email(
+                        db, "bonus_earned",
+                        email=user.email,
+                        bonus_type=f"Unilevel Level {level}",
+                        amount=float(bonus_amount),
+                        new_balance=new_balance
+                    )
                 
                 bonuses_created.append(bonus)
                 
@@ -249,44 +246,68 @@ def calculate_infinity_bonus(db: Session, month: int, year: int):
         db.rollback()
         return []
 
+def reverse_bonuses_bulk(db: Session, source_transaction_ids: List[int]) -> int:
+    """Cancel every paid bonus earned from the given transactions.
+
+    One UPDATE ... RETURNING cancels the bonuses, the recipients' balances
+    are debited through the balance ledger, and the reversal transactions
+    go in with one multi-row insert. Returns the number of bonuses
+    reversed; nothing is committed.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    source_transaction_ids = sorted(set(source_transaction_ids))
+    if not source_transaction_ids:
+        return 0
+    
+    now = datetime.utcnow()
+    reversed_bonuses = db.execute(
+        update(Bonus)
+        .where(
+            Bonus.source_transaction_id.in_(source_transaction_ids),
+            Bonus.status == BonusStatus.paid
+        )
+        .values(status=BonusStatus.cancelled, updated_at=now)
+        .returning(Bonus.user_id, Bonus.amount, Bonus.currency, Bonus.source_transaction_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not reversed_bonuses:
+        return 0
+    
+    deltas = {}
+    reversals = []
+    for user_id, amount, currency, source_transaction_id in reversed_bonuses:
+        user_deltas = deltas.setdefault(user_id, {})
+        user_deltas[currency] = user_deltas.get(currency, 0) - float(amount)
+        reversals.append({
+            "user_id": user_id,
+            "transaction_type": TransactionType.fee,
+            "amount": -float(amount),
+            "currency": currency,
+            "status": TransactionStatus.completed,
+            "description": "Bonus reversal for refunded transaction",
+            "related_transaction_id": source_transaction_id,
+            "completed_at": now,
+            "created_at": now,
+            "updated_at": now
+        })
+    
+    apply_balance_deltas(db, deltas, "bonus_reversal")
+    db.execute(insert(Transaction), reversals)
+    
+    logger.info(f"Reversed {len(reversed_bonuses)} bonuses for {len(source_transaction_ids)} transactions")
+    return len(reversed_bonuses)
+
 def reverse_bonuses(db: Session, transaction_id: int):
     """Reverse bonuses when a transaction is refunded"""
-    from app.utils.balance_helpers import update_user_balance
     import logging
     logger = logging.getLogger(__name__)
     
     try:
-        bonuses = db.query(Bonus).filter(
-            Bonus.source_transaction_id == transaction_id,
-            Bonus.status == BonusStatus.paid
-        ).all()
-        
-        for bonus in bonuses:
-            try:
-                bonus.status = BonusStatus.cancelled
-                
-                # Reverse balance (negative amount)
-                update_user_balance(db, bonus.user_id, -float(bonus.amount), bonus.currency)
-                
-                reversal = Transaction(
-                    user_id=bonus.user_id,
-                    transaction_type=TransactionType.fee,
-                    amount=-float(bonus.amount),
-                    currency=bonus.currency,
-                    status=TransactionStatus.completed,
-                    description=f"Bonus reversal for refunded transaction",
-                    related_transaction_id=transaction_id,
-                    completed_at=datetime.utcnow()
-                )
-                db.add(reversal)
-                
-            except Exception as e:
-                logger.error(f"Failed to reverse bonus {bonus.id}: {str(e)}")
-                continue
-        
+        reversed_count = reverse_bonuses_bulk(db, [transaction_id])
         db.commit()
-        logger.info(f"Reversed {len(bonuses)} bonuses for transaction {transaction_id}")
-        return len(bonuses)
+        return reversed_count
         
     except Exception as e:
         logger.error(f"Critical error in reverse_bonuses: {str(e)}", exc_info=True)
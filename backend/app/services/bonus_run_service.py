@@ -0,0 +1,188 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from decimal import Decimal
+from app.core.config import settings
+from app.models.user import User
+from app.models.rank import Rank
+from app.models.bonus import Bonus, BonusType, BonusStatus
+from app.models.bonus_run import BonusRun
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.balance_ledger import apply_balance_deltas
+from app.services.optimized_bonus_engine import infinity_bonus_amount, is_infinity_enabled
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+INFINITY = "infinity"
+CENT = Decimal("0.01")
+
+
+def get_bonus_run(db: Session, bonus_type: str, period: str) -> Optional[BonusRun]:
+    return db.query(BonusRun).filter(
+        BonusRun.bonus_type == bonus_type,
+        BonusRun.period == period
+    ).first()
+
+
+def _start_run(db: Session, bonus_type: str, period: str) -> BonusRun:
+    """Create the run row, or return the existing one for this period"""
+    run = get_bonus_run(db, bonus_type, period)
+    if run is not None:
+        return run
+    try:
+        run = BonusRun(bonus_type=bonus_type, period=period, status="running")
+        db.add(run)
+        db.commit()
+        return run
+    except IntegrityError:
+        # Another worker started the same period first
+        db.rollback()
+        return get_bonus_run(db, bonus_type, period)
+
+
+def _company_volume(db: Session, month: int, year: int) -> Decimal:
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    volume = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
+        Transaction.transaction_type == TransactionType.purchase,
+        Transaction.status == TransactionStatus.completed,
+        Transaction.created_at >= start_date,
+        Transaction.created_at < end_date
+    ).scalar()
+    return Decimal(str(volume or 0))
+
+
+def _infinity_percentages(db: Session) -> Dict[str, Decimal]:
+    """Infinity percentage per rank name, for ranks that earn one"""
+    return {
+        name: Decimal(str(percentage))
+        for name, percentage in db.query(Rank.name, Rank.infinity_bonus_percentage).filter(
+            Rank.infinity_bonus_percentage > 0
+        ).all()
+    }
+
+
+def run_infinity_bonus(
+    db: Session,
+    month: int,
+    year: int,
+    chunk_size: Optional[int] = None,
+    resume: bool = True
+) -> Optional[BonusRun]:
+    """Pay the infinity bonus for a month, at most once.
+
+    Eligible users are paid in pages of chunk_size ordered by id. Each page
+    is committed together with the run's checkpoint, so a crashed run picks
+    up after the last committed page. A completed period is a no-op, which
+    makes the daily schedule (and manual retriggers) safe. With
+    resume=False an unfinished run raises ValueError instead of continuing.
+    Returns None when the infinity bonus is disabled.
+    """
+    if not is_infinity_enabled(db):
+        return None
+
+    chunk_size = chunk_size or settings.INFINITY_CHUNK_SIZE
+    period = f"{year:04d}-{month:02d}"
+    run = _start_run(db, INFINITY, period)
+    if run.status == "completed":
+        logger.info(f"Infinity bonus for {period} already paid (run {run.id})")
+        return run
+    if run.users_paid and not resume:
+        raise ValueError(f"Infinity run for {period} is unfinished; resume it instead")
+
+    try:
+        if run.base_amount is None:
+            run.base_amount = _company_volume(db, month, year)
+            db.commit()
+        percentages = _infinity_percentages(db)
+
+        while True:
+            # The row lock serializes concurrent runners chunk by chunk, and
+            # each one re-reads the checkpoint after acquiring it
+            run = db.query(BonusRun).filter(BonusRun.id == run.id).populate_existing().with_for_update().one()
+            if run.status == "completed":
+                db.commit()
+                break
+
+            users = []
+            volume = Decimal(str(run.base_amount or 0))
+            if volume > 0 and percentages:
+                users = db.query(User.id, User.current_rank).filter(
+                    User.id > run.checkpoint_user_id,
+                    User.current_rank.in_(percentages.keys()),
+                    User.is_active == True
+                ).order_by(User.id).limit(chunk_size).all()
+
+            if not users:
+                run.status = "completed"
+                run.completed_at = datetime.utcnow()
+                run.error = None
+                db.commit()
+                break
+
+            paid = _pay_chunk(db, run, users, volume, percentages, month, year)
+            run.checkpoint_user_id = users[-1].id
+            run.users_paid += len(users)
+            run.total_amount = Decimal(str(run.total_amount or 0)) + paid
+            db.commit()
+
+        logger.info(f"Infinity bonus for {period}: paid {run.users_paid} users, {run.total_amount} total")
+        return run
+    except Exception as e:
+        db.rollback()
+        failed = db.query(BonusRun).filter(BonusRun.id == run.id).one()
+        failed.status = "failed"
+        failed.error = str(e)
+        db.commit()
+        logger.error(f"Infinity bonus run for {period} failed at user {failed.checkpoint_user_id}: {e}", exc_info=True)
+        raise
+
+
+def _pay_chunk(db: Session, run: BonusRun, users, volume: Decimal, percentages: Dict[str, Decimal], month: int, year: int) -> Decimal:
+    now = datetime.utcnow()
+    bonuses, transactions, deltas = [], [], {}
+    total = Decimal("0")
+    for user_id, rank_name in users:
+        percentage = percentages[rank_name]
+        amount = infinity_bonus_amount(volume, percentage).quantize(CENT)
+        total += amount
+        bonuses.append({
+            "user_id": user_id,
+            "bonus_type": BonusType.infinity,
+            "amount": amount,
+            "currency": "NGN",
+            "status": BonusStatus.paid,
+            "rank_achieved": rank_name,
+            "percentage": percentage,
+            "base_amount": volume,
+            "paid_date": now.date(),
+            "calculation_date": now.date(),
+            "calculation_metadata": {
+                "month": month,
+                "year": year,
+                "company_volume": float(volume),
+                "bonus_run_id": run.id
+            },
+            "created_at": now,
+            "updated_at": now
+        })
+        transactions.append({
+            "user_id": user_id,
+            "transaction_type": TransactionType.bonus,
+            "amount": amount,
+            "currency": "NGN",
+            "status": TransactionStatus.completed,
+            "description": f"Infinity bonus for {month}/{year}",
+            "completed_at": now,
+            "created_at": now,
+            "updated_at": now
+        })
+        deltas[user_id] = {"NGN": amount}
+
+    db.execute(insert(Bonus), bonuses)
+    db.execute(insert(Transaction), transactions)
+    apply_balance_deltas(db, deltas, "infinity_bonus", reference_id=run.id)
+    return total
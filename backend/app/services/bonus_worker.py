@@ -0,0 +1,198 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import redis_client
+from app.core.genealogy import genealogy_index
+from app.core.activity_index import activity_index
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.processed_purchase import ProcessedPurchase
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+BONUS_QUEUE_KEY = "bonus:completed_purchases"
+BONUS_ATTEMPTS_KEY = "bonus:attempts"  # transaction id -> failed attempts so far
+BONUS_DEAD_LETTER_KEY = "bonus:dead_letter"  # transaction id -> last error
+
+
+def enqueue_completed_purchase(transaction_id: int) -> bool:
+    """Hand a completed purchase to the bonus worker.
+
+    Returns False when the queue is unavailable; the caller should then pay
+    the bonuses synchronously.
+    """
+    if redis_client is None:
+        return False
+    try:
+        redis_client.rpush(BONUS_QUEUE_KEY, transaction_id)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not queue purchase {transaction_id} for bonuses: {e}")
+        return False
+
+
+def get_dead_lettered_purchases(client=None) -> Set[int]:
+    """Purchases that failed BONUS_MAX_ATTEMPTS times and are no longer retried"""
+    client = client if client is not None else redis_client
+    if client is None:
+        return set()
+    try:
+        return {int(transaction_id) for transaction_id in client.hkeys(BONUS_DEAD_LETTER_KEY)}
+    except Exception as e:
+        logger.warning(f"Could not read the bonus dead-letter list: {e}")
+        return set()
+
+
+def find_unprocessed_purchases(db: Session, older_than: float, limit: int = 1000, exclude: Iterable[int] = ()) -> List[int]:
+    """Completed purchases without a processed marker, e.g. lost from the queue"""
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+    query = db.query(Transaction.id).outerjoin(
+        ProcessedPurchase, ProcessedPurchase.transaction_id == Transaction.id
+    ).filter(
+        Transaction.transaction_type == TransactionType.purchase,
+        Transaction.status == TransactionStatus.completed,
+        Transaction.completed_at < cutoff,
+        ProcessedPurchase.transaction_id.is_(None)
+    )
+    exclude = list(exclude)
+    if exclude:
+        query = query.filter(Transaction.id.notin_(exclude))
+    return [row[0] for row in query.order_by(Transaction.id).limit(limit).all()]
+
+
+class BonusBatchWorker:
+    """Consumes completed purchases and pays their bonuses in micro-batches.
+
+    A batch is closed when it reaches batch_size purchases or max_wait
+    seconds after its first purchase arrived, whichever comes first; the
+    batch engine then runs once for the whole group. Exactly-once payout
+    comes from the engine's processed markers, so retrying is always safe:
+    a batch that fails is retried one purchase at a time, a purchase that
+    fails on its own is pushed back onto the queue, and after max_attempts
+    failures it is moved to the dead-letter hash instead.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.BONUS_BATCH_SIZE,
+        max_wait: float = settings.BONUS_BATCH_MAX_WAIT,
+        session_factory: Callable[[], Session] = SessionLocal,
+        client=None,
+        max_attempts: int = settings.BONUS_MAX_ATTEMPTS
+    ):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self.session_factory = session_factory
+        self.client = client if client is not None else redis_client
+        self.batches = 0
+        self.processed = 0
+        self.failed = 0
+
+    def next_batch(self, block_timeout: float = 1.0) -> List[int]:
+        """Wait up to block_timeout for a purchase, then fill the batch until it is full or max_wait passes"""
+        item = self.client.blpop(BONUS_QUEUE_KEY, timeout=block_timeout)
+        if item is None:
+            return []
+        batch = [int(item[1])]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            items = self.client.lpop(BONUS_QUEUE_KEY, self.batch_size - len(batch))
+            if items:
+                batch.extend(int(value) for value in items)
+                continue
+            time.sleep(min(0.05, remaining))
+        return batch
+
+    def process(self, transaction_ids: List[int]) -> int:
+        """Run the batch engine once for a group; returns bonuses created"""
+        if not transaction_ids:
+            return 0
+        db = self.session_factory()
+        failed: Dict[int, Exception] = {}
+        try:
+            try:
+                created = len(OptimizedBonusEngine.calculate_unilevel_bonuses_batch(db, transaction_ids))
+            except Exception as e:
+                db.rollback()
+                created = 0
+                if len(transaction_ids) == 1:
+                    failed[transaction_ids[0]] = e
+                else:
+                    # Isolate the purchase(s) that broke the batch
+                    logger.warning(f"Bonus batch of {len(transaction_ids)} purchases failed, retrying one by one: {e}")
+                    for transaction_id in transaction_ids:
+                        try:
+                            created += len(OptimizedBonusEngine.calculate_unilevel_bonuses_batch(db, [transaction_id]))
+                        except Exception as item_error:
+                            db.rollback()
+                            failed[transaction_id] = item_error
+        finally:
+            db.close()
+
+        for transaction_id, error in failed.items():
+            self._record_failure(transaction_id, error)
+        self._clear_attempts([t for t in transaction_ids if t not in failed])
+        self.batches += 1
+        self.processed += len(transaction_ids) - len(failed)
+        self.failed += len(failed)
+        return created
+
+    def _record_failure(self, transaction_id: int, error: Exception):
+        if self.client is None:
+            # The recovery sweep picks it up again from the missing marker
+            logger.error(f"Bonuses for purchase {transaction_id} failed: {error}")
+            return
+        try:
+            attempts = self.client.hincrby(BONUS_ATTEMPTS_KEY, transaction_id, 1)
+            if attempts >= self.max_attempts:
+                self.client.hset(BONUS_DEAD_LETTER_KEY, transaction_id, str(error)[:500])
+                self.client.hdel(BONUS_ATTEMPTS_KEY, transaction_id)
+                logger.error(
+                    f"Bonuses for purchase {transaction_id} failed {attempts} times, "
+                    f"moved to the dead-letter list: {error}"
+                )
+            else:
+                logger.warning(f"Bonuses for purchase {transaction_id} failed (attempt {attempts}), requeueing: {error}")
+                self.client.rpush(BONUS_QUEUE_KEY, transaction_id)
+        except Exception as requeue_error:
+            # The recovery sweep picks it up again from the missing marker
+            logger.error(f"Could not requeue purchase {transaction_id}: {requeue_error}")
+
+    def _clear_attempts(self, transaction_ids: List[int]):
+        if self.client is None or not transaction_ids:
+            return
+        try:
+            self.client.hdel(BONUS_ATTEMPTS_KEY, *transaction_ids)
+        except Exception as e:
+            logger.warning(f"Could not clear bonus attempt counts: {e}")
+
+    def run(self, stop_event: Optional[threading.Event] = None):
+        """Consume the queue until stop_event is set"""
+        if self.client is None:
+            raise RuntimeError("Bonus worker needs Redis")
+        # Uplines and activity come from memory once these are loaded
+        if settings.GENEALOGY_INDEX_ENABLED:
+            genealogy_index.load_in_background()
+        if settings.ACTIVITY_INDEX_ENABLED:
+            activity_index.load_in_background()
+        logger.info(f"Bonus worker started (batch size {self.batch_size}, max wait {self.max_wait}s)")
+        while stop_event is None or not stop_event.is_set():
+            try:
+                self.process(self.next_batch())
+            except Exception as e:
+                logger.error(f"Bonus worker error: {e}")
+                time.sleep(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    BonusBatchWorker().run()
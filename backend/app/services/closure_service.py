@@ -0,0 +1,105 @@
+from sqlalchemy import select, insert, literal, union_all
+from sqlalchemy.orm import Session
+from app.models.team import TeamMember
+from app.services.team_aggregate_service import add_member_to_aggregates
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+BULK_INSERT_CHUNK_SIZE = 5000
+
+
+def add_member_closure(db: Session, user_id: int, sponsor_id: Optional[int] = None) -> None:
+    """Create the team_members closure rows for a new user.
+
+    The self row and one row per sponsor ancestor are written with a single
+    INSERT ... SELECT from the sponsor's own closure rows, in the caller's
+    transaction (nothing is committed here).
+    """
+    rows = select(
+        literal(user_id).label("user_id"),
+        literal(user_id).label("ancestor_id"),
+        literal(0).label("depth"),
+        literal(str(user_id)).label("path")
+    )
+    if sponsor_id is not None:
+        rows = union_all(rows, select(
+            literal(user_id),
+            TeamMember.ancestor_id,
+            TeamMember.depth + 1,
+            TeamMember.path.concat(f".{user_id}")
+        ).where(TeamMember.user_id == sponsor_id))
+
+    # Wrapped as a subquery so the column defaults (turnover, timestamps)
+    # can be added to the SELECT
+    rows = rows.subquery()
+    db.execute(
+        insert(TeamMember).from_select(["user_id", "ancestor_id", "depth", "path"], select(rows))
+    )
+
+    add_member_to_aggregates(db, user_id)
+
+
+def bulk_add_member_closures(db: Session, members: Iterable[Tuple[int, Optional[int]]]) -> int:
+    """Create closure rows for many (user_id, sponsor_id) pairs in one pass.
+
+    Intended for imports: sponsors may be existing users or other users in
+    the same batch, in any order. Existing sponsor closures are read with one
+    query, the new rows are built in memory and written with chunked
+    multi-row inserts. Returns the number of rows written; nothing is
+    committed here. Team aggregates are not touched: once committed, run
+    rebuild_team_aggregates for the imported users and their upline.
+    """
+    sponsors: Dict[int, Optional[int]] = {}
+    for user_id, sponsor_id in members:
+        if user_id in sponsors:
+            raise ValueError(f"User {user_id} appears more than once in the import")
+        sponsors[user_id] = sponsor_id
+
+    # Ancestor chains (ancestor_id, depth, path) of sponsors already in the tree
+    external_ids = {s for s in sponsors.values() if s is not None and s not in sponsors}
+    chains: Dict[int, List[Tuple[int, int, str]]] = {}
+    if external_ids:
+        existing = db.query(
+            TeamMember.user_id, TeamMember.ancestor_id, TeamMember.depth, TeamMember.path
+        ).filter(TeamMember.user_id.in_(external_ids)).all()
+        for row in existing:
+            chains.setdefault(row.user_id, []).append((row.ancestor_id, row.depth, row.path))
+        missing = external_ids - chains.keys()
+        if missing:
+            raise ValueError(f"Sponsors not found in team tree: {sorted(missing)[:10]}")
+
+    def build_chain(user_id: int) -> List[Tuple[int, int, str]]:
+        # Walk up to the nearest resolved sponsor, then resolve back down;
+        # an ordered dict keeps the walk order and an O(1) cycle check
+        pending: Dict[int, None] = {}
+        current = user_id
+        while current not in chains:
+            if current in pending:
+                raise ValueError(f"Sponsor cycle detected at user {current}")
+            pending[current] = None
+            current = sponsors[current]
+            if current is None:
+                break
+        for member_id in reversed(pending):
+            parent_id = sponsors[member_id]
+            chain = [(member_id, 0, str(member_id))]
+            if parent_id is not None:
+                chain.extend(
+                    (ancestor_id, depth + 1, f"{path}.{member_id}")
+                    for ancestor_id, depth, path in chains[parent_id]
+                )
+            chains[member_id] = chain
+        return chains[user_id]
+
+    rows = []
+    for user_id in sponsors:
+        for ancestor_id, depth, path in build_chain(user_id):
+            rows.append({"user_id": user_id, "ancestor_id": ancestor_id, "depth": depth, "path": path})
+
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        db.execute(insert(TeamMember), rows[start:start + BULK_INSERT_CHUNK_SIZE])
+
+    logger.info(f"Inserted {len(rows)} closure rows for {len(sponsors)} imported users")
+    return len(rows)
@@ -1,12 +1,54 @@
 from sqlalchemy.orm import Session
 from app.models.system_config import SystemConfig
-from typing import Optional, Dict
+from app.core.config_cache import config_cache
+from typing import Any, Optional, Dict
 import json
 
-def get_config(db: Session, key: str, default: str = None) -> Optional[str]:
-    """Get configuration value by key"""
+def _load_config(db: Session, key: str) -> Optional[str]:
     config = db.query(SystemConfig).filter(SystemConfig.key == key).first()
-    return config.value if config else default
+    return config.value if config else None
+
+def get_config(db: Session, key: str, default: str = None) -> Optional[str]:
+    """Get configuration value by key (served from the config cache)"""
+    value = config_cache.get(key, lambda: _load_config(db, key))
+    return value if value is not None else default
+
+def get_config_bool(db: Session, key: str, default: bool = False) -> bool:
+    """Get configuration value as a boolean ("true"/"false")"""
+    value = get_config(db, key)
+    if value is None:
+        return default
+    return value.strip().lower() == "true"
+
+def get_config_int(db: Session, key: str, default: int = 0) -> int:
+    """Get configuration value as an integer"""
+    value = get_config(db, key)
+    try:
+        return int(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+def get_config_float(db: Session, key: str, default: float = 0.0) -> float:
+    """Get configuration value as a float"""
+    value = get_config(db, key)
+    try:
+        return float(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+def get_config_json(db: Session, key: str, default: Any = None) -> Any:
+    """Get configuration value decoded from JSON"""
+    value = get_config(db, key)
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return default
+
+def get_config_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters of the config cache"""
+    return config_cache.stats()
 
 def set_config(db: Session, key: str, value: str, description: str = None, is_public: bool = False):
     """Set configuration value"""
@@ -27,6 +69,7 @@ def set_config(db: Session, key: str, value: str, description: str = None, is_pu
         db.add(config)
     
     db.commit()
+    config_cache.invalidate(key)
     return config
 
 def get_all_configs(db: Session, public_only: bool = False) -> Dict[str, str]:
@@ -46,6 +89,7 @@ def delete_config(db: Session, key: str) -> bool:
     if config:
         db.delete(config)
         db.commit()
+        config_cache.invalidate(key)
         return True
     
     return False
@@ -64,10 +108,14 @@ DEFAULT_CONFIGS = {
 
 def initialize_default_configs(db: Session):
     """Initialize default configurations if not exists"""
+    created = []
     for key, value in DEFAULT_CONFIGS.items():
         existing = db.query(SystemConfig).filter(SystemConfig.key == key).first()
         if not existing:
             config = SystemConfig(key=key, value=value, is_public=True)
             db.add(config)
+            created.append(key)
     
     db.commit()
+    for key in created:
+        config_cache.invalidate(key)
@@ -1,44 +1,51 @@
-import resend
 import logging
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.services.config_service import get_config
-from pathlib import Path
-from typing import Optional
+from app.services.email_templates import template_engine
+from app.services.email_transport import get_email_transport
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
 def load_template(template_name: str, **kwargs) -> str:
-    template_path = Path(__file__).parent.parent / "templates" / template_name
-    with open(template_path, 'r') as f:
-        template = f.read()
-    
-    for key, value in kwargs.items():
-        template = template.replace(f"{{{{{key}}}}}", str(value))
-    
-    return template
+    return template_engine.render(template_name, **kwargs)
+
+async def deliver_email(db: Session, to: str, subject: str, html: str) -> bool:
+    """Send one rendered email through the configured transport"""
+    transport = get_email_transport(db)
+    if transport is None:
+        logger.warning("Email delivery not configured")
+        return False
+    return await transport.send({
+        "from": get_config(db, "from_email") or "noreply@restempire.com",
+        "to": [to],
+        "subject": subject,
+        "html": html
+    })
+
+async def send_templated_emails(db: Session, template_name: str, subject: str, recipients: List[Dict], shared: Optional[Dict] = None) -> List[bool]:
+    """Render one template per recipient ({"email", **values}) and send them as a batch"""
+    transport = get_email_transport(db)
+    if transport is None:
+        logger.warning("Email delivery not configured")
+        return [False] * len(recipients)
+    from_email = get_config(db, "from_email") or "noreply@restempire.com"
+    bodies = template_engine.render_many(template_name, recipients, shared)
+    return await transport.send_batch([
+        {"from": from_email, "to": [recipient["email"]], "subject": subject, "html": html}
+        for recipient, html in zip(recipients, bodies)
+    ])
 
 async def send_verification_email(email: str, token: str, db: Session) -> bool:
     try:
         verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
         html_content = load_template("verify_email.html", verification_url=verification_url)
         
-        api_key = get_config(db, "resend_api_key")
-        from_email = get_config(db, "from_email") or "noreply@restempire.com"
-        
-        if not api_key:
-            logger.warning("Email API key not configured")
-            return False
-        
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "Verify Your Email - Opened Seal and Rest Empire",
-            "html": html_content
-        })
-        logger.info(f"Verification email sent to {email}")
-        return True
+        sent = await deliver_email(db, email, "Verify Your Email - Opened Seal and Rest Empire", html_content)
+        if sent:
+            logger.info(f"Verification email sent to {email}")
+        return sent
     except Exception as e:
         logger.error(f"Failed to send verification email to {email}: {str(e)}", exc_info=True)
         return False
@@ -48,22 +55,10 @@ async def send_password_reset_email(email: str, token: str, db: Session) -> bool
         reset_url = f"{settings.FRONTEND_URL}/reset-password?token={token}"
         html_content = load_template("reset_password.html", reset_url=reset_url)
         
-        api_key = get_config(db, "resend_api_key")
-        from_email = get_config(db, "from_email") or "noreply@restempire.com"
-        
-        if not api_key:
-            logger.warning("Email API key not configured")
-            return False
-        
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "Password Reset - Opened Seal and Rest Empire",
-            "html": html_content
-        })
-        logger.info(f"Password reset email sent to {email}")
-        return True
+        sent = await deliver_email(db, email, "Password Reset - Opened Seal and Rest Empire", html_content)
+        if sent:
+            logger.info(f"Password reset email sent to {email}")
+        return sent
     except Exception as e:
         logger.error(f"Failed to send password reset email to {email}: {str(e)}", exc_info=True)
         return False
@@ -73,22 +68,10 @@ async def send_welcome_email(email: str, name: str, db: Session) -> bool:
         dashboard_url = f"{settings.FRONTEND_URL}/dashboard"
         html_content = load_template("welcome.html", name=name, dashboard_url=dashboard_url)
         
-        api_key = get_config(db, "resend_api_key")
-        from_email = get_config(db, "from_email", "noreply@restempire.com")
-        
-        if not api_key:
-            logger.warning("Email API key not configured")
-            return False
-        
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "Welcome to Opened Seal and Rest Empire!",
-            "html": html_content
-        })
-        logger.info(f"Welcome email sent to {email}")
-        return True
+        sent = await deliver_email(db, email, "Welcome to Opened Seal and Rest Empire!", html_content)
+        if sent:
+            logger.info(f"Welcome email sent to {email}")
+        return sent
     except Exception as e:
         logger.error(f"Failed to send welcome email to {email}: {str(e)}", exc_info=True)
         return False
@@ -105,17 +88,7 @@ async def send_rank_achievement_email(email: str, user_name: str, rank_name: str
         dashboard_url=dashboard_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": f"🎉 Congratulations! You've Achieved {rank_name} - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, f"🎉 Congratulations! You've Achieved {rank_name} - Opened Seal and Rest Empire", html_content)
 
 async def send_bonus_earned_email(email: str, bonus_type: str, amount: float, new_balance: float, db: Session) -> bool:
     try:
@@ -128,22 +101,10 @@ async def send_bonus_earned_email(email: str, bonus_type: str, amount: float, ne
             dashboard_url=dashboard_url
         )
         
-        api_key = get_config(db, "resend_api_key")
-        from_email = get_config(db, "from_email", "noreply@restempire.com")
-        
-        if not api_key:
-            logger.warning("Email API key not configured")
-            return False
-        
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": f"💰 Bonus Earned: ₦{amount:,.2f}",
-            "html": html_content
-        })
-        logger.info(f"Bonus earned email sent to {email}")
-        return True
+        sent = await deliver_email(db, email, f"💰 Bonus Earned: ₦{amount:,.2f}", html_content)
+        if sent:
+            logger.info(f"Bonus earned email sent to {email}")
+        return sent
     except Exception as e:
         logger.error(f"Failed to send bonus earned email to {email}: {str(e)}", exc_info=True)
         return False
@@ -160,17 +121,7 @@ async def send_payout_processed_email(email: str, status: str, amount: float, me
         payouts_url=payouts_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": f"Payout {status.title()} - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, f"Payout {status.title()} - Opened Seal and Rest Empire", html_content)
 
 async def send_team_member_joined_email(email: str, member_name: str, member_email: str, team_size: int, first_line: int, db: Session):
     team_url = f"{settings.FRONTEND_URL}/team"
@@ -183,17 +134,7 @@ async def send_team_member_joined_email(email: str, member_name: str, member_ema
         team_url=team_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "🎉 New Team Member Joined - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "🎉 New Team Member Joined - Opened Seal and Rest Empire", html_content)
 
 async def send_security_alert_email(email: str, action: str, timestamp: str, location: str, device: str, db: Session):
     security_url = f"{settings.FRONTEND_URL}/settings/security"
@@ -206,17 +147,7 @@ async def send_security_alert_email(email: str, action: str, timestamp: str, loc
         security_url=security_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "🔒 Security Alert - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "🔒 Security Alert - Opened Seal and Rest Empire", html_content)
 
 async def send_account_activated_email(email: str, user_name: str, package_name: str, package_price: float, db: Session):
     dashboard_url = f"{settings.FRONTEND_URL}/dashboard"
@@ -228,17 +159,7 @@ async def send_account_activated_email(email: str, user_name: str, package_name:
         dashboard_url=dashboard_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "🚀 Account Activated - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "🚀 Account Activated - Opened Seal and Rest Empire", html_content)
 
 async def send_payment_received_email(email: str, package_name: str, amount: float, payment_method: str, reference: str, date: str, db: Session):
     dashboard_url = f"{settings.FRONTEND_URL}/dashboard"
@@ -252,17 +173,7 @@ async def send_payment_received_email(email: str, package_name: str, amount: flo
         dashboard_url=dashboard_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "✅ Payment Received - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "✅ Payment Received - Opened Seal and Rest Empire", html_content)
 
 async def send_payout_request_email(email: str, amount: float, db: Session):
     payouts_url = f"{settings.FRONTEND_URL}/payouts"
@@ -272,17 +183,7 @@ async def send_payout_request_email(email: str, amount: float, db: Session):
         payouts_url=payouts_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "📤 Payout Request Received - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "📤 Payout Request Received - Opened Seal and Rest Empire", html_content)
 
 async def send_kyc_approved_email(email: str, user_name: str, db: Session):
     dashboard_url = f"{settings.FRONTEND_URL}/dashboard"
@@ -292,17 +193,7 @@ async def send_kyc_approved_email(email: str, user_name: str, db: Session):
         dashboard_url=dashboard_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "✅ KYC Verification Approved - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "✅ KYC Verification Approved - Opened Seal and Rest Empire", html_content)
 
 async def send_kyc_rejected_email(email: str, user_name: str, reason: str, db: Session):
     settings_url = f"{settings.FRONTEND_URL}/settings"
@@ -313,14 +204,4 @@ async def send_kyc_rejected_email(email: str, user_name: str, reason: str, db: S
         settings_url=settings_url
     )
     
-    api_key = get_config(db, "resend_api_key")
-    from_email = get_config(db, "from_email", "noreply@restempire.com")
-    
-    if api_key:
-        resend.api_key = api_key
-        resend.Emails.send({
-            "from": from_email,
-            "to": email,
-            "subject": "❌ KYC Verification Rejected - Opened Seal and Rest Empire",
-            "html": html_content
-        })
+    return await deliver_email(db, email, "❌ KYC Verification Rejected - Opened Seal and Rest Empire", html_content)
@@ -0,0 +1,100 @@
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
+PLACEHOLDER = re.compile(r"\{\{([A-Za-z_]\w*)\}\}")
+
+
+class CompiledTemplate:
+    """An email template split once into literal text and placeholder slots.
+
+    Rendering fills the slots and joins the parts, a single pass over the
+    values instead of a str.replace over the whole file per value.
+    Placeholders without a value are left in the output, as before.
+    """
+
+    def __init__(self, name: str, source: str, mtime: float = 0.0):
+        self.name = name
+        self.mtime = mtime
+        # split alternates literal text and placeholder names
+        self._parts = PLACEHOLDER.split(source)
+        self._slots = [(index, self._parts[index]) for index in range(1, len(self._parts), 2)]
+        self.fields = {name for _, name in self._slots}
+
+    def render(self, values: Dict) -> str:
+        parts = self._parts[:]
+        for index, name in self._slots:
+            parts[index] = str(values[name]) if name in values else "{{" + name + "}}"
+        return "".join(parts)
+
+
+class TemplateEngine:
+    """Compiles every template in a directory once and serves them from memory.
+
+    With auto_reload, a template whose file changed is recompiled on its
+    next use (checked at most once per reload_interval seconds).
+    """
+
+    def __init__(self, directory: Path, auto_reload: bool = False, reload_interval: float = 1.0):
+        self.directory = Path(directory)
+        self.auto_reload = auto_reload
+        self.reload_interval = reload_interval
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _compile(self, name: str) -> CompiledTemplate:
+        path = self.directory / name
+        with open(path, "r") as f:
+            source = f.read()
+        return CompiledTemplate(name, source, os.path.getmtime(path))
+
+    def load(self) -> int:
+        """(Re)compile all templates in the directory"""
+        templates = {path.name: self._compile(path.name) for path in self.directory.glob("*.html")}
+        with self._lock:
+            self._templates = templates
+            self._checked = {}
+        logger.info(f"Compiled {len(templates)} email templates")
+        return len(templates)
+
+    def get(self, name: str) -> CompiledTemplate:
+        template = self._templates.get(name)
+        if template is None or (self.auto_reload and self._changed(template)):
+            template = self._compile(name)
+            with self._lock:
+                self._templates[name] = template
+        return template
+
+    def _changed(self, template: CompiledTemplate) -> bool:
+        now = time.monotonic()
+        if now - self._checked.get(template.name, 0.0) < self.reload_interval:
+            return False
+        self._checked[template.name] = now
+        try:
+            return os.path.getmtime(self.directory / template.name) != template.mtime
+        except OSError:
+            return False
+
+    def render(self, template_name: str, /, **values) -> str:
+        # Positional-only so templates can use {{name}}
+        return self.get(template_name).render(values)
+
+    def render_many(self, name: str, values: Iterable[Dict], shared: Optional[Dict] = None) -> List[str]:
+        """Render one template per recipient; shared values apply to all of them"""
+        template = self.get(name)
+        if shared:
+            return [template.render({**shared, **item}) for item in values]
+        return [template.render(item) for item in values]
+
+
+template_engine = TemplateEngine(TEMPLATES_DIR, auto_reload=settings.ENVIRONMENT == "development")
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import smtplib
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.config_service import get_config
+
+logger = logging.getLogger(__name__)
+
+RESEND_API_URL = "https://api.resend.com"
+MAX_RETRY_DELAY = 30.0
+
+
+class EmailSendError(RuntimeError):
+    """Raised when the provider rejects a message or retries are exhausted"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def rejected(self) -> bool:
+        """The provider refused the request itself (4xx other than 429); retrying won't help"""
+        return self.status_code is not None and self.status_code != 429 and self.status_code < 500
+
+
+class EmailTransport:
+    """Delivers rendered messages ({"from", "to", "subject", "html"}).
+
+    send never raises; it returns False when the message was not accepted.
+    """
+
+    async def send(self, message: Dict) -> bool:
+        raise NotImplementedError
+
+    async def send_batch(self, messages: List[Dict]) -> List[bool]:
+        return list(await asyncio.gather(*(self.send(message) for message in messages)))
+
+    async def aclose(self):
+        pass
+
+
+class _LoopState:
+    # httpx clients and asyncio primitives are bound to the loop that made them
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending: List[Tuple[Dict, asyncio.Future]] = []
+        self.flush_scheduled = False
+        self.next_slot = 0.0
+        self.tasks = set()
+
+
+class ResendTransport(EmailTransport):
+    """Resend over a shared keep-alive httpx client.
+
+    Sends issued in the same event loop tick are combined into one call to
+    the batch endpoint (up to BATCH_LIMIT messages), requests are paced to
+    rate_limit per second and capped at concurrency in flight, and 429/5xx
+    responses are retried honouring Retry-After. A batch the provider
+    rejects outright (one bad address fails the whole request) is resent
+    message by message so only the bad ones fail.
+    """
+
+    BATCH_LIMIT = 100
+
+    def __init__(
+        self,
+        api_key: str,
+        concurrency: int = 10,
+        rate_limit: float = 0.0,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+        base_url: str = RESEND_API_URL,
+        backoff: float = 0.5,
+        http_transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.base_url = base_url
+        self.backoff = backoff
+        self.http_transport = http_transport
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._stats = {"messages": 0, "requests": 0, "retries": 0, "failed": 0}
+
+    def _state(self, loop: asyncio.AbstractEventLoop) -> _LoopState:
+        state = self._states.get(loop)
+        if state is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self.http_transport
+            )
+            state = self._states[loop] = _LoopState(client, self.concurrency)
+        return state
+
+    async def send(self, message: Dict) -> bool:
+        loop = asyncio.get_running_loop()
+        state = self._state(loop)
+        future = loop.create_future()
+        state.pending.append((message, future))
+        if len(state.pending) >= self.BATCH_LIMIT:
+            self._flush(state)
+        elif not state.flush_scheduled:
+            # Runs after the other sends already scheduled in this tick
+            state.flush_scheduled = True
+            loop.call_soon(self._flush, state)
+        return await future
+
+    def _flush(self, state: _LoopState):
+        state.flush_scheduled = False
+        while state.pending:
+            batch, state.pending = state.pending[:self.BATCH_LIMIT], state.pending[self.BATCH_LIMIT:]
+            task = asyncio.ensure_future(self._deliver(state, batch))
+            state.tasks.add(task)
+            task.add_done_callback(state.tasks.discard)
+
+    async def _deliver(self, state: _LoopState, batch: List[Tuple[Dict, asyncio.Future]]):
+        messages = [message for message, _ in batch]
+        if len(messages) == 1:
+            results = [await self._deliver_one(state, messages[0])]
+        else:
+            try:
+                await self._post(state, "/emails/batch", messages)
+                results = [True] * len(messages)
+            except EmailSendError as e:
+                if e.rejected:
+                    logger.warning(f"Batch of {len(messages)} emails rejected ({e}), sending individually")
+                    results = list(await asyncio.gather(*(self._deliver_one(state, message) for message in messages)))
+                else:
+                    results = self._failed(messages, e)
+            except Exception as e:
+                results = self._failed(messages, e)
+        self._stats["messages"] += len(messages)
+        for (_, future), accepted in zip(batch, results):
+            if not future.done():
+                future.set_result(accepted)
+
+    async def _deliver_one(self, state: _LoopState, message: Dict) -> bool:
+        try:
+            await self._post(state, "/emails", message)
+            return True
+        except Exception as e:
+            return self._failed([message], e)[0]
+
+    def _failed(self, messages: List[Dict], error: Exception) -> List[bool]:
+        logger.error(f"Failed to send {len(messages)} email(s): {error}")
+        self._stats["failed"] += len(messages)
+        return [False] * len(messages)
+
+    async def _pace(self, state: _LoopState):
+        if self.rate_limit <= 0:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, state.next_slot)
+        state.next_slot = slot + 1.0 / self.rate_limit
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _post(self, state: _LoopState, path: str, payload):
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with state.semaphore:
+                await self._pace(state)
+                self._stats["requests"] += 1
+                try:
+                    response = await state.client.post(path, json=payload)
+                except httpx.TransportError as e:
+                    error = f"{e.__class__.__name__}: {e}"
+                else:
+                    if response.status_code < 300:
+                        return response.json()
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code != 429 and response.status_code < 500:
+                        raise EmailSendError(error, response.status_code)
+                    retry_after = _retry_after(response)
+            if attempt == self.max_retries:
+                raise EmailSendError(error)
+            self._stats["retries"] += 1
+            delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+            await asyncio.sleep(min(delay, MAX_RETRY_DELAY))
+
+    async def aclose(self):
+        """Close the client of the running loop, waiting for queued sends"""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        self._flush(state)
+        if state.tasks:
+            await asyncio.gather(*state.tasks, return_exceptions=True)
+        await state.client.aclose()
+
+    def stats(self) -> Dict:
+        return dict(self._stats)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    for header in ("retry-after", "ratelimit-reset"):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                continue
+    return None
+
+
+class SMTPTransport(EmailTransport):
+    """Sends through an SMTP server (e.g. a local MailHog) on a small thread pool"""
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None, concurrency: int = 4, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="smtp-send")
+
+    def _send(self, message: Dict):
+        recipients = message["to"] if isinstance(message["to"], list) else [message["to"]]
+        mime = EmailMessage()
+        mime["From"] = message["from"]
+        mime["To"] = ", ".join(recipients)
+        mime["Subject"] = message["subject"]
+        mime.set_content(message["html"], subtype="html")
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.username:
+                smtp.starttls()
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(mime)
+
+    async def send(self, message: Dict) -> bool:
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._send, message)
+            return True
+        except Exception as e:
+            logger.error(f"SMTP delivery to {message.get('to')} failed: {e}")
+            return False
+
+
+class FileTransport(EmailTransport):
+    """Appends messages to a JSON lines file instead of sending them (tests, local development)"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    async def send(self, message: Dict) -> bool:
+        line = json.dumps({**message, "sent_at": datetime.utcnow().isoformat()})
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+            return True
+        except OSError as e:
+            logger.error(f"Could not write email to {self.path}: {e}")
+            return False
+
+
+# One transport per configuration, shared by every send in the process
+_transports: Dict[tuple, EmailTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_email_transport(db: Session) -> Optional[EmailTransport]:
+    """The transport for the configured backend, or None if it is not configured"""
+    backend = settings.EMAIL_BACKEND
+    if backend == "file":
+        key = ("file", settings.EMAIL_FILE_PATH)
+        factory = lambda: FileTransport(settings.EMAIL_FILE_PATH)
+    elif backend == "smtp":
+        host = get_config(db, "smtp_host")
+        if not host:
+            return None
+        port = int(get_config(db, "smtp_port") or 587)
+        username, password = get_config(db, "smtp_username"), get_config(db, "smtp_password")
+        key = ("smtp", host, port, username, password)
+        factory = lambda: SMTPTransport(host, port, username, password, timeout=settings.EMAIL_TIMEOUT)
+    else:
+        api_key = get_config(db, "resend_api_key")
+        if not api_key:
+            return None
+        key = ("resend", api_key)
+        factory = lambda: ResendTransport(
+            api_key,
+            concurrency=settings.EMAIL_CONCURRENCY,
+            rate_limit=settings.EMAIL_RATE_LIMIT,
+            max_retries=settings.EMAIL_MAX_RETRIES,
+            timeout=settings.EMAIL_TIMEOUT
+        )
+
+    transport = _transports.get(key)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(key)
+            if transport is None:
+                # Credentials changed: drop transports built for the old ones
+                for stale in [k for k in _transports if k[0] == key[0]]:
+                    del _transports[stale]
+                transport = _transports[key] = factory()
+    return transport
+
+
+async def close_email_transports():
+    """Close the running loop's connections; call before the loop ends"""
+    for transport in list(_transports.values()):
+        await transport.aclose()
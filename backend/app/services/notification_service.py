@@ -1,6 +1,65 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import case, func, insert
 from datetime import datetime
+from app.core.live_events import stage_event
+from app.core.notification_counters import notification_counters, stage_count_delta
 from app.models.notification import Notification, NotificationType
+from app.services.outbox import enqueue_notification, enqueue_notifications
+from typing import Dict, Iterable, List, Tuple
+
+# name -> (title, message format, type, link); messages are str.format'ed
+# with the notification's params
+NOTIFICATION_TEMPLATES = {
+    "new_team_member": ("New Team Member!", "{new_member_name} has joined your team", NotificationType.success, "/team"),
+    "bonus_earned": ("Bonus Earned!", "You earned €{amount:.2f} from {bonus_type} bonus", NotificationType.success, "/bonuses"),
+    "rank_achieved": ("Rank Achievement!", "Congratulations! You've achieved {rank_name} rank", NotificationType.success, "/ranks"),
+    "payout_approved": ("Payout Update", "Your payout request of €{amount:.2f} has been approved", NotificationType.info, "/payouts"),
+    "payout_completed": ("Payout Update", "Your payout of €{amount:.2f} has been completed", NotificationType.success, "/payouts"),
+    "payout_rejected": ("Payout Update", "Your payout request of €{amount:.2f} has been rejected", NotificationType.warning, "/payouts"),
+    "payout_status": ("Payout Update", "Payout status: {status}", NotificationType.warning, "/payouts"),
+    "transaction_completed": ("Transaction Completed", "Your purchase of €{amount:.2f} has been completed", NotificationType.success, "/transactions"),
+}
+
+def render_notification(user_id: int, template: str, params: Dict) -> Dict:
+    """Build a notification row from a template"""
+    if template not in NOTIFICATION_TEMPLATES:
+        raise ValueError(f"Unknown notification template: {template}")
+    title, message, notification_type, link = NOTIFICATION_TEMPLATES[template]
+    return {
+        "user_id": user_id,
+        "type": notification_type,
+        "title": title,
+        "message": message.format(**params),
+        "link": link
+    }
+
+def _stage_notification_event(db: Session, row: Dict):
+    stage_event(db, row["user_id"], "notification", {
+        "title": row["title"],
+        "message": row["message"],
+        "type": row["type"].value,
+        "link": row.get("link")
+    })
+
+def write_notifications(db: Session, rows: List[Dict]) -> int:
+    """Insert notification rows with one statement; nothing is committed"""
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(Notification), [
+        {"is_read": False, "created_at": now, **row} for row in rows
+    ])
+    for row in rows:
+        stage_count_delta(db, row["user_id"], total=1, unread=1)
+        _stage_notification_event(db, row)
+    return len(rows)
+
+def create_notifications(db: Session, items: Iterable[Tuple[int, str, Dict]], commit: bool = True) -> int:
+    """Create many (user_id, template, params) notifications with one insert and one commit"""
+    count = write_notifications(db, [render_notification(user_id, template, params) for user_id, template, params in items])
+    if commit and count:
+        db.commit()
+    return count
 
 def create_notification(
     db: Session,
@@ -20,6 +79,10 @@ def create_notification(
     )
     
     db.add(notification)
+    stage_count_delta(db, user_id, total=1, unread=1)
+    _stage_notification_event(db, {
+        "user_id": user_id, "title": title, "message": message, "type": notification_type, "link": link
+    })
     db.commit()
     db.refresh(notification)
     
@@ -35,6 +98,8 @@ def mark_as_read(db: Session, notification_id: int, user_id: int) -> bool:
     if not notification:
         return False
     
+    if not notification.is_read:
+        stage_count_delta(db, user_id, unread=-1)
     notification.is_read = True
     notification.read_at = datetime.utcnow()
     db.commit()
@@ -51,74 +116,66 @@ def mark_all_as_read(db: Session, user_id: int) -> int:
         "read_at": datetime.utcnow()
     })
     
+    stage_count_delta(db, user_id, unread=-count)
     db.commit()
     return count
 
+def delete_notification(db: Session, notification_id: int, user_id: int) -> bool:
+    """Delete one of a user's notifications"""
+    notification = db.query(Notification).filter(
+        Notification.id == notification_id,
+        Notification.user_id == user_id
+    ).first()
+    
+    if not notification:
+        return False
+    
+    stage_count_delta(db, user_id, total=-1, unread=0 if notification.is_read else -1)
+    db.delete(notification)
+    db.commit()
+    
+    return True
+
+def get_notification_counts(db: Session, user_id: int) -> Dict[str, int]:
+    """Total and unread notification counts (served from the Redis counters)"""
+    def load():
+        return db.query(
+            func.count(Notification.id),
+            func.sum(case((Notification.is_read == False, 1), else_=0))
+        ).filter(Notification.user_id == user_id).one()
+    return notification_counters.get(user_id, load)
+
 def get_unread_count(db: Session, user_id: int) -> int:
     """Get count of unread notifications"""
-    return db.query(Notification).filter(
-        Notification.user_id == user_id,
-        Notification.is_read == False
-    ).count()
+    return get_notification_counts(db, user_id)["unread"]
+
+def notify(db: Session, user_id: int, template: str, **params):
+    """Queue a templated notification in the caller's transaction"""
+    row = render_notification(user_id, template, params)
+    enqueue_notification(db, user_id, row["title"], row["message"], row["type"], row["link"])
 
-# Notification templates
+def notify_many(db: Session, items: Iterable[Tuple[int, str, Dict]]) -> int:
+    """Queue many templated notifications with one outbox insert"""
+    return enqueue_notifications(db, [render_notification(user_id, template, params) for user_id, template, params in items])
+
+# Notification templates; queued through the outbox in the caller's transaction
 def notify_new_team_member(db: Session, sponsor_id: int, new_member_name: str):
     """Notify user about new team member"""
-    create_notification(
-        db,
-        sponsor_id,
-        "New Team Member!",
-        f"{new_member_name} has joined your team",
-        NotificationType.success,
-        "/team"
-    )
+    notify(db, sponsor_id, "new_team_member", new_member_name=new_member_name)
 
 def notify_bonus_earned(db: Session, user_id: int, bonus_type: str, amount: float):
     """Notify user about earned bonus"""
-    create_notification(
-        db,
-        user_id,
-        "Bonus Earned!",
-        f"You earned €{amount:.2f} from {bonus_type} bonus",
-        NotificationType.success,
-        "/bonuses"
-    )
+    notify(db, user_id, "bonus_earned", bonus_type=bonus_type, amount=amount)
 
 def notify_rank_achieved(db: Session, user_id: int, rank_name: str):
     """Notify user about rank achievement"""
-    create_notification(
-        db,
-        user_id,
-        "Rank Achievement!",
-        f"Congratulations! You've achieved {rank_name} rank",
-        NotificationType.success,
-        "/ranks"
-    )
+    notify(db, user_id, "rank_achieved", rank_name=rank_name)
 
 def notify_payout_status(db: Session, user_id: int, status: str, amount: float):
     """Notify user about payout status change"""
-    messages = {
-        "approved": f"Your payout request of €{amount:.2f} has been approved",
-        "completed": f"Your payout of €{amount:.2f} has been completed",
-        "rejected": f"Your payout request of €{amount:.2f} has been rejected"
-    }
-    
-    create_notification(
-        db,
-        user_id,
-        "Payout Update",
-        messages.get(status, f"Payout status: {status}"),
-        NotificationType.info if status == "approved" else NotificationType.success if status == "completed" else NotificationType.warning,
-        "/payouts"
-    )
+    template = f"payout_{status}" if f"payout_{status}" in NOTIFICATION_TEMPLATES else "payout_status"
+    notify(db, user_id, template, status=status, amount=amount)
 
 def notify_transaction_completed(db: Session, user_id: int, amount: float):
     """Notify user about completed transaction"""
-    create_notification(
-        db,
-        user_id,
-        "Transaction Completed",
-        f"Your purchase of €{amount:.2f} has been completed",
-        NotificationType.success,
-        "/transactions"
-    )
+    notify(db, user_id, "transaction_completed", amount=amount)
@@ -1,12 +1,16 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import text, func, and_
+from sqlalchemy import text, func, and_, insert
 from datetime import datetime, timedelta
 from app.models.user import User
+from app.models.team import TeamMember
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.models.bonus import Bonus, BonusType, BonusStatus
+from app.models.processed_purchase import ProcessedPurchase
 from app.services.optimized_team_service import OptimizedTeamService
-from app.services.config_service import get_config
-from typing import List, Dict, Tuple
+from app.services.config_service import get_config_bool, get_config_json
+from app.services.balance_ledger import BALANCE_COLUMNS, apply_balance_deltas
+from app.services.outbox import enqueue_emails
+from typing import List, Dict, Optional, Set, Tuple
 import logging
 import json
 
@@ -14,39 +18,91 @@ logger = logging.getLogger(__name__)
 
 def get_unilevel_percentages(db: Session) -> dict:
     """Get unilevel percentages from database config"""
-    config_str = get_config(db, "unilevel_percentages")
-    if config_str:
-        percentages_list = json.loads(config_str)
+    percentages_list = get_config_json(db, "unilevel_percentages")
+    if percentages_list:
         return {i + 1: percentages_list[i] for i in range(len(percentages_list))}
     return {i: 0 for i in range(1, 16)}
 
 def get_rank_bonus_amounts(db: Session) -> dict:
     """Get rank bonus amounts from database config"""
-    config_str = get_config(db, "rank_bonus_amounts")
-    if config_str:
-        return json.loads(config_str)
-    return {}
+    return get_config_json(db, "rank_bonus_amounts", {}) or {}
 
 def is_unilevel_enabled(db: Session) -> bool:
-    return get_config(db, "unilevel_enabled") == "true"
+    return get_config_bool(db, "unilevel_enabled")
 
 def is_rank_bonus_enabled(db: Session) -> bool:
-    return get_config(db, "rank_bonus_enabled") == "true"
+    return get_config_bool(db, "rank_bonus_enabled")
 
 def is_infinity_enabled(db: Session) -> bool:
-    return get_config(db, "infinity_enabled") == "true"
+    return get_config_bool(db, "infinity_enabled")
+
+# Payout rules, shared by the engines and the plan simulator
+
+UNILEVEL_MAX_DEPTH = 15
+UNILEVEL_ACTIVITY_WINDOW = timedelta(days=30)
+
+def is_unilevel_active(last_activity: Optional[datetime], now: datetime) -> bool:
+    """An upline member earns unilevel bonuses only if active in the last 30 days"""
+    return bool(last_activity) and last_activity >= now - UNILEVEL_ACTIVITY_WINDOW
+
+def unilevel_bonus_amount(amount: float, level: int, percentages: dict) -> float:
+    return amount * (percentages.get(level, 0) / 100)
+
+def rank_bonus_amount(rank_bonus_amounts: dict, rank_name: str) -> float:
+    return rank_bonus_amounts.get(rank_name, 0)
+
+def infinity_bonus_amount(volume, percentage):
+    """Share of the company volume; works on floats and Decimals alike"""
+    return volume * percentage / 100
 
 class OptimizedBonusEngine:
     
     @staticmethod
-    def calculate_unilevel_bonuses_batch(db: Session, transaction_ids: List[int]) -> List[Bonus]:
-        """Process multiple transactions for unilevel bonuses efficiently"""
-        if not transaction_ids or not is_unilevel_enabled(db):
+    def claim_purchases(db: Session, transaction_ids: List[int]) -> List[int]:
+        """Insert processed markers; returns the ids this caller now owns.
+
+        The markers commit together with the bonuses, so a purchase is paid
+        exactly once even when several workers see it. Refunds claim their
+        purchases too, so no payout can land after one. Nothing is committed.
+        """
+        if not transaction_ids:
             return []
+        now = datetime.utcnow()
+        rows = [{"transaction_id": tid, "processed_at": now} for tid in sorted(set(transaction_ids))]
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            result = db.execute(
+                pg_insert(ProcessedPurchase).values(rows)
+                .on_conflict_do_nothing(index_elements=["transaction_id"])
+                .returning(ProcessedPurchase.transaction_id)
+            )
+            return [row[0] for row in result]
         
-        UNILEVEL_PERCENTAGES = get_unilevel_percentages(db)
+        existing = {
+            row[0] for row in db.query(ProcessedPurchase.transaction_id).filter(
+                ProcessedPurchase.transaction_id.in_([row["transaction_id"] for row in rows])
+            ).all()
+        }
+        rows = [row for row in rows if row["transaction_id"] not in existing]
+        if rows:
+            db.execute(insert(ProcessedPurchase), rows)
+        return [row["transaction_id"] for row in rows]
+    
+    @staticmethod
+    def calculate_unilevel_bonuses_batch(db: Session, transaction_ids: List[int]) -> List[Dict]:
+        """Pay unilevel bonuses for a batch of completed purchases and commit.
+
+        Runs a fixed number of statements whatever the batch size or upline
+        depth: the purchases, their processed markers, the purchasers'
+        15-level uplines with activity (see _active_uplines), bulk inserts for
+        the bonuses and their bonus transactions, and the balance ledger write.
+        A level is paid when that ancestor was active in the last 30 days.
+        Purchases already marked processed are skipped. Bonus emails go to
+        the background queue after the commit.
+        """
+        if not transaction_ids or not is_unilevel_enabled(db):
+            return []
         
-        # Get all transactions with user data in single query
         transactions = db.query(
             Transaction.id,
             Transaction.user_id,
@@ -58,119 +114,171 @@ class OptimizedBonusEngine:
             Transaction.status == TransactionStatus.completed
         ).all()
         
+        invalid = [t.id for t in transactions if t.currency not in BALANCE_COLUMNS]
+        if invalid:
+            logger.error(f"Invalid currency for transactions {invalid}; skipping bonus calculation")
+        transactions = [t for t in transactions if t.currency in BALANCE_COLUMNS]
         if not transactions:
             return []
         
-        # Get active ancestors for all purchasers
-        purchaser_ids = [t.user_id for t in transactions]
-        ancestors_map = OptimizedTeamService.get_active_ancestors_batch(db, purchaser_ids, 15)
+        claimed = set(OptimizedBonusEngine.claim_purchases(db, [t.id for t in transactions]))
+        transactions = [t for t in transactions if t.id in claimed]
+        if not transactions:
+            return []
         
-        bonuses_to_create = []
-        balance_updates = {}
+        percentages = get_unilevel_percentages(db)
+        now = datetime.utcnow()
         
+        uplines, addresses = OptimizedBonusEngine._active_uplines(
+            db, {t.user_id for t in transactions}, percentages, now
+        )
+        
+        bonuses, bonus_transactions, deltas, emails = [], [], {}, []
         for transaction in transactions:
-            purchaser_id = transaction.user_id
             amount = float(transaction.amount)
-            
-            ancestors = ancestors_map.get(purchaser_id, [])
-            
-            # Group ancestors by level for compression
-            level_ancestors = {}
-            for i, ancestor_id in enumerate(ancestors[:15], 1):
-                if i not in level_ancestors:
-                    level_ancestors[i] = []
-                level_ancestors[i].append(ancestor_id)
-            
-            # Calculate bonuses for each level
-            for level in range(1, 16):
-                if level not in level_ancestors:
-                    continue
-                
-                percentage = UNILEVEL_PERCENTAGES.get(level, 0)
-                if percentage == 0:
-                    continue
-                
-                # Use first active ancestor (compression already handled)
-                recipient_id = level_ancestors[level][0]
-                bonus_amount = amount * (percentage / 100)
-                
-                # Prepare bonus record
-                bonuses_to_create.append({
-                    'user_id': recipient_id,
-                    'bonus_type': BonusType.unilevel,
-                    'amount': bonus_amount,
-                    'currency': transaction.currency,
-                    'status': BonusStatus.paid,
-                    'level': level,
-                    'source_user_id': purchaser_id,
-                    'source_transaction_id': transaction.id,
-                    'percentage': percentage,
-                    'base_amount': amount,
-                    'paid_date': datetime.utcnow().date(),
-                    'calculation_date': datetime.utcnow().date(),
-                    'created_at': datetime.utcnow(),
-                    'updated_at': datetime.utcnow()
+            for ancestor_id, level in uplines.get(transaction.user_id, []):
+                percentage = percentages[level]
+                bonus_amount = unilevel_bonus_amount(amount, level, percentages)
+                bonuses.append({
+                    "user_id": ancestor_id,
+                    "bonus_type": BonusType.unilevel,
+                    "amount": bonus_amount,
+                    "currency": transaction.currency,
+                    "status": BonusStatus.paid,
+                    "level": level,
+                    "source_user_id": transaction.user_id,
+                    "source_transaction_id": transaction.id,
+                    "percentage": percentage,
+                    "base_amount": amount,
+                    "paid_date": now.date(),
+                    "calculation_date": now.date(),
+                    "calculation_metadata": {"compression_applied": False},
+                    "created_at": now,
+                    "updated_at": now
                 })
-                
-                # Accumulate balance updates
-                if recipient_id not in balance_updates:
-                    balance_updates[recipient_id] = {'eur': 0, 'dbsp': 0, 'usdt': 0}
-                
-                currency_key = transaction.currency.lower()
-                if currency_key in balance_updates[recipient_id]:
-                    balance_updates[recipient_id][currency_key] += bonus_amount
-        
-        # Bulk insert bonuses
-        if bonuses_to_create:
-            db.execute(
-                text("""
-                    INSERT INTO bonuses (
-                        user_id, bonus_type, amount, currency, status, level,
-                        source_user_id, source_transaction_id, percentage, base_amount,
-                        paid_date, calculation_date, created_at, updated_at
-                    ) VALUES (
-                        :user_id, :bonus_type, :amount, :currency, :status, :level,
-                        :source_user_id, :source_transaction_id, :percentage, :base_amount,
-                        :paid_date, :calculation_date, :created_at, :updated_at
-                    )
-                """),
-                bonuses_to_create
-            )
-        
-        # Bulk update user balances
-        OptimizedBonusEngine._bulk_update_balances(db, balance_updates)
-        
-        db.commit()
-        logger.info(f"Created {len(bonuses_to_create)} unilevel bonuses for {len(transactions)} transactions")
-        
-        return bonuses_to_create
+                bonus_transactions.append({
+                    "user_id": ancestor_id,
+                    "transaction_type": TransactionType.bonus,
+                    "amount": bonus_amount,
+                    "currency": transaction.currency,
+                    "status": TransactionStatus.completed,
+                    "description": f"Unilevel bonus L{level} from purchase",
+                    "related_transaction_id": transaction.id,
+                    "completed_at": now,
+                    "created_at": now,
+                    "updated_at": now
+                })
+                recipient = deltas.setdefault(ancestor_id, {})
+                recipient[transaction.currency] = recipient.get(transaction.currency, 0) + bonus_amount
+                emails.append((ancestor_id, addresses.get(ancestor_id), level, bonus_amount, transaction.currency))
+        
+        try:
+            balances = {}
+            if bonuses:
+                db.execute(insert(Bonus), bonuses)
+                db.execute(insert(Transaction), bonus_transactions)
+                balances = OptimizedBonusEngine._bulk_update_balances(db, deltas, "unilevel_bonus")
+                # Queued in the same transaction, so an email exists exactly
+                # when its bonus does
+                enqueue_emails(db, "bonus_earned", [
+                    {
+                        "email": email,
+                        "bonus_type": f"Unilevel Level {level}",
+                        "amount": float(bonus_amount),
+                        "new_balance": balances.get(user_id, {}).get(currency, 0.0)
+                    }
+                    for user_id, email, level, bonus_amount, currency in emails
+                    if email
+                ])
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to pay unilevel bonuses for transactions {sorted(claimed)}: {str(e)}", exc_info=True)
+            db.rollback()
+            raise
+        
+        logger.info(f"Created {len(bonuses)} unilevel bonuses for {len(transactions)} transactions")
+        
+        return bonuses
     
     @staticmethod
-    def _bulk_update_balances(db: Session, balance_updates: Dict[int, Dict[str, float]]):
-        """Efficiently update user balances in batch"""
-        if not balance_updates:
-            return
-        
-        # Prepare update statements for each currency
-        for user_id, balances in balance_updates.items():
-            updates = []
-            total_earnings_update = sum(balances.values())
-            
-            if balances['eur'] > 0:
-                updates.append(f"balance_eur = balance_eur + {balances['eur']}")
-            if balances['dbsp'] > 0:
-                updates.append(f"balance_dbsp = balance_dbsp + {balances['dbsp']}")
-            if balances['usdt'] > 0:
-                updates.append(f"balance_usdt = balance_usdt + {balances['usdt']}")
-            
-            if updates:
-                updates.append(f"total_earnings = total_earnings + {total_earnings_update}")
-                update_sql = f"UPDATE users SET {', '.join(updates)} WHERE id = {user_id}"
-                db.execute(text(update_sql))
+    def _active_uplines(
+        db: Session,
+        buyer_ids: Set[int],
+        percentages: dict,
+        now: datetime
+    ) -> Tuple[Dict[int, List[Tuple[int, int]]], Dict[int, str]]:
+        """Paid (ancestor_id, level) pairs per buyer, plus the recipients' emails.
+
+        With the genealogy and activity indexes loaded the uplines and the
+        30-day activity filter come from memory and only the emails are
+        queried; otherwise (and for buyers the index doesn't know yet) one
+        closure-table join does it all.
+        """
+        from app.core.genealogy import genealogy_index
+        from app.core.activity_index import activity_index
+        
+        uplines: Dict[int, List[Tuple[int, int]]] = {}
+        addresses: Dict[int, str] = {}
+        paths = genealogy_index.ancestor_paths(buyer_ids, UNILEVEL_MAX_DEPTH)
+        if paths is not None:
+            candidates = {
+                ancestor_id for path in paths.values()
+                for level, ancestor_id in enumerate(path, 1) if percentages.get(level, 0)
+            }
+            active_ids = activity_index.active_since(candidates, now - UNILEVEL_ACTIVITY_WINDOW)
+            if active_ids is not None:
+                for buyer_id, path in paths.items():
+                    paid = [
+                        (ancestor_id, level) for level, ancestor_id in enumerate(path, 1)
+                        if ancestor_id in active_ids and percentages.get(level, 0)
+                    ]
+                    if paid:
+                        uplines[buyer_id] = paid
+                if active_ids:
+                    addresses = dict(db.query(User.id, User.email).filter(User.id.in_(active_ids)).all())
+                # Buyers the index doesn't know yet go through the closure table
+                buyer_ids = set(buyer_ids) - paths.keys()
+                if not buyer_ids:
+                    return uplines, addresses
+        
+        for buyer_id, ancestor_id, level, email, last_activity in db.query(
+            TeamMember.user_id,
+            TeamMember.ancestor_id,
+            TeamMember.depth,
+            User.email,
+            User.last_activity_date
+        ).join(
+            User, User.id == TeamMember.ancestor_id
+        ).filter(
+            TeamMember.user_id.in_(buyer_ids),
+            TeamMember.depth > 0,
+            TeamMember.depth <= UNILEVEL_MAX_DEPTH
+        ).order_by(TeamMember.user_id, TeamMember.depth).all():
+            if percentages.get(level, 0) and is_unilevel_active(last_activity, now):
+                uplines.setdefault(buyer_id, []).append((ancestor_id, level))
+                addresses[ancestor_id] = email
+        return uplines, addresses
+    
+    @staticmethod
+    def calculate_purchase_unilevel_bonuses(db: Session, transaction_id: int) -> List[Dict]:
+        """Pay unilevel bonuses for one completed purchase (synchronous path)"""
+        try:
+            return OptimizedBonusEngine.calculate_unilevel_bonuses_batch(db, [transaction_id])
+        except Exception:
+            return []
+    
+    @staticmethod
+    def _bulk_update_balances(db: Session, balance_updates: Dict[int, Dict[str, float]], reason: str) -> Dict[int, Dict[str, float]]:
+        """Apply {user_id: {currency: delta}} through the balance ledger; returns new balances"""
+        return apply_balance_deltas(db, balance_updates, reason)
     
     @staticmethod
-    def calculate_rank_bonuses_batch(db: Session, user_rank_changes: List[Tuple[int, str, str]]) -> List[Bonus]:
-        """Process rank achievements for multiple users efficiently"""
+    def calculate_rank_bonuses_batch(db: Session, user_rank_changes: List[Tuple[int, str, str]], commit: bool = True) -> List[Bonus]:
+        """Process rank achievements for multiple users efficiently.
+
+        With commit=False the bonuses join the caller's transaction, e.g.
+        the one writing the promotions themselves.
+        """
         if not user_rank_changes or not is_rank_bonus_enabled(db):
             return []
         
@@ -183,14 +291,14 @@ class OptimizedBonusEngine:
         balance_updates = {}
         
         for user_id, old_rank, new_rank in user_rank_changes:
-            bonus_amount = rank_bonus_map.get(new_rank, 0)
+            bonus_amount = rank_bonus_amount(rank_bonus_map, new_rank)
             
             if bonus_amount > 0:
                 bonuses_to_create.append({
                     'user_id': user_id,
                     'bonus_type': BonusType.rank_bonus,
                     'amount': bonus_amount,
-                    'currency': 'EUR',
+                    'currency': 'NGN',
                     'status': BonusStatus.paid,
                     'rank_achieved': new_rank,
                     'paid_date': datetime.utcnow().date(),
@@ -199,55 +307,40 @@ class OptimizedBonusEngine:
                     'updated_at': datetime.utcnow()
                 })
                 
-                if user_id not in balance_updates:
-                    balance_updates[user_id] = {'eur': 0, 'dbsp': 0, 'usdt': 0}
-                balance_updates[user_id]['eur'] += bonus_amount
+                user_balances = balance_updates.setdefault(user_id, {'NGN': 0})
+                user_balances['NGN'] += bonus_amount
         
         # Bulk operations
         if bonuses_to_create:
-            db.execute(
-                text("""
-                    INSERT INTO bonuses (
-                        user_id, bonus_type, amount, currency, status, rank_achieved,
-                        paid_date, calculation_date, created_at, updated_at
-                    ) VALUES (
-                        :user_id, :bonus_type, :amount, :currency, :status, :rank_achieved,
-                        :paid_date, :calculation_date, :created_at, :updated_at
-                    )
-                """),
-                bonuses_to_create
+            # Through the model so the enum columns are bound as their values
+            db.execute(insert(Bonus), bonuses_to_create)
+        
+        OptimizedBonusEngine._bulk_update_balances(db, balance_updates, "rank_bonus")
+        
+        # Rank achievement emails go out through the outbox with the bonuses
+        if balance_updates:
+            recipients = db.query(User.id, User.email, User.full_name, User.total_earnings).filter(
+                User.id.in_(balance_updates.keys())
+            ).all()
+            team_sizes = dict(
+                db.query(TeamMember.ancestor_id, func.count(TeamMember.id))
+                .filter(TeamMember.ancestor_id.in_(balance_updates.keys()))
+                .group_by(TeamMember.ancestor_id).all()
             )
-        
-        OptimizedBonusEngine._bulk_update_balances(db, balance_updates)
-        db.commit()
-        
-        # Send rank achievement emails
-        for user_id, old_rank, new_rank in user_rank_changes:
-            bonus_amount = rank_bonus_map.get(new_rank, 0)
-            if bonus_amount > 0:
-                try:
-                    from app.models.user import User
-                    from app.models.team import TeamMember
-                    import asyncio
-                    from app.services.email_service import send_rank_achievement_email
-                    
-                    user = db.query(User).filter(User.id == user_id).first()
-                    if user:
-                        # Get team stats
-                        team_size = db.query(TeamMember).filter(TeamMember.ancestor_id == user_id).count()
-                        total_turnover = float(user.total_earnings or 0)
-                        
-                        asyncio.create_task(send_rank_achievement_email(
-                            user.email,
-                            user.full_name or "User",
-                            new_rank,
-                            float(bonus_amount),
-                            total_turnover,
-                            team_size,
-                            db
-                        ))
-                except Exception as e:
-                    print(f"Failed to send rank achievement email: {e}")
+            new_ranks = {user_id: new_rank for user_id, _, new_rank in user_rank_changes}
+            enqueue_emails(db, "rank_achievement", [
+                {
+                    "email": row.email,
+                    "user_name": row.full_name or "User",
+                    "rank_name": new_ranks[row.id],
+                    "bonus_amount": float(rank_bonus_amount(rank_bonus_map, new_ranks[row.id])),
+                    "total_turnover": float(row.total_earnings or 0),
+                    "team_size": team_sizes.get(row.id, 0)
+                }
+                for row in recipients
+            ])
+        if commit:
+            db.commit()
         
         logger.info(f"Created {len(bonuses_to_create)} rank bonuses")
         return bonuses_to_create
@@ -308,7 +401,7 @@ class OptimizedBonusEngine:
                 'user_id': row.user_id,
                 'bonus_type': BonusType.infinity,
                 'amount': float(row.bonus_amount),
-                'currency': 'EUR',
+                'currency': 'NGN',
                 'status': BonusStatus.paid,
                 'rank_achieved': row.current_rank,
                 'percentage': float(row.infinity_bonus_percentage),
@@ -324,9 +417,8 @@ class OptimizedBonusEngine:
                 }
             })
             
-            if row.user_id not in balance_updates:
-                balance_updates[row.user_id] = {'eur': 0, 'dbsp': 0, 'usdt': 0}
-            balance_updates[row.user_id]['eur'] += float(row.bonus_amount)
+            user_balances = balance_updates.setdefault(row.user_id, {'NGN': 0})
+            user_balances['NGN'] += float(row.bonus_amount)
         
         # Bulk operations
         if bonuses_to_create:
@@ -345,7 +437,7 @@ class OptimizedBonusEngine:
                 bonuses_to_create
             )
         
-        OptimizedBonusEngine._bulk_update_balances(db, balance_updates)
+        OptimizedBonusEngine._bulk_update_balances(db, balance_updates, "infinity_bonus")
         db.commit()
         
         logger.info(f"Created {len(bonuses_to_create)} infinity bonuses for {month}/{year}")
@@ -1,10 +1,12 @@
-from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import func, and_, select, text
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+from sqlalchemy import event, func, and_, select, text
 from app.models.user import User
 from app.models.team import TeamMember
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from typing import List, Dict, Optional
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
+
+LEG_BREAKDOWN_INFO_KEY = "leg_breakdowns"
 
 @dataclass
 class LegData:
@@ -14,6 +16,59 @@ class LegData:
     turnover: float
     percentage: float = 0.0
 
+@dataclass
+class LegBreakdown:
+    """First-line legs of one user, largest turnover first"""
+    user_id: int
+    legs: List[LegData] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.legs.sort(key=lambda leg: leg.turnover, reverse=True)
+        total = self.total_turnover
+        for leg in self.legs:
+            leg.percentage = leg.turnover / total * 100 if total else 0.0
+
+    @property
+    def total_turnover(self) -> float:
+        return sum(leg.turnover for leg in self.legs)
+
+    @property
+    def first_leg(self) -> Optional[LegData]:
+        return self.legs[0] if self.legs else None
+
+    @property
+    def second_leg(self) -> Optional[LegData]:
+        return self.legs[1] if len(self.legs) > 1 else None
+
+    @property
+    def other_legs(self) -> List[LegData]:
+        return self.legs[2:]
+
+    @property
+    def first_leg_turnover(self) -> float:
+        return self.first_leg.turnover if self.first_leg else 0.0
+
+    @property
+    def second_leg_turnover(self) -> float:
+        return self.second_leg.turnover if self.second_leg else 0.0
+
+    @property
+    def other_legs_turnover(self) -> float:
+        return sum(leg.turnover for leg in self.other_legs)
+
+    def to_dict(self) -> Dict:
+        """Legacy dict shape used by the leg endpoints"""
+        return {
+            "first_leg": asdict(self.first_leg) if self.first_leg else None,
+            "second_leg": asdict(self.second_leg) if self.second_leg else None,
+            "other_legs": {
+                "turnover": self.other_legs_turnover,
+                "percentage": sum(leg.percentage for leg in self.other_legs),
+                "count": len(self.other_legs)
+            },
+            "all_legs": [asdict(leg) for leg in self.legs]
+        }
+
 class OptimizedTeamService:
     
     @staticmethod
@@ -55,6 +110,18 @@ class OptimizedTeamService:
     def get_team_stats_bulk(db: Session, user_id: int) -> Dict:
         """Get all team statistics in optimized bulk query"""
         from sqlalchemy import case
+        from app.services.team_aggregate_service import get_team_aggregate, get_pending_member_counts
+        from app.services.turnover_ledger import get_pending_turnover
+        
+        pending_turnover = get_pending_turnover(db, [user_id])[user_id]["total"]
+        aggregate = get_team_aggregate(db, user_id)
+        if aggregate is not None:
+            pending = get_pending_member_counts(db, user_id)
+            return {
+                "total_team": aggregate.team_size + pending["team_size"],
+                "total_turnover": float(aggregate.team_turnover or 0) + pending_turnover,
+                "first_line_count": aggregate.first_line_count + pending["first_line_count"]
+            }
         
         # Single query for team counts and turnovers
         stats_query = db.query(
@@ -70,74 +137,61 @@ class OptimizedTeamService:
         
         return {
             "total_team": stats_query.total_team or 0,
-            "total_turnover": float(stats_query.total_turnover or 0),
+            "total_turnover": float(stats_query.total_turnover or 0) + pending_turnover,
             "first_line_count": int(stats_query.first_line_count or 0)
         }
     
     @staticmethod
-    def calculate_leg_breakdown_optimized(db: Session, user_id: int) -> Dict:
-        """Optimized leg breakdown calculation with minimal queries"""
-        # Get first line with their leg turnovers in single query
-        leg_query = text("""
-            WITH leg_turnovers AS (
-                SELECT 
-                    fl.id as member_id,
-                    fl.full_name,
-                    fl.email,
-                    COALESCE(SUM(tm.personal_turnover), 0) as leg_turnover,
-                    COUNT(tm.user_id) as team_size
-                FROM users fl
-                LEFT JOIN team_members tm ON (
-                    tm.ancestor_id = fl.id OR tm.user_id = fl.id
-                )
-                WHERE fl.sponsor_id = :user_id
-                GROUP BY fl.id, fl.full_name, fl.email
-            )
-            SELECT 
-                member_id,
-                COALESCE(full_name, email) as member_name,
-                team_size,
-                leg_turnover,
-                (leg_turnover / NULLIF(SUM(leg_turnover) OVER(), 0) * 100) as percentage
-            FROM leg_turnovers
-            ORDER BY leg_turnover DESC
-        """)
-        
-        result = db.execute(leg_query, {"user_id": user_id}).fetchall()
-        
-        if not result:
-            return {
-                "first_leg": None,
-                "second_leg": None,
-                "other_legs": {"turnover": 0, "percentage": 0, "count": 0},
-                "all_legs": []
-            }
-        
+    def get_leg_breakdown(db: Session, user_id: int) -> "LegBreakdown":
+        """Turnover of every first-line leg, computed once per request.
+
+        A leg's turnover is the personal turnover of the first-line member and
+        everyone below them. All legs come out of one grouped query over the
+        closure table (each leg member's self row holds its personal
+        turnover), plus any turnover still waiting in the write-behind ledger.
+        The result is memoized on the session until the next commit, so rank
+        checks and progress reads in the same request share it.
+        """
+        breakdowns = db.info.setdefault(LEG_BREAKDOWN_INFO_KEY, {})
+        breakdown = breakdowns.get(user_id)
+        if breakdown is not None:
+            return breakdown
+
+        from app.services.turnover_ledger import get_pending_turnover
+
+        leg_member = aliased(TeamMember)
+        member_self = aliased(TeamMember)
+        rows = db.query(
+            User.id,
+            func.coalesce(User.full_name, User.email),
+            func.count(member_self.user_id),
+            func.coalesce(func.sum(member_self.personal_turnover), 0)
+        ).outerjoin(
+            leg_member, leg_member.ancestor_id == User.id
+        ).outerjoin(
+            member_self, and_(member_self.user_id == leg_member.user_id, member_self.depth == 0)
+        ).filter(
+            User.sponsor_id == user_id
+        ).group_by(User.id, User.full_name, User.email).all()
+
+        pending = get_pending_turnover(db, [row[0] for row in rows])
         legs = [
             LegData(
-                member_id=row.member_id,
-                member_name=row.member_name,
-                team_size=row.team_size,
-                turnover=float(row.leg_turnover),
-                percentage=float(row.percentage or 0)
+                member_id=member_id,
+                member_name=member_name,
+                team_size=team_size,
+                turnover=float(turnover or 0) + pending[member_id]["personal"] + pending[member_id]["total"]
             )
-            for row in result
+            for member_id, member_name, team_size, turnover in rows
         ]
-        
-        first_leg = legs[0] if legs else None
-        second_leg = legs[1] if len(legs) > 1 else None
-        other_legs_data = legs[2:] if len(legs) > 2 else []
-        
-        return {
-            "first_leg": first_leg.__dict__ if first_leg else None,
-            "second_leg": second_leg.__dict__ if second_leg else None,
-            "other_legs": {
-                "turnover": sum(leg.turnover for leg in other_legs_data),
-                "percentage": sum(leg.percentage for leg in other_legs_data),
-                "count": len(other_legs_data)
-            },
-            "all_legs": [leg.__dict__ for leg in legs]
-        }
+        breakdown = LegBreakdown(user_id=user_id, legs=legs)
+        breakdowns[user_id] = breakdown
+        return breakdown
+    
+    @staticmethod
+    def calculate_leg_breakdown_optimized(db: Session, user_id: int) -> Dict:
+        """Optimized leg breakdown calculation with minimal queries"""
+        return OptimizedTeamService.get_leg_breakdown(db, user_id).to_dict()
     
     @staticmethod
     def bulk_update_turnover(db: Session, user_transactions: List[tuple]) -> None:
@@ -184,6 +238,33 @@ class OptimizedTeamService:
     @staticmethod
     def get_active_ancestors_batch(db: Session, user_ids: List[int], max_depth: int = 15) -> Dict[int, List[int]]:
         """Get active ancestors for multiple users in single query"""
+        from app.core.genealogy import genealogy_index
+        from app.core.activity_index import activity_index
+        
+        result = {}
+        paths = genealogy_index.ancestor_paths(user_ids, max_depth)
+        if paths is not None:
+            # Ancestor chains come from memory, and so does the activity
+            # filter once the activity index is loaded
+            ancestor_ids = {ancestor_id for path in paths.values() for ancestor_id in path}
+            active_ids = activity_index.active_ids(ancestor_ids) if ancestor_ids else set()
+            if active_ids is None:
+                active_ids = {
+                    row[0] for row in db.query(User.id).filter(
+                        User.id.in_(ancestor_ids),
+                        User.is_active == True,
+                        User.activity_status == 'active'
+                    ).all()
+                }
+            for user_id, path in paths.items():
+                active_chain = [ancestor_id for ancestor_id in path if ancestor_id in active_ids]
+                if active_chain:
+                    result[user_id] = active_chain
+            # Users the index doesn't know yet are resolved from team_members
+            user_ids = [user_id for user_id in user_ids if user_id not in paths]
+            if not user_ids:
+                return result
+        
         # Get all ancestor relationships
         ancestor_query = db.query(
             TeamMember.user_id,
@@ -205,7 +286,6 @@ class OptimizedTeamService:
         ).all()
         
         # Group by user_id
-        result = {}
         for row in ancestor_query:
             if row.user_id not in result:
                 result[row.user_id] = []
@@ -280,3 +360,10 @@ class OptimizedTeamService:
             "levels": levels,
             "totals": totals or {"members": 0, "turnover": 0, "active": 0}
         }
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _drop_leg_breakdowns(session):
+    # Turnover may have moved; the next read recomputes
+    session.info.pop(LEG_BREAKDOWN_INFO_KEY, None)
@@ -0,0 +1,200 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.models.notification import NotificationType
+from app.models.outbox import OutboxMessage
+from app.services import email_service
+from app.services.email_transport import close_email_transports
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Outbox topic -> email_service sender; payloads are the sender's keyword
+# arguments without db
+EMAIL_SENDERS = {
+    "bonus_earned": "send_bonus_earned_email",
+    "rank_achievement": "send_rank_achievement_email",
+    "payout_request": "send_payout_request_email",
+    "payout_processed": "send_payout_processed_email",
+    "account_activated": "send_account_activated_email",
+}
+
+
+def enqueue_email(db: Session, topic: str, **params) -> OutboxMessage:
+    """Add an email to the caller's transaction; nothing is committed"""
+    if topic not in EMAIL_SENDERS:
+        raise ValueError(f"Unknown email topic: {topic}")
+    message = OutboxMessage(kind="email", topic=topic, payload=params, status="pending")
+    db.add(message)
+    return message
+
+
+def enqueue_emails(db: Session, topic: str, params: List[Dict]) -> int:
+    """Add many emails of one topic with a single insert; nothing is committed"""
+    if topic not in EMAIL_SENDERS:
+        raise ValueError(f"Unknown email topic: {topic}")
+    if not params:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(OutboxMessage), [
+        {
+            "kind": "email", "topic": topic, "payload": item, "status": "pending",
+            "attempts": 0, "available_at": now, "created_at": now
+        }
+        for item in params
+    ])
+    return len(params)
+
+
+def enqueue_notification(
+    db: Session,
+    user_id: int,
+    title: str,
+    message: str,
+    notification_type: NotificationType = NotificationType.info,
+    link: str = None
+) -> OutboxMessage:
+    """Add an in-app notification to the caller's transaction; nothing is committed"""
+    outbox_message = OutboxMessage(
+        kind="notification",
+        topic="notification",
+        payload={
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "type": notification_type.value,
+            "link": link
+        },
+        status="pending"
+    )
+    db.add(outbox_message)
+    return outbox_message
+
+
+def enqueue_notifications(db: Session, rows: List[Dict]) -> int:
+    """Add many notifications ({user_id, title, message, type, link}) with a single insert"""
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(OutboxMessage), [
+        {
+            "kind": "notification", "topic": "notification",
+            "payload": {
+                "user_id": row["user_id"],
+                "title": row["title"],
+                "message": row["message"],
+                "type": row["type"].value,
+                "link": row.get("link")
+            },
+            "status": "pending", "attempts": 0, "available_at": now, "created_at": now
+        }
+        for row in rows
+    ])
+    return len(rows)
+
+
+async def _send_emails(db: Session, messages: List[OutboxMessage]) -> List[Optional[str]]:
+    # Sent concurrently on one event loop so the transport can reuse its
+    # connections and combine the batch into provider batch requests;
+    # returns an error per message (None = sent)
+    async def send(message: OutboxMessage) -> Optional[str]:
+        sender = getattr(email_service, EMAIL_SENDERS[message.topic])
+        try:
+            result = await sender(**message.payload, db=db)
+            return "sender reported failure" if result is False else None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+
+    try:
+        return list(await asyncio.gather(*(send(message) for message in messages)))
+    finally:
+        await close_email_transports()
+
+
+def dispatch_outbox(db: Session, batch_size: Optional[int] = None) -> Dict:
+    """Send one batch of due outbox messages and commit.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so several dispatchers can
+    run side by side. Notifications are written with one insert; emails go
+    out through one event loop. Failed messages are retried with
+    exponential backoff until OUTBOX_MAX_ATTEMPTS. Delivery is at least
+    once: a crash after sending but before the commit resends the batch.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    started = time.monotonic()
+    now = datetime.utcnow()
+    messages = db.query(OutboxMessage).filter(
+        OutboxMessage.status == "pending",
+        OutboxMessage.available_at <= now
+    ).order_by(OutboxMessage.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not messages:
+        db.commit()
+        return {"claimed": 0, "sent": 0, "failed": 0, "seconds": 0.0, "per_second": 0.0}
+
+    notifications = [message for message in messages if message.kind == "notification"]
+    emails = [message for message in messages if message.kind == "email"]
+    errors: Dict[int, Optional[str]] = {}
+
+    if notifications:
+        from app.services.notification_service import write_notifications
+        write_notifications(db, [
+            {
+                "user_id": message.payload["user_id"],
+                "type": NotificationType(message.payload.get("type", "info")),
+                "title": message.payload["title"],
+                "message": message.payload["message"],
+                "link": message.payload.get("link"),
+                "created_at": message.created_at or now
+            }
+            for message in notifications
+        ])
+        errors.update({message.id: None for message in notifications})
+    if emails:
+        errors.update(zip([message.id for message in emails], asyncio.run(_send_emails(db, emails))))
+
+    sent = failed = 0
+    finished = datetime.utcnow()
+    for message in messages:
+        error = errors.get(message.id, f"Unknown outbox kind: {message.kind}")
+        if error is None:
+            message.status = "sent"
+            message.sent_at = finished
+            sent += 1
+            continue
+        failed += 1
+        message.attempts += 1
+        message.last_error = error
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = "failed"
+            logger.error(f"Outbox message {message.id} ({message.topic}) failed permanently: {error}")
+        else:
+            delay = settings.OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1)
+            message.available_at = finished + timedelta(seconds=delay)
+    db.commit()
+
+    elapsed = time.monotonic() - started
+    rate = len(messages) / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Outbox dispatched {sent}/{len(messages)} messages in {elapsed:.2f}s ({rate:.1f}/s), {failed} failed")
+    return {
+        "claimed": len(messages),
+        "sent": sent,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "per_second": round(rate, 1)
+    }
+
+
+def outbox_stats(db: Session) -> Dict:
+    """Backlog and failure counts for monitoring the dispatcher"""
+    counts = dict(db.query(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status).all())
+    oldest = db.query(func.min(OutboxMessage.created_at)).filter(OutboxMessage.status == "pending").scalar()
+    return {
+        "pending": counts.get("pending", 0),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None
+    }
@@ -5,8 +5,18 @@ from app.models.user import User
 from app.models.payout import Payout, PayoutStatus
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.services.config_service import get_config
+from app.services.outbox import enqueue_email
+from app.core.live_events import stage_event
 from app.utils.activity import log_activity
 
+def _stage_payout_event(db: Session, payout: Payout):
+    stage_event(db, payout.user_id, "payout", {
+        "id": payout.id,
+        "status": payout.status.value,
+        "amount": float(payout.amount),
+        "currency": payout.currency
+    })
+
 def get_minimum_payout(db: Session, currency: str) -> float:
     """Get minimum payout amount from config"""
     if currency == "NGN":
@@ -152,6 +162,11 @@ def create_payout_request(
             user.balance_usdt -= amount
             new_balance = float(user.balance_usdt)
         
+        enqueue_email(db, "payout_request", email=user.email, amount=float(amount))
+        
+        db.flush()
+        _stage_payout_event(db, payout)
+        
         # Commit both operations atomically
         db.commit()
         db.refresh(payout)
@@ -199,6 +214,7 @@ def approve_payout(db: Session, payout_id: int, admin_id: int) -> bool:
         payout.approved_at = datetime.utcnow()
         payout.approved_by = admin_id
         
+        _stage_payout_event(db, payout)
         db.commit()
         logger.info(f"Payout {payout_id} approved by admin {admin_id}")
     except Exception as e:
@@ -244,6 +260,19 @@ def complete_payout(
     )
     db.add(transaction)
     
+    user = db.query(User).filter(User.id == payout.user_id).first()
+    if user:
+        enqueue_email(
+            db, "payout_processed",
+            email=user.email,
+            status="approved",
+            amount=float(payout.amount),
+            method=payout.payout_method,
+            reference=external_transaction_id or f"#{payout.id}",
+            expected_arrival="1-3 business days"
+        )
+    
+    _stage_payout_event(db, payout)
     db.commit()
     
     log_activity(
@@ -295,6 +324,17 @@ def reject_payout(db: Session, payout_id: int, admin_id: int, reason: str) -> bo
             user.balance_usdt += payout.amount
             new_balance = float(user.balance_usdt)
         
+        enqueue_email(
+            db, "payout_processed",
+            email=user.email,
+            status="rejected",
+            amount=float(payout.amount),
+            method=payout.payout_method,
+            reference=f"#{payout.id}",
+            expected_arrival="N/A"
+        )
+        
+        _stage_payout_event(db, payout)
         db.commit()
         logger.info(
             f"Payout {payout_id} rejected by admin {admin_id}. "
@@ -0,0 +1,334 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from dataclasses import dataclass, field
+from datetime import datetime
+from app.models.user import User
+from app.models.rank import Rank
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.config_service import get_config_bool
+from app.services.optimized_bonus_engine import (
+    UNILEVEL_MAX_DEPTH,
+    get_unilevel_percentages,
+    get_rank_bonus_amounts,
+    is_unilevel_active,
+    unilevel_bonus_amount,
+    rank_bonus_amount,
+    infinity_bonus_amount
+)
+from app.services.rank_engine import accumulate_subtrees, first_line_legs, evaluate_ranks
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+RANK_FIELDS = (
+    "name", "level", "team_turnover_required", "first_leg_requirement",
+    "second_leg_requirement", "other_legs_requirement", "infinity_bonus_percentage"
+)
+
+
+@dataclass
+class PlanConfig:
+    """A compensation plan: bonus settings plus rank thresholds"""
+    unilevel_enabled: bool
+    unilevel_percentages: Dict[int, float]
+    rank_bonus_enabled: bool
+    rank_bonus_amounts: Dict[str, float]
+    infinity_enabled: bool
+    ranks: List[Rank]
+
+    @classmethod
+    def from_db(cls, db: Session) -> "PlanConfig":
+        """The plan currently in production"""
+        return cls(
+            unilevel_enabled=get_config_bool(db, "unilevel_enabled"),
+            unilevel_percentages=get_unilevel_percentages(db),
+            rank_bonus_enabled=get_config_bool(db, "rank_bonus_enabled"),
+            rank_bonus_amounts=get_rank_bonus_amounts(db),
+            infinity_enabled=get_config_bool(db, "infinity_enabled"),
+            ranks=[_copy_rank(rank) for rank in db.query(Rank).order_by(Rank.level).all()]
+        )
+
+    def with_changes(self, changes: Dict) -> "PlanConfig":
+        """Candidate plan from a bonus-settings style payload.
+
+        Accepts the same "unilevel", "rank_bonus" and "infinity_bonus"
+        sections as PUT /admin/bonus-settings, plus "ranks": a list of rank
+        dicts merged by name (new names are added).
+        """
+        unilevel = changes.get("unilevel", {})
+        rank_bonus = changes.get("rank_bonus", {})
+        infinity = changes.get("infinity_bonus", {})
+
+        percentages = self.unilevel_percentages
+        if "percentages" in unilevel:
+            percentages = {i + 1: percentage for i, percentage in enumerate(unilevel["percentages"])}
+
+        ranks = {rank.name: rank for rank in self.ranks}
+        for values in changes.get("ranks", []):
+            current = ranks.get(values["name"])
+            merged = {name: getattr(current, name) for name in RANK_FIELDS} if current else {}
+            merged.update({name: values[name] for name in RANK_FIELDS if name in values})
+            ranks[values["name"]] = Rank(**merged)
+
+        return PlanConfig(
+            unilevel_enabled=unilevel.get("enabled", self.unilevel_enabled),
+            unilevel_percentages=percentages,
+            rank_bonus_enabled=rank_bonus.get("enabled", self.rank_bonus_enabled),
+            rank_bonus_amounts=rank_bonus.get("amounts", self.rank_bonus_amounts),
+            infinity_enabled=infinity.get("enabled", self.infinity_enabled),
+            ranks=sorted(ranks.values(), key=lambda rank: rank.level)
+        )
+
+
+def _copy_rank(rank: Rank) -> Rank:
+    # Detached copy, so candidate edits never reach the session
+    return Rank(**{name: getattr(rank, name) for name in RANK_FIELDS})
+
+
+@dataclass
+class TreeSnapshot:
+    """Columnar copy of the tree and one period's purchases.
+
+    Every list is indexed by position (users ordered by id); parents holds
+    the sponsor's position or -1. Purchase volume is kept per currency and
+    only for the positions that bought something.
+    """
+    period: str
+    ids: List[int]
+    parents: List[int]
+    ranks: List[Optional[str]]
+    is_active: List[bool]
+    unilevel_active: List[bool]
+    prior_turnover: List[float]
+    volumes: Dict[str, Dict[int, float]]
+    purchase_count: int
+
+
+def load_snapshot(db: Session, month: int, year: int) -> TreeSnapshot:
+    """Read users, sponsor links and a month's completed purchases.
+
+    Purchases are summed per buyer in SQL. Unilevel activity is judged at
+    the end of the period and ranks start from today's ranks, as history
+    for either isn't kept.
+    """
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    as_of = min(end_date, datetime.utcnow())
+
+    rows = db.query(
+        User.id, User.sponsor_id, User.current_rank, User.is_active, User.last_activity_date
+    ).order_by(User.id).all()
+    ids = [row[0] for row in rows]
+    position = {user_id: i for i, user_id in enumerate(ids)}
+
+    prior_turnover = [0.0] * len(ids)
+    for user_id, amount in db.query(Transaction.user_id, func.sum(Transaction.amount)).filter(
+        Transaction.transaction_type == TransactionType.purchase,
+        Transaction.status == TransactionStatus.completed,
+        Transaction.created_at < start_date
+    ).group_by(Transaction.user_id).all():
+        if user_id in position:
+            prior_turnover[position[user_id]] = float(amount or 0)
+
+    volumes: Dict[str, Dict[int, float]] = {}
+    purchase_count = 0
+    for user_id, currency, amount, count in db.query(
+        Transaction.user_id, Transaction.currency, func.sum(Transaction.amount), func.count(Transaction.id)
+    ).filter(
+        Transaction.transaction_type == TransactionType.purchase,
+        Transaction.status == TransactionStatus.completed,
+        Transaction.created_at >= start_date,
+        Transaction.created_at < end_date
+    ).group_by(Transaction.user_id, Transaction.currency).all():
+        if user_id in position:
+            volumes.setdefault(currency, {})[position[user_id]] = float(amount or 0)
+            purchase_count += count
+
+    return TreeSnapshot(
+        period=f"{year:04d}-{month:02d}",
+        ids=ids,
+        parents=[position.get(sponsor_id, -1) if sponsor_id is not None else -1 for _, sponsor_id, _, _, _ in rows],
+        ranks=[row[2] for row in rows],
+        is_active=[bool(row[3]) for row in rows],
+        unilevel_active=[is_unilevel_active(row[4], as_of) for row in rows],
+        prior_turnover=prior_turnover,
+        volumes=volumes,
+        purchase_count=purchase_count
+    )
+
+
+@dataclass
+class SimulationResult:
+    period: str
+    purchase_count: int
+    purchase_volume: Dict[str, float]
+    payouts: Dict[str, Dict[str, float]]
+    promotions: int
+    rank_distribution: Dict[str, Dict]
+    total_payout: Dict[str, float] = field(init=False)
+    payout_ratio: Dict[str, float] = field(init=False)
+
+    def __post_init__(self):
+        self.total_payout = {}
+        for amounts in self.payouts.values():
+            for currency, amount in amounts.items():
+                self.total_payout[currency] = round(self.total_payout.get(currency, 0.0) + amount, 2)
+        self.payout_ratio = {
+            currency: round(amount / self.purchase_volume[currency], 4) if self.purchase_volume.get(currency) else 0.0
+            for currency, amount in self.total_payout.items()
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "period": self.period,
+            "purchase_count": self.purchase_count,
+            "purchase_volume": self.purchase_volume,
+            "payouts": self.payouts,
+            "total_payout": self.total_payout,
+            "payout_ratio": self.payout_ratio,
+            "promotions": self.promotions,
+            "rank_distribution": self.rank_distribution
+        }
+
+
+def _replay_unilevel(snapshot: TreeSnapshot, config: PlanConfig) -> Dict[str, Dict[int, float]]:
+    """Unilevel payout per currency and recipient position.
+
+    Bonuses are linear in the purchase amount, so instead of walking each
+    purchase's upline the per-buyer volumes are lifted one level per pass:
+    after pass n every position holds the volume bought exactly n levels
+    below it.
+    """
+    payouts: Dict[str, Dict[int, float]] = {}
+    if not config.unilevel_enabled:
+        return payouts
+    parents, active = snapshot.parents, snapshot.unilevel_active
+    for currency, volume in snapshot.volumes.items():
+        paid = payouts.setdefault(currency, {})
+        carried = volume
+        for level in range(1, UNILEVEL_MAX_DEPTH + 1):
+            lifted: Dict[int, float] = {}
+            for i, amount in carried.items():
+                parent = parents[i]
+                if parent >= 0:
+                    lifted[parent] = lifted.get(parent, 0.0) + amount
+            if not lifted:
+                break
+            if config.unilevel_percentages.get(level, 0):
+                for i, amount in lifted.items():
+                    if active[i]:
+                        paid[i] = paid.get(i, 0.0) + unilevel_bonus_amount(amount, level, config.unilevel_percentages)
+            carried = lifted
+    return payouts
+
+
+def simulate(snapshot: TreeSnapshot, config: PlanConfig) -> SimulationResult:
+    """Replay the unilevel, rank and infinity bonuses of a snapshot under a plan"""
+    ids = snapshot.ids
+    rank_levels = {rank.name: rank.level for rank in config.ranks}
+    rank_names = list(snapshot.ranks)
+    purchase_volume = {
+        currency: round(sum(volume.values()), 2) for currency, volume in snapshot.volumes.items()
+    }
+    company_volume = sum(sum(volume.values()) for volume in snapshot.volumes.values())
+
+    earned = {"unilevel": _replay_unilevel(snapshot, config), "rank_bonus": {}, "infinity": {}}
+
+    # Rank advancement on the turnover at the end of the period
+    personal = list(snapshot.prior_turnover)
+    for volume in snapshot.volumes.values():
+        for i, amount in volume.items():
+            personal[i] += amount
+    legs = first_line_legs(ids, snapshot.parents, accumulate_subtrees(snapshot.parents, personal))
+    current_levels = {
+        ids[i]: rank_levels[name]
+        for i, name in enumerate(rank_names)
+        if snapshot.is_active[i] and name in rank_levels
+    }
+    promoted = evaluate_ranks(config.ranks, current_levels, legs)
+    position = {user_id: i for i, user_id in enumerate(ids)}
+    rank_paid = earned["rank_bonus"].setdefault("NGN", {})
+    for user_id, rank in promoted.items():
+        i = position[user_id]
+        rank_names[i] = rank.name
+        if config.rank_bonus_enabled:
+            amount = float(rank_bonus_amount(config.rank_bonus_amounts, rank.name))
+            if amount > 0:
+                rank_paid[i] = amount
+
+    # Infinity bonus on the period's company volume
+    infinity_paid = earned["infinity"].setdefault("NGN", {})
+    if config.infinity_enabled and company_volume > 0:
+        percentages = {
+            rank.name: float(rank.infinity_bonus_percentage)
+            for rank in config.ranks if rank.infinity_bonus_percentage and rank.infinity_bonus_percentage > 0
+        }
+        for i, name in enumerate(rank_names):
+            if snapshot.is_active[i] and name in percentages:
+                infinity_paid[i] = round(infinity_bonus_amount(company_volume, percentages[name]), 2)
+
+    rank_distribution: Dict[str, Dict] = {}
+    for name in rank_names:
+        bucket = rank_distribution.setdefault(name or "Unranked", {"users": 0, "earners": 0, "payout": {}})
+        bucket["users"] += 1
+    earners = set()
+    for by_currency in earned.values():
+        for currency, paid in by_currency.items():
+            for i, amount in paid.items():
+                bucket = rank_distribution[rank_names[i] or "Unranked"]
+                bucket["payout"][currency] = round(bucket["payout"].get(currency, 0.0) + amount, 2)
+                if i not in earners:
+                    earners.add(i)
+                    bucket["earners"] += 1
+
+    return SimulationResult(
+        period=snapshot.period,
+        purchase_count=snapshot.purchase_count,
+        purchase_volume=purchase_volume,
+        payouts={
+            bonus_type: {currency: round(sum(paid.values()), 2) for currency, paid in by_currency.items() if paid}
+            for bonus_type, by_currency in earned.items()
+        },
+        promotions=len(promoted),
+        rank_distribution=rank_distribution
+    )
+
+
+def simulate_plan(db: Session, month: int, year: int, changes: Optional[Dict] = None) -> Dict:
+    """Compare the current plan with a candidate over one month of purchases"""
+    started = time.monotonic()
+    snapshot = load_snapshot(db, month, year)
+    loaded = time.monotonic()
+    current = PlanConfig.from_db(db)
+    baseline = simulate(snapshot, current)
+    candidate = simulate(snapshot, current.with_changes(changes or {}))
+    logger.info(
+        f"Simulated {snapshot.purchase_count} purchases over {len(snapshot.ids)} users "
+        f"(load {loaded - started:.1f}s, replay {time.monotonic() - loaded:.1f}s)"
+    )
+    return {"current": baseline.to_dict(), "candidate": candidate.to_dict()}
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Replay a month of purchases under a candidate compensation plan")
+    parser.add_argument("year", type=int)
+    parser.add_argument("month", type=int)
+    parser.add_argument("candidate", nargs="?", help="JSON file with bonus-settings changes and/or ranks")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    changes = {}
+    if args.candidate:
+        with open(args.candidate) as candidate_file:
+            changes = json.load(candidate_file)
+    db = SessionLocal()
+    try:
+        print(json.dumps(simulate_plan(db, args.month, args.year, changes), indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,176 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, update
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.models.activity import ActivityLog
+from app.models.purchase_completion import PurchaseCompletion
+from app.models.transaction import Transaction
+from app.services.activity_service import update_user_activity
+from app.services.bonus_worker import enqueue_completed_purchase
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from app.services.rank_service import calculate_user_rank
+from app.services.team_service import update_team_turnover
+from app.services.turnover_ledger import record_turnover_delta
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+STEPS = ("turnover", "activity", "rank", "bonuses", "log")
+
+
+def start_purchase_completion(db: Session, transaction: Transaction) -> PurchaseCompletion:
+    """Record the follow-up work for a purchase being completed.
+
+    Added to the caller's transaction, so the job exists exactly when the
+    purchase is committed as completed. Nothing is committed here.
+    """
+    completion = PurchaseCompletion(transaction_id=transaction.id, status="pending", completed_steps=[])
+    db.add(completion)
+    return completion
+
+
+def dispatch_purchase_completion(transaction_id: int) -> bool:
+    """Hand a committed completion to the background workers.
+
+    Returns False if the task could not be queued; the recovery sweep picks
+    the job up from its row in that case.
+    """
+    try:
+        from app.tasks.bonus_tasks import run_purchase_completion
+        run_purchase_completion.apply_async(args=[transaction_id], retry=False)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not queue completion of purchase {transaction_id}: {e}")
+        return False
+
+
+def _claim(db: Session, transaction_id: int, now: datetime) -> bool:
+    """Mark a due job as running; False if another worker holds it or it is finished"""
+    stale = now - timedelta(seconds=settings.PURCHASE_SAGA_STALE_AFTER)
+    result = db.execute(
+        update(PurchaseCompletion)
+        .where(
+            PurchaseCompletion.transaction_id == transaction_id,
+            or_(
+                (PurchaseCompletion.status == "pending") & (PurchaseCompletion.next_attempt_at <= now),
+                (PurchaseCompletion.status == "running") & (PurchaseCompletion.updated_at < stale)
+            )
+        )
+        .values(status="running", updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _run_step(db: Session, step: str, transaction: Transaction):
+    # Each step is safe to repeat: turnover and the activity log commit
+    # together with their checkpoint, activity and rank are recomputed from
+    # current state, and bonuses are guarded by the processed-purchase
+    # markers.
+    if step == "turnover":
+        # With write-behind the upline rows are updated later in batches by
+        # the turnover aggregator
+        if settings.TURNOVER_WRITE_BEHIND:
+            record_turnover_delta(db, transaction.user_id, float(transaction.amount), transaction.id)
+        else:
+            update_team_turnover(db, transaction.user_id, float(transaction.amount))
+    elif step == "activity":
+        update_user_activity(db, transaction.user_id)
+    elif step == "rank":
+        calculate_user_rank(db, transaction.user_id)
+    elif step == "bonuses":
+        # With the bonus worker they are paid in micro-batches
+        if not (settings.BONUS_WORKER_ENABLED and enqueue_completed_purchase(transaction.id)):
+            OptimizedBonusEngine.calculate_unilevel_bonuses_batch(db, [transaction.id])
+    elif step == "log":
+        db.add(ActivityLog(
+            user_id=transaction.user_id,
+            action="purchase_completed",
+            entity_type="transaction",
+            entity_id=transaction.id,
+            details={"amount": float(transaction.amount), "currency": transaction.currency}
+        ))
+
+
+def run_purchase_completion(db: Session, transaction_id: int) -> Optional[PurchaseCompletion]:
+    """Run the remaining steps of a purchase completion, checkpointing each one.
+
+    A failing step is retried later with exponential backoff, resuming at
+    that step, until PURCHASE_SAGA_MAX_ATTEMPTS is reached and the job is
+    marked failed. Returns the job, or None if it is not due or another
+    worker is running it.
+    """
+    if not _claim(db, transaction_id, datetime.utcnow()):
+        return None
+
+    completion = db.get(PurchaseCompletion, transaction_id)
+    transaction = db.get(Transaction, transaction_id)
+    step = None
+    try:
+        for step in STEPS:
+            if step in completion.completed_steps:
+                continue
+            # Staged first so steps that commit on their own carry their
+            # checkpoint with them
+            completion.completed_steps = list(completion.completed_steps) + [step]
+            _run_step(db, step, transaction)
+            db.commit()
+
+        completion.status = "completed"
+        completion.last_error = None
+        completion.completed_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        completion = db.get(PurchaseCompletion, transaction_id)
+        completion.attempts += 1
+        completion.last_error = f"{step}: {e}"
+        if completion.attempts >= settings.PURCHASE_SAGA_MAX_ATTEMPTS:
+            completion.status = "failed"
+            logger.error(f"Completion of purchase {transaction_id} failed at {step}, giving up: {e}")
+        else:
+            completion.status = "pending"
+            delay = settings.PURCHASE_SAGA_RETRY_DELAY * 2 ** (completion.attempts - 1)
+            completion.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(f"Completion of purchase {transaction_id} failed at {step}, retrying in {delay:.0f}s: {e}")
+        db.commit()
+    return completion
+
+
+def find_due_completions(db: Session, limit: int = 500) -> List[int]:
+    """Jobs whose retry is due, that were never dispatched, or whose worker died"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.PURCHASE_SAGA_STALE_AFTER)
+    rows = db.query(PurchaseCompletion.transaction_id).filter(
+        or_(
+            (PurchaseCompletion.status == "pending") & (PurchaseCompletion.next_attempt_at <= now),
+            (PurchaseCompletion.status == "running") & (PurchaseCompletion.updated_at < stale)
+        )
+    ).order_by(PurchaseCompletion.transaction_id).limit(limit).all()
+    return [row[0] for row in rows]
+
+
+def get_completion_status(db: Session, transaction: Transaction) -> Dict:
+    """Progress of a purchase's completion, for polling clients"""
+    completion = db.get(PurchaseCompletion, transaction.id)
+    if completion is None:
+        # Completed before the pipeline existed, or not completed yet
+        status = "completed" if transaction.completed_at else "not_started"
+        return {
+            "transaction_id": transaction.id,
+            "transaction_status": transaction.status.value,
+            "status": status,
+            "steps": {step: status == "completed" for step in STEPS},
+            "attempts": 0,
+            "last_error": None
+        }
+    return {
+        "transaction_id": transaction.id,
+        "transaction_status": transaction.status.value,
+        "status": completion.status,
+        "steps": {step: step in completion.completed_steps for step in STEPS},
+        "attempts": completion.attempts,
+        "last_error": completion.last_error
+    }
@@ -0,0 +1,206 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from app.models.user import User
+from app.models.rank import Rank
+from app.models.team import TeamMember
+from app.models.activity import ActivityLog
+from app.core.principal import mark_principals_stale
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+WRITE_CHUNK_SIZE = 5000
+
+
+def load_subtree_turnovers(db: Session) -> Tuple[List[int], List[int], List[float]]:
+    """Columnar snapshot of the sponsor tree.
+
+    Returns parallel lists (user ids, parent positions, subtree turnover),
+    where parent position is -1 for roots and subtree turnover is the
+    personal turnover of the user and everyone below them, i.e. the leg
+    turnover the user contributes to their sponsor.
+    """
+    rows = db.query(User.id, User.sponsor_id).order_by(User.id).all()
+    ids = [row[0] for row in rows]
+    position = {user_id: i for i, user_id in enumerate(ids)}
+    parents = [position.get(sponsor_id, -1) if sponsor_id is not None else -1 for _, sponsor_id in rows]
+
+    personal = [0.0] * len(ids)
+    personal_rows = db.query(TeamMember.user_id, TeamMember.personal_turnover).filter(
+        TeamMember.depth == 0
+    ).all()
+    for user_id, turnover in personal_rows:
+        i = position.get(user_id)
+        if i is not None:
+            personal[i] = float(turnover or 0)
+
+    return ids, parents, accumulate_subtrees(parents, personal)
+
+
+def accumulate_subtrees(parents: List[int], personal: List[float]) -> List[float]:
+    """Sum each user's personal turnover with everyone below them"""
+    subtree = list(personal)
+    # Children before parents: accumulate each subtree into its sponsor
+    for i in reversed(_top_down_order(parents)):
+        if parents[i] >= 0:
+            subtree[parents[i]] += subtree[i]
+    return subtree
+
+
+def first_line_legs(ids: List[int], parents: List[int], subtree: List[float]) -> Dict[int, List[float]]:
+    """Turnover of each first-line leg, keyed by the sponsor's user id"""
+    legs: Dict[int, List[float]] = {}
+    for i, parent in enumerate(parents):
+        if parent >= 0:
+            legs.setdefault(ids[parent], []).append(subtree[i])
+    return legs
+
+
+def _top_down_order(parents: List[int]) -> List[int]:
+    children = [[] for _ in parents]
+    roots = []
+    for i, parent in enumerate(parents):
+        if parent >= 0:
+            children[parent].append(i)
+        else:
+            roots.append(i)
+
+    order = roots
+    for i in order:  # grows while iterating - breadth-first
+        order.extend(children[i])
+    if len(order) != len(parents):
+        raise ValueError("Sponsor tree contains a cycle")
+    return order
+
+
+def evaluate_ranks(
+    ranks: List[Rank],
+    current_levels: Dict[int, int],
+    legs: Dict[int, List[float]]
+) -> Dict[int, Rank]:
+    """Highest rank above the current one each user qualifies for.
+
+    legs maps user id to the turnover of each first-line leg; users that
+    don't qualify for anything new are left out of the result.
+    """
+    thresholds = sorted(
+        (
+            (
+                rank.level,
+                float(rank.team_turnover_required or 0),
+                float(rank.first_leg_requirement or 0),
+                float(rank.second_leg_requirement or 0),
+                float(rank.other_legs_requirement or 0),
+                rank
+            )
+            for rank in ranks
+        ),
+        key=lambda threshold: threshold[0],
+        reverse=True
+    )
+
+    qualified = {}
+    for user_id, level in current_levels.items():
+        user_legs = legs.get(user_id)
+        if not user_legs:
+            continue
+        user_legs = sorted(user_legs, reverse=True)
+        total = sum(user_legs)
+        first = user_legs[0]
+        second = user_legs[1] if len(user_legs) > 1 else 0.0
+        other = total - first - second
+
+        for rank_level, total_req, first_req, second_req, other_req, rank in thresholds:
+            if rank_level <= level:
+                break
+            if total >= total_req and first >= first_req and second >= second_req and other >= other_req:
+                qualified[user_id] = rank
+                break
+
+    return qualified
+
+
+def recalculate_ranks(db: Session, award_bonuses: bool = True) -> Dict:
+    """Recalculate every active user's rank in one pass and commit.
+
+    Leg turnovers for the whole tree come from two set-based reads, each
+    rank's thresholds are checked against all users in memory, and only
+    the users whose rank goes up are written back, together with their
+    rank bonuses, in a single commit (see promote_users).
+    """
+    ranks = db.query(Rank).order_by(Rank.level).all()
+    rank_levels = {rank.name: rank.level for rank in ranks}
+
+    ids, parents, subtree = load_subtree_turnovers(db)
+    legs = first_line_legs(ids, parents, subtree)
+
+    users = db.query(User.id, User.current_rank, User.highest_rank_achieved).filter(
+        User.is_active == True
+    ).all()
+    current_levels = {
+        user_id: rank_levels[current_rank]
+        for user_id, current_rank, _ in users
+        if current_rank in rank_levels
+    }
+    qualified = evaluate_ranks(ranks, current_levels, legs)
+
+    promotions = [
+        (user_id, current_rank, highest_rank, qualified[user_id])
+        for user_id, current_rank, highest_rank in users
+        if user_id in qualified
+    ]
+    changes = promote_users(db, promotions, rank_levels, award_bonuses)
+    db.commit()
+    logger.info(f"Rank recalculation checked {len(users)} users, {len(changes)} advanced")
+
+    return {
+        "users_checked": len(users),
+        "ranks_updated": len(changes),
+        "changes": changes
+    }
+
+
+def promote_users(
+    db: Session,
+    promotions: List[Tuple[int, Optional[str], Optional[str], Rank]],
+    rank_levels: Dict[str, int],
+    award_bonuses: bool = True
+) -> List[Tuple[int, str, str]]:
+    """Write rank promotions and pay their rank bonuses; nothing is committed.
+
+    promotions are (user_id, current rank, highest rank achieved, new rank).
+    Every promotion path goes through here, so the rank change, its
+    activity log and its bonus commit (or roll back) together. Returns the
+    (user_id, old rank, new rank) changes.
+    """
+    now = datetime.utcnow()
+    changes: List[Tuple[int, str, str]] = []
+    updates, activities = [], []
+    for user_id, current_rank, highest_rank, rank in promotions:
+        if not highest_rank or rank.level > rank_levels.get(highest_rank, -1):
+            highest_rank = rank.name
+        updates.append({
+            "id": user_id,
+            "current_rank": rank.name,
+            "rank_achieved_date": now,
+            "highest_rank_achieved": highest_rank
+        })
+        activities.append({
+            "user_id": user_id,
+            "action": "rank_advancement",
+            "entity_type": "rank",
+            "details": {"from": current_rank, "to": rank.name},
+            "created_at": now
+        })
+        changes.append((user_id, current_rank, rank.name))
+
+    for start in range(0, len(updates), WRITE_CHUNK_SIZE):
+        db.bulk_update_mappings(User, updates[start:start + WRITE_CHUNK_SIZE])
+        db.bulk_insert_mappings(ActivityLog, activities[start:start + WRITE_CHUNK_SIZE])
+    mark_principals_stale(db, [user_id for user_id, _, _ in changes])
+
+    if changes and award_bonuses:
+        from app.services.optimized_bonus_engine import OptimizedBonusEngine
+        OptimizedBonusEngine.calculate_rank_bonuses_batch(db, changes, commit=False)
+    return changes
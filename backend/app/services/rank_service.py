@@ -1,11 +1,12 @@
 from sqlalchemy.orm import Session
-from datetime import datetime
 from app.models.user import User
 from app.models.rank import Rank
 from app.models.bonus import Bonus, BonusType, BonusStatus
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
-from app.services.team_service import calculate_leg_breakdown, get_team_size
-from app.utils.activity import log_activity
+from app.services.team_service import get_leg_breakdown, get_team_size
+from app.services.optimized_team_service import LegBreakdown
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 import asyncio
 
 def get_rank_by_name(db: Session, rank_name: str) -> Rank:
@@ -20,12 +21,83 @@ def get_all_ranks(db: Session):
     """Get all ranks ordered by level"""
     return db.query(Rank).order_by(Rank.level).all()
 
+@dataclass
+class RequirementProgress:
+    required: float
+    actual: float
+
+    @property
+    def met(self) -> bool:
+        return self.actual >= self.required
+
+    @property
+    def progress(self) -> float:
+        if self.required <= 0:
+            return 100.0
+        return min(100.0, self.actual / self.required * 100)
+
+@dataclass
+class RankEvaluation:
+    """A user's leg profile checked against every rank.
+
+    Built once per request from the shared leg breakdown; answers both
+    "which rank does the user qualify for" and "how far from the next one".
+    """
+    user_id: int
+    current_rank: Optional[Rank]
+    ranks: List[Rank]
+    breakdown: LegBreakdown
+
+    def requirements(self, rank: Rank) -> Dict[str, RequirementProgress]:
+        breakdown = self.breakdown
+        return {
+            "team_turnover": RequirementProgress(float(rank.team_turnover_required or 0), breakdown.total_turnover),
+            "first_leg": RequirementProgress(float(rank.first_leg_requirement or 0), breakdown.first_leg_turnover),
+            "second_leg": RequirementProgress(float(rank.second_leg_requirement or 0), breakdown.second_leg_turnover),
+            "other_legs": RequirementProgress(float(rank.other_legs_requirement or 0), breakdown.other_legs_turnover)
+        }
+
+    def qualifies(self, rank: Rank) -> bool:
+        if not self.breakdown.first_leg:
+            return False
+        return all(requirement.met for requirement in self.requirements(rank).values())
+
+    @property
+    def higher_ranks(self) -> List[Rank]:
+        if not self.current_rank:
+            return []
+        return [rank for rank in self.ranks if rank.level > self.current_rank.level]
+
+    @property
+    def next_rank(self) -> Optional[Rank]:
+        higher = self.higher_ranks
+        return higher[0] if higher else None
+
+    @property
+    def highest_qualified_rank(self) -> Optional[Rank]:
+        """Highest rank above the current one that the user qualifies for"""
+        for rank in reversed(self.higher_ranks):
+            if self.qualifies(rank):
+                return rank
+        return None
+
+def evaluate_rank_qualification(db: Session, user_id: int, current_rank_name: Optional[str] = None) -> RankEvaluation:
+    """Compute the user's leg profile once and check it against all ranks"""
+    if current_rank_name is None:
+        current_rank_name = db.query(User.current_rank).filter(User.id == user_id).scalar()
+    ranks = get_all_ranks(db)
+    current_rank = next((rank for rank in ranks if rank.name == current_rank_name), None)
+    return RankEvaluation(
+        user_id=user_id,
+        current_rank=current_rank,
+        ranks=ranks,
+        breakdown=get_leg_breakdown(db, user_id)
+    )
+
 def check_rank_qualification(db: Session, user_id: int, rank: Rank) -> dict:
     """Check if user qualifies for a specific rank"""
-    # Get leg breakdown
-    breakdown = calculate_leg_breakdown(db, user_id)
-    
-    if not breakdown["first_leg"]:
+    breakdown = get_leg_breakdown(db, user_id)
+    if not breakdown.first_leg:
         return {
             "qualified": False,
             "total_turnover": 0,
@@ -34,114 +106,103 @@ def check_rank_qualification(db: Session, user_id: int, rank: Rank) -> dict:
             "other_legs": 0
         }
     
-    # Calculate totals
-    total_turnover = sum(leg["turnover"] for leg in breakdown["all_legs"])
-    first_leg_turnover = breakdown["first_leg"]["turnover"]
-    second_leg_turnover = breakdown["second_leg"]["turnover"] if breakdown["second_leg"] else 0
-    other_legs_turnover = breakdown["other_legs"]["turnover"]
-    
-    # Check requirements
-    total_met = total_turnover >= float(rank.team_turnover_required)
-    first_leg_met = first_leg_turnover >= float(getattr(rank, 'first_leg_requirement', 0) or 0)
-    second_leg_met = second_leg_turnover >= float(getattr(rank, 'second_leg_requirement', 0) or 0)
-    other_legs_met = other_legs_turnover >= float(getattr(rank, 'other_legs_requirement', 0) or 0)
-    
-    qualified = total_met and first_leg_met and second_leg_met and other_legs_met
-    
+    evaluation = RankEvaluation(user_id=user_id, current_rank=None, ranks=[rank], breakdown=breakdown)
     return {
-        "qualified": qualified,
-        "total_turnover": total_turnover,
-        "first_leg": first_leg_turnover,
-        "second_leg": second_leg_turnover,
-        "other_legs": other_legs_turnover
+        "qualified": evaluation.qualifies(rank),
+        "total_turnover": breakdown.total_turnover,
+        "first_leg": breakdown.first_leg_turnover,
+        "second_leg": breakdown.second_leg_turnover,
+        "other_legs": breakdown.other_legs_turnover
     }
 
-def calculate_rank_advancement(db: Session, user_id: int) -> str:
-    """Calculate and apply rank advancement for user - awards highest qualified rank"""
+def calculate_rank_advancement(
+    db: Session,
+    user_id: int,
+    evaluation: Optional[RankEvaluation] = None,
+    commit: bool = True
+) -> str:
+    """Calculate and apply rank advancement for user - awards highest qualified rank.
+
+    The promotion and its rank bonus are written together (see
+    rank_engine.promote_users); with commit=False they join the caller's
+    transaction.
+    """
     import logging
+    from app.services.rank_engine import promote_users
     logger = logging.getLogger(__name__)
     
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         return None
     
-    current_rank = get_rank_by_name(db, user.current_rank)
-    if not current_rank:
+    if evaluation is None:
+        evaluation = evaluate_rank_qualification(db, user_id, user.current_rank)
+    if not evaluation.current_rank:
         return user.current_rank
     
-    # Get all ranks higher than current
-    higher_ranks = db.query(Rank).filter(
-        Rank.level > current_rank.level
-    ).order_by(Rank.level).all()
-    
-    # Check ALL ranks and find highest qualified
-    highest_qualified_rank = None
-    for rank in higher_ranks:
-        qualification = check_rank_qualification(db, user_id, rank)
-        if qualification["qualified"]:
-            highest_qualified_rank = rank
-            # Continue checking higher ranks
-        # Don't break - check all ranks
-    
     # Award highest qualified rank
+    highest_qualified_rank = evaluation.highest_qualified_rank
     if highest_qualified_rank:
-        user.current_rank = highest_qualified_rank.name
-        user.rank_achieved_date = datetime.utcnow()
-        
-        # Update highest rank achieved
-        if not user.highest_rank_achieved:
-            user.highest_rank_achieved = highest_qualified_rank.name
-        else:
-            highest_ever = get_rank_by_name(db, user.highest_rank_achieved)
-            if highest_ever and highest_qualified_rank.level > highest_ever.level:
-                user.highest_rank_achieved = highest_qualified_rank.name
-        
-        db.commit()
-        
-        # Log activity
-        log_activity(db, user_id, "rank_advancement", f"Advanced to {highest_qualified_rank.name}")
+        promote_users(
+            db,
+            [(user_id, user.current_rank, user.highest_rank_achieved, highest_qualified_rank)],
+            {rank.name: rank.level for rank in evaluation.ranks}
+        )
+        # Written in bulk; reload the columns on next access
+        db.expire(user, ["current_rank", "rank_achieved_date", "highest_rank_achieved"])
+        if commit:
+            db.commit()
         logger.info(f"User {user_id} advanced to {highest_qualified_rank.name}")
         
         return highest_qualified_rank.name
     
     return user.current_rank
 
-def calculate_user_rank(db: Session, user_id: int) -> str:
+def calculate_user_rank(db: Session, user_id: int, evaluation: Optional[RankEvaluation] = None, commit: bool = True) -> str:
     """Calculate user rank (alias for calculate_rank_advancement)"""
-    return calculate_rank_advancement(db, user_id)
+    return calculate_rank_advancement(db, user_id, evaluation, commit)
 
-def get_rank_progress(db: Session, user_id: int) -> dict:
+def get_rank_progress(db: Session, user_id: int, evaluation: Optional[RankEvaluation] = None) -> dict:
     """Get user's rank progress information"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return {}
+    if evaluation is None:
+        current_rank_name = db.query(User.current_rank).filter(User.id == user_id).scalar()
+        if current_rank_name is None:
+            return {}
+        evaluation = evaluate_rank_qualification(db, user_id, current_rank_name)
     
-    current_rank = get_rank_by_name(db, user.current_rank)
+    current_rank = evaluation.current_rank
     if not current_rank:
         return {}
     
-    # Get next rank
-    next_rank = db.query(Rank).filter(
-        Rank.level > current_rank.level
-    ).order_by(Rank.level).first()
-    
-    # Get current leg breakdown
-    breakdown = calculate_leg_breakdown(db, user_id)
+    next_rank = evaluation.next_rank
+    breakdown = evaluation.breakdown
     
     progress = {
         "current_rank": current_rank.name,
         "current_level": current_rank.level,
         "next_rank": next_rank.name if next_rank else None,
         "next_level": next_rank.level if next_rank else None,
-        "total_turnover": sum(leg["turnover"] for leg in breakdown["all_legs"]) if breakdown["all_legs"] else 0,
+        "total_turnover": breakdown.total_turnover,
         "required_turnover": float(next_rank.team_turnover_required) if next_rank else 0,
-        "first_leg_turnover": breakdown["first_leg"]["turnover"] if breakdown["first_leg"] else 0,
-        "second_leg_turnover": breakdown["second_leg"]["turnover"] if breakdown["second_leg"] else 0,
-        "other_legs_turnover": breakdown["other_legs"]["turnover"] if breakdown["other_legs"] else 0,
-        "progress_percentage": 0
+        "first_leg_turnover": breakdown.first_leg_turnover,
+        "second_leg_turnover": breakdown.second_leg_turnover,
+        "other_legs_turnover": breakdown.other_legs_turnover,
+        "progress_percentage": 0,
+        "first_leg_progress": 0,
+        "second_leg_progress": 0,
+        "other_legs_progress": 0,
+        "overall_progress": 0,
+        "requirements_met": {}
     }
     
-    if next_rank and progress["required_turnover"] > 0:
-        progress["progress_percentage"] = min(100, (progress["total_turnover"] / progress["required_turnover"]) * 100)
+    if next_rank:
+        requirements = evaluation.requirements(next_rank)
+        if progress["required_turnover"] > 0:
+            progress["progress_percentage"] = requirements["team_turnover"].progress
+        progress["first_leg_progress"] = requirements["first_leg"].progress
+        progress["second_leg_progress"] = requirements["second_leg"].progress
+        progress["other_legs_progress"] = requirements["other_legs"].progress
+        progress["overall_progress"] = sum(r.progress for r in requirements.values()) / len(requirements)
+        progress["requirements_met"] = {name: r.met for name, r in requirements.items()}
     
     return progress
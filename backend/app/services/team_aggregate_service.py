@@ -0,0 +1,329 @@
+from sqlalchemy import Numeric, bindparam, event, func, inspect, select, text, case
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.models.team import TeamMember
+from app.models.team_aggregate import TeamAggregate
+from app.models.team_aggregate_delta import TeamAggregateDelta
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 5000
+
+_ANCESTORS_OF = "SELECT ancestor_id FROM team_members WHERE user_id = :user_id AND depth > 0"
+
+
+def _counts_as_active(is_active, activity_status) -> bool:
+    return bool(is_active) and activity_status == "active"
+
+
+def get_team_aggregate(db: Session, user_id: int) -> Optional[TeamAggregate]:
+    """Precomputed team statistics for user_id, or None if not built yet"""
+    return db.get(TeamAggregate, user_id)
+
+
+def add_member_to_aggregates(db: Session, user_id: int) -> None:
+    """Queue a newly registered member to be counted in every upline aggregate.
+
+    Creates the member's own (empty) aggregate row and appends a delta that
+    apply_pending_member_deltas folds into the upline in batches, so
+    registrations under the same upline never wait on each other's row
+    locks. Expects the member's closure rows to exist already; nothing is
+    committed.
+    """
+    user = db.query(User.is_active, User.activity_status).filter(User.id == user_id).first()
+    active = 1 if user and _counts_as_active(user.is_active, user.activity_status) else 0
+
+    if db.get(TeamAggregate, user_id) is None:
+        db.add(TeamAggregate(
+            user_id=user_id, team_size=0, first_line_count=0, active_count=0,
+            team_turnover=0, max_depth=0, level_counts={}
+        ))
+    db.add(TeamAggregateDelta(user_id=user_id, active=active))
+
+
+def _pending_members():
+    return select(TeamAggregateDelta.user_id).where(TeamAggregateDelta.applied_at.is_(None))
+
+
+def apply_pending_member_deltas(db: Session, batch_size: int = 5000) -> int:
+    """Count one batch of pending registrations into the upline and commit.
+
+    Deltas are claimed with SKIP LOCKED, coalesced per ancestor through the
+    closure table, and each ancestor row is locked and written once per
+    batch. Returns the number of deltas applied.
+    """
+    deltas = db.query(
+        TeamAggregateDelta.id, TeamAggregateDelta.user_id, TeamAggregateDelta.active
+    ).filter(
+        TeamAggregateDelta.applied_at.is_(None)
+    ).order_by(
+        TeamAggregateDelta.id
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not deltas:
+        return 0
+
+    active = {delta.user_id: delta.active for delta in deltas}
+    changes: Dict[int, Dict] = defaultdict(lambda: {"size": 0, "active": 0, "levels": defaultdict(int)})
+    for user_id, ancestor_id, depth in db.query(
+        TeamMember.user_id, TeamMember.ancestor_id, TeamMember.depth
+    ).filter(
+        TeamMember.user_id.in_(active.keys()),
+        TeamMember.depth > 0
+    ).all():
+        change = changes[ancestor_id]
+        change["size"] += 1
+        change["active"] += active[user_id]
+        change["levels"][depth] += 1
+
+    # Lock in id order so concurrent aggregators and rebuilds can't deadlock
+    aggregates = db.query(TeamAggregate).filter(
+        TeamAggregate.user_id.in_(changes.keys())
+    ).order_by(TeamAggregate.user_id).with_for_update().all() if changes else []
+
+    for aggregate in aggregates:
+        change = changes[aggregate.user_id]
+        level_counts = dict(aggregate.level_counts or {})
+        for depth, count in change["levels"].items():
+            level_counts[str(depth)] = level_counts.get(str(depth), 0) + count
+        aggregate.level_counts = level_counts
+        aggregate.team_size += change["size"]
+        aggregate.active_count += change["active"]
+        aggregate.first_line_count += change["levels"].get(1, 0)
+        aggregate.max_depth = max(aggregate.max_depth or 0, max(change["levels"]))
+
+    now = datetime.utcnow()
+    db.query(TeamAggregateDelta).filter(
+        TeamAggregateDelta.id.in_([delta.id for delta in deltas])
+    ).update({TeamAggregateDelta.applied_at: now}, synchronize_session=False)
+
+    db.commit()
+    logger.info(f"Applied {len(deltas)} registrations to {len(aggregates)} team aggregates")
+    return len(deltas)
+
+
+def drain_pending_member_deltas(db: Session, batch_size: int = 5000, max_batches: int = 100) -> int:
+    """Apply pending registrations until none are left (or max_batches is hit)"""
+    total = 0
+    for _ in range(max_batches):
+        applied = apply_pending_member_deltas(db, batch_size)
+        total += applied
+        if applied < batch_size:
+            break
+    return total
+
+
+def get_pending_member_counts(db: Session, user_id: int) -> Dict[str, int]:
+    """Registrations below user_id not yet counted in its aggregate.
+
+    Add these to the stored team_size / first_line_count / active_count for
+    an up-to-date read.
+    """
+    row = db.query(
+        func.count(TeamAggregateDelta.id),
+        func.sum(case((TeamMember.depth == 1, 1), else_=0)),
+        func.sum(TeamAggregateDelta.active)
+    ).join(
+        TeamMember, TeamMember.user_id == TeamAggregateDelta.user_id
+    ).filter(
+        TeamAggregateDelta.applied_at.is_(None),
+        TeamMember.ancestor_id == user_id,
+        TeamMember.depth > 0
+    ).first()
+    return {
+        "team_size": int(row[0] or 0),
+        "first_line_count": int(row[1] or 0),
+        "active_count": int(row[2] or 0)
+    }
+
+
+def add_turnover_to_aggregates(db: Session, amounts: Dict[int, Decimal]) -> None:
+    """Add already-coalesced team turnover amounts, keyed by ancestor id"""
+    rows = [
+        {"user_id": user_id, "amount": amount}
+        for user_id, amount in sorted(amounts.items()) if amount
+    ]
+    if not rows:
+        return
+    db.execute(
+        text("""
+            UPDATE team_aggregates
+            SET team_turnover = team_turnover + :amount
+            WHERE user_id = :user_id
+        """).bindparams(bindparam("amount", type_=Numeric(14, 2))),
+        rows
+    )
+
+
+def add_member_turnover_to_aggregates(db: Session, user_id: int, amount: float) -> None:
+    """Add one member's turnover to every upline aggregate"""
+    db.execute(
+        text(f"""
+            UPDATE team_aggregates
+            SET team_turnover = team_turnover + :amount
+            WHERE user_id IN ({_ANCESTORS_OF})
+        """),
+        {"user_id": user_id, "amount": amount}
+    )
+
+
+def rebuild_team_aggregates(db: Session, user_ids: Optional[Iterable[int]] = None) -> Dict:
+    """Recompute aggregates from team_members and users and commit.
+
+    Without user_ids every user is rebuilt (the nightly verification run);
+    returns how many rows were written and how many had drifted from the
+    incrementally maintained values. Each chunk's rows are locked before
+    they are recomputed, so activity and turnover updates landing meanwhile
+    are applied on top of the fresh values rather than overwritten, and
+    registrations still pending as deltas are left for the aggregator.
+    """
+    if user_ids is None:
+        targets = [row[0] for row in db.query(User.id).all()]
+    else:
+        targets = sorted(set(user_ids))
+
+    now = datetime.utcnow()
+    written = drifted = 0
+    for start in range(0, len(targets), REBUILD_CHUNK_SIZE):
+        chunk = targets[start:start + REBUILD_CHUNK_SIZE]
+        existing = {
+            row.user_id: row for row in
+            db.query(TeamAggregate).filter(
+                TeamAggregate.user_id.in_(chunk)
+            ).order_by(TeamAggregate.user_id).with_for_update().all()
+        }
+        fresh = _compute_aggregates(db, chunk)
+
+        inserts, updates = [], []
+        for user_id in chunk:
+            values = fresh[user_id]
+            row = existing.get(user_id)
+            if row is None:
+                inserts.append({"user_id": user_id, "rebuilt_at": now, "updated_at": now, **values})
+                continue
+            if any(_differs(getattr(row, key), value) for key, value in values.items()):
+                drifted += 1
+            updates.append({"user_id": user_id, "rebuilt_at": now, "updated_at": now, **values})
+
+        if inserts:
+            db.bulk_insert_mappings(TeamAggregate, inserts)
+        if updates:
+            db.bulk_update_mappings(TeamAggregate, updates)
+        db.commit()
+        written += len(chunk)
+
+    if drifted:
+        logger.warning(f"Team aggregates rebuild corrected {drifted} drifted rows")
+    logger.info(f"Rebuilt team aggregates for {written} users")
+    return {"rebuilt": written, "drifted": drifted}
+
+
+def _differs(current, value) -> bool:
+    if isinstance(value, dict):
+        return dict(current or {}) != value
+    if isinstance(value, Decimal) or isinstance(current, Decimal):
+        return Decimal(str(current or 0)) != Decimal(str(value or 0))
+    return (current or 0) != value
+
+
+def _compute_aggregates(db: Session, user_ids: List[int]) -> Dict[int, Dict]:
+    aggregates = {
+        user_id: {
+            "team_size": 0, "first_line_count": 0, "active_count": 0,
+            "team_turnover": Decimal("0"), "max_depth": 0, "level_counts": {}
+        }
+        for user_id in user_ids
+    }
+
+    levels = db.query(
+        TeamMember.ancestor_id,
+        TeamMember.depth,
+        func.count(TeamMember.user_id),
+        func.sum(case(((User.is_active == True) & (User.activity_status == "active"), 1), else_=0))
+    ).join(
+        User, User.id == TeamMember.user_id
+    ).filter(
+        TeamMember.ancestor_id.in_(user_ids),
+        TeamMember.depth > 0,
+        # Counted by the aggregator when their delta is applied
+        TeamMember.user_id.notin_(_pending_members())
+    ).group_by(TeamMember.ancestor_id, TeamMember.depth).all()
+
+    for ancestor_id, depth, count, active in levels:
+        aggregate = aggregates[ancestor_id]
+        aggregate["team_size"] += count
+        aggregate["active_count"] += int(active or 0)
+        aggregate["level_counts"][str(depth)] = count
+        aggregate["max_depth"] = max(aggregate["max_depth"], depth)
+        if depth == 1:
+            aggregate["first_line_count"] = count
+
+    turnovers = db.query(TeamMember.user_id, TeamMember.total_turnover).filter(
+        TeamMember.user_id.in_(user_ids),
+        TeamMember.depth == 0
+    ).all()
+    for user_id, turnover in turnovers:
+        aggregates[user_id]["team_turnover"] = Decimal(str(turnover or 0))
+
+    return aggregates
+
+
+# Activation changes are picked up from ORM writes to users: the upline's
+# active_count (or the member's pending registration delta) is adjusted in
+# the same flush.
+
+@event.listens_for(User.is_active, "set", active_history=True)
+@event.listens_for(User.activity_status, "set", active_history=True)
+def _load_previous_activity(target, value, oldvalue, initiator):
+    # active_history makes the old value available even when the attribute
+    # was expired (e.g. after a commit) before being changed
+    pass
+
+
+@event.listens_for(Session, "after_flush")
+def _track_activity_changes(session, flush_context):
+    adjustments = defaultdict(int)
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        is_active, status = attrs.is_active.history, attrs.activity_status.history
+        if not (is_active.has_changes() or status.has_changes()):
+            continue
+        was_active = _counts_as_active(
+            is_active.deleted[0] if is_active.deleted else obj.is_active,
+            status.deleted[0] if status.deleted else obj.activity_status
+        )
+        now_active = _counts_as_active(obj.is_active, obj.activity_status)
+        if was_active != now_active:
+            adjustments[obj.id] += 1 if now_active else -1
+
+    if not adjustments:
+        return
+    connection = session.connection()
+    for user_id, delta in sorted(adjustments.items()):
+        # A member whose registration is still pending isn't counted in the
+        # upline yet; its delta carries the change instead
+        pending = connection.execute(
+            text("""
+                UPDATE team_aggregate_deltas
+                SET active = active + :delta
+                WHERE user_id = :user_id AND applied_at IS NULL
+            """),
+            {"user_id": user_id, "delta": delta}
+        )
+        if pending.rowcount:
+            continue
+        connection.execute(
+            text(f"""
+                UPDATE team_aggregates
+                SET active_count = active_count + :delta
+                WHERE user_id IN ({_ANCESTORS_OF})
+            """),
+            {"user_id": user_id, "delta": delta}
+        )
@@ -2,8 +2,10 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, text
 from app.models.user import User
 from app.models.team import TeamMember
-from app.services.optimized_team_service import OptimizedTeamService
-from typing import List, Dict
+from app.services.optimized_team_service import OptimizedTeamService, LegBreakdown
+from app.core.genealogy import genealogy_index
+from app.services.team_aggregate_service import add_member_turnover_to_aggregates
+from typing import List, Dict, Iterable, Optional
 
 def get_team_members(db: Session, user_id: int, depth: int = None) -> List[TeamMember]:
     """Get all team members for a user up to specified depth - optimized"""
@@ -27,12 +29,75 @@ def get_first_line(db: Session, user_id: int) -> List[User]:
     ).all()
 
 def get_team_size(db: Session, user_id: int) -> int:
-    """Get total team size - optimized with index"""
+    """Get total team size - served from the genealogy index when loaded"""
+    size = genealogy_index.team_size(user_id)
+    if size is not None:
+        return size
     return db.query(func.count(TeamMember.user_id)).filter(
         TeamMember.ancestor_id == user_id,
         TeamMember.depth > 0
     ).scalar() or 0
 
+def get_team_sizes(db: Session, user_ids: Iterable[int]) -> Dict[int, int]:
+    """Get team sizes for several users - genealogy index or one grouped query"""
+    user_ids = list(user_ids)
+    sizes = genealogy_index.team_sizes(user_ids) or {}
+    # Users the index doesn't know yet are counted from team_members
+    user_ids = [user_id for user_id in user_ids if user_id not in sizes]
+    if not user_ids:
+        return sizes
+    rows = db.query(
+        TeamMember.ancestor_id,
+        func.count(TeamMember.user_id)
+    ).filter(
+        TeamMember.ancestor_id.in_(user_ids),
+        TeamMember.depth > 0
+    ).group_by(TeamMember.ancestor_id).all()
+    sizes.update({ancestor_id: size for ancestor_id, size in rows})
+    return sizes
+
+def get_downline_depths(db: Session, ancestor_id: int, user_ids: Iterable[int]) -> Dict[int, int]:
+    """Get each user's depth below ancestor (users outside the downline are omitted)"""
+    depths = {}
+    unknown = []
+    for user_id in user_ids:
+        depth = genealogy_index.depth_below(ancestor_id, user_id)
+        if depth is None:
+            unknown.append(user_id)
+        elif depth > 0:
+            depths[user_id] = depth
+    if unknown:
+        rows = db.query(TeamMember.user_id, TeamMember.depth).filter(
+            TeamMember.user_id.in_(unknown),
+            TeamMember.ancestor_id == ancestor_id
+        ).all()
+        depths.update({user_id: depth for user_id, depth in rows})
+    return depths
+
+def is_in_downline(db: Session, ancestor_id: int, user_id: int) -> bool:
+    """Check whether user_id is somewhere below ancestor_id"""
+    in_downline = genealogy_index.is_in_downline(ancestor_id, user_id)
+    if in_downline is not None:
+        return in_downline
+    return db.query(TeamMember.user_id).filter(
+        TeamMember.user_id == user_id,
+        TeamMember.ancestor_id == ancestor_id,
+        TeamMember.depth > 0
+    ).first() is not None
+
+def get_downline_ids(db: Session, user_id: int, depth: Optional[int] = None) -> List[int]:
+    """Get the user ids of everyone below user_id"""
+    ids = genealogy_index.downline_ids(user_id, depth)
+    if ids is not None:
+        return ids
+    query = db.query(TeamMember.user_id).filter(
+        TeamMember.ancestor_id == user_id,
+        TeamMember.depth > 0
+    )
+    if depth:
+        query = query.filter(TeamMember.depth <= depth)
+    return [row[0] for row in query.all()]
+
 def get_leg_turnover(db: Session, ancestor_id: int, first_line_member_id: int) -> float:
     """Calculate total turnover for a specific leg - optimized"""
     # Use optimized query with proper joins
@@ -44,12 +109,19 @@ def get_leg_turnover(db: Session, ancestor_id: int, first_line_member_id: int) -
     
     return float(result or 0)
 
+def get_leg_breakdown(db: Session, user_id: int) -> LegBreakdown:
+    """Get the user's first-line legs (shared for the rest of the request)"""
+    return OptimizedTeamService.get_leg_breakdown(db, user_id)
+
 def calculate_leg_breakdown(db: Session, user_id: int) -> Dict:
     """Calculate turnover breakdown by legs - use optimized version"""
-    return OptimizedTeamService.calculate_leg_breakdown_optimized(db, user_id)
+    return get_leg_breakdown(db, user_id).to_dict()
+
+def update_team_turnover(db: Session, user_id: int, amount: float, commit: bool = True):
+    """Update turnover for user and all ancestors - optimized batch update
 
-def update_team_turnover(db: Session, user_id: int, amount: float):
-    """Update turnover for user and all ancestors - optimized batch update"""
+    With commit=False the updates join the caller's transaction.
+    """
     # Use bulk update for better performance
     db.execute(
         text("""
@@ -73,5 +145,7 @@ def update_team_turnover(db: Session, user_id: int, amount: float):
         """),
         {"user_id": user_id, "amount": amount}
     )
+    add_member_turnover_to_aggregates(db, user_id, amount)
     
-    db.commit()
+    if commit:
+        db.commit()
@@ -1,12 +1,23 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import insert
 from datetime import datetime
+from typing import List
 from app.models.user import User
+from app.models.activity import ActivityLog
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.core.config import settings
 from app.services.team_service import update_team_turnover
+from app.services.turnover_ledger import record_turnover_delta
 from app.services.rank_service import calculate_user_rank
-from app.services.bonus_engine import calculate_unilevel_bonus, reverse_bonuses
-from app.services.activity_service import update_user_activity
+from app.services.bonus_engine import reverse_bonuses_bulk
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from app.services.purchase_completion import (
+    start_purchase_completion, dispatch_purchase_completion, run_purchase_completion
+)
 from app.utils.activity import log_activity
+import logging
+
+logger = logging.getLogger(__name__)
 
 def create_purchase_transaction(
     db: Session,
@@ -36,38 +47,22 @@ def create_purchase_transaction(
 
 def complete_purchase_transaction(db: Session, transaction_id: int, gateway_response: dict = None):
     """Complete a purchase transaction and trigger bonuses"""
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).with_for_update().first()
     
     if not transaction or transaction.status != TransactionStatus.pending:
         return False
     
-    # Update transaction status
+    # Update transaction status; the follow-up work is recorded in the same
+    # commit and runs in the background
     transaction.status = TransactionStatus.completed
     transaction.completed_at = datetime.utcnow()
     if gateway_response:
         transaction.payment_gateway_response = gateway_response
-    
+    start_purchase_completion(db, transaction)
     db.commit()
     
-    # Update team turnover
-    update_team_turnover(db, transaction.user_id, float(transaction.amount))
-    
-    # Update user activity status
-    update_user_activity(db, transaction.user_id)
-    
-    # Calculate rank
-    calculate_user_rank(db, transaction.user_id)
-    
-    # Calculate unilevel bonuses
-    calculate_unilevel_bonus(db, transaction.id)
-    
-    # Log activity
-    log_activity(
-        db, transaction.user_id, "purchase_completed",
-        entity_type="transaction",
-        entity_id=transaction.id,
-        details={"amount": float(transaction.amount), "currency": transaction.currency}
-    )
+    if not (settings.PURCHASE_SAGA_ENABLED and dispatch_purchase_completion(transaction_id)):
+        run_purchase_completion(db, transaction_id)
     
     return True
 
@@ -93,49 +88,86 @@ def fail_transaction(db: Session, transaction_id: int, reason: str = None):
     
     return True
 
-def refund_transaction(db: Session, transaction_id: int, reason: str = None):
-    """Refund a transaction and reverse bonuses"""
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
-    
-    if not transaction or transaction.status != TransactionStatus.completed:
-        return False
-    
-    # Create refund transaction
-    refund = Transaction(
-        user_id=transaction.user_id,
-        transaction_type=TransactionType.refund,
-        amount=transaction.amount,
-        currency=transaction.currency,
-        status=TransactionStatus.completed,
-        related_transaction_id=transaction.id,
-        description=f"Refund for transaction #{transaction.id}",
-        completed_at=datetime.utcnow(),
-        meta_data={"reason": reason} if reason else None
-    )
-    db.add(refund)
-    
-    # Update original transaction
-    transaction.status = TransactionStatus.cancelled
-    
-    # Reverse bonuses
-    reverse_bonuses(db, transaction.id)
+def refund_transactions(db: Session, transaction_ids: List[int], reason: str = None) -> dict:
+    """Refund many completed transactions and reverse their bonuses in one commit.
+
+    Refund rows, status changes, bonus reversals, turnover reversals, rank
+    changes and activity logs all share that commit, so the row locks taken
+    on the transactions are held until it; ids that are missing or not
+    completed are skipped.
+    Returns {"refunded": [...], "skipped": [...]}.
+    """
+    requested = sorted(set(transaction_ids))
+    # Locked so a concurrent completion or second refund waits for this one
+    transactions = db.query(Transaction).filter(
+        Transaction.id.in_(requested),
+        Transaction.status == TransactionStatus.completed
+    ).order_by(Transaction.id).with_for_update().all()
+    refunded = [transaction.id for transaction in transactions]
+    skipped = sorted(set(requested) - set(refunded))
+    if not transactions:
+        return {"refunded": [], "skipped": skipped}
+    
+    now = datetime.utcnow()
+    db.execute(insert(Transaction), [
+        {
+            "user_id": transaction.user_id,
+            "transaction_type": TransactionType.refund,
+            "amount": transaction.amount,
+            "currency": transaction.currency,
+            "status": TransactionStatus.completed,
+            "related_transaction_id": transaction.id,
+            "description": f"Refund for transaction #{transaction.id}",
+            "completed_at": now,
+            "meta_data": {"reason": reason} if reason else None,
+            "created_at": now,
+            "updated_at": now
+        }
+        for transaction in transactions
+    ])
+    for transaction in transactions:
+        transaction.status = TransactionStatus.cancelled
+    
+    # Claiming the processed markers blocks on (or blocks out) a bonus batch
+    # paying these purchases, so the reversal below sees every payout and
+    # none can land after the refund commits
+    OptimizedBonusEngine.claim_purchases(db, [
+        transaction.id for transaction in transactions
+        if transaction.transaction_type == TransactionType.purchase
+    ])
+    reverse_bonuses_bulk(db, refunded)
     
     # Reverse team turnover
-    update_team_turnover(db, transaction.user_id, -float(transaction.amount))
-    
-    # Recalculate rank
-    calculate_user_rank(db, transaction.user_id)
-    
+    for transaction in transactions:
+        if settings.TURNOVER_WRITE_BEHIND:
+            record_turnover_delta(db, transaction.user_id, -float(transaction.amount), transaction.id)
+        else:
+            update_team_turnover(db, transaction.user_id, -float(transaction.amount), commit=False)
+    
+    # Recalculate rank once per buyer
+    for user_id in sorted({transaction.user_id for transaction in transactions}):
+        calculate_user_rank(db, user_id, commit=False)
+    
+    db.execute(insert(ActivityLog), [
+        {
+            "user_id": transaction.user_id,
+            "action": "transaction_refunded",
+            "entity_type": "transaction",
+            "entity_id": transaction.id,
+            "details": {"reason": reason},
+            "created_at": now
+        }
+        for transaction in transactions
+    ])
     db.commit()
     
-    log_activity(
-        db, transaction.user_id, "transaction_refunded",
-        entity_type="transaction",
-        entity_id=transaction.id,
-        details={"reason": reason}
-    )
-    
-    return True
+    logger.info(f"Refunded {len(refunded)} transactions, skipped {len(skipped)}")
+    return {"refunded": refunded, "skipped": skipped}
+
+def refund_transaction(db: Session, transaction_id: int, reason: str = None):
+    """Refund a transaction and reverse bonuses"""
+    result = refund_transactions(db, [transaction_id], reason)
+    return bool(result["refunded"])
 
 def get_transaction_stats(db: Session, user_id: int) -> dict:
     """Get transaction statistics for a user"""
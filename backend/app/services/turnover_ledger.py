@@ -0,0 +1,160 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import Numeric, bindparam, func, text
+from app.models.team import TeamMember
+from app.models.turnover_delta import TurnoverDelta
+from app.services.team_aggregate_service import add_turnover_to_aggregates
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keeps each VALUES list well under the bind parameter limit
+UPDATE_CHUNK_SIZE = 5000
+
+
+def record_turnover_delta(db: Session, user_id: int, amount: float, transaction_id: Optional[int] = None) -> TurnoverDelta:
+    """Append a turnover change to the ledger (applied later by apply_pending_deltas).
+
+    This is a plain insert, so purchases never wait on the upline's
+    team_members row locks. Nothing is committed here.
+    """
+    delta = TurnoverDelta(user_id=user_id, amount=amount, transaction_id=transaction_id)
+    db.add(delta)
+    return delta
+
+
+def _coalesce(db: Session, deltas: List[Tuple[int, int, Decimal]]) -> Tuple[Dict[int, Decimal], Dict[int, Decimal]]:
+    """Sum a batch of deltas into per-user personal and per-ancestor team amounts"""
+    personal: Dict[int, Decimal] = defaultdict(Decimal)
+    for _, user_id, amount in deltas:
+        personal[user_id] += amount
+
+    team: Dict[int, Decimal] = defaultdict(Decimal)
+    ancestors = db.query(TeamMember.user_id, TeamMember.ancestor_id).filter(
+        TeamMember.user_id.in_(personal.keys()),
+        TeamMember.depth > 0
+    ).all()
+    for user_id, ancestor_id in ancestors:
+        team[ancestor_id] += personal[user_id]
+
+    return personal, team
+
+
+def _apply_amounts(db: Session, column: str, amounts: Dict[int, Decimal], now: datetime):
+    rows = [(user_id, amount) for user_id, amount in amounts.items() if amount]
+    for start in range(0, len(rows), UPDATE_CHUNK_SIZE):
+        _apply_chunk(db, column, rows[start:start + UPDATE_CHUNK_SIZE], now)
+
+
+def _apply_chunk(db: Session, column: str, rows: List[Tuple[int, Decimal]], now: datetime):
+    if db.bind.dialect.name == "postgresql":
+        # One UPDATE per batch, joined against the coalesced amounts
+        values = ", ".join(f"(:u{i}, CAST(:a{i} AS NUMERIC))" for i in range(len(rows)))
+        params = {"now": now}
+        for i, (user_id, amount) in enumerate(rows):
+            params[f"u{i}"] = user_id
+            params[f"a{i}"] = amount
+        db.execute(
+            text(f"""
+                UPDATE team_members AS tm
+                SET {column} = COALESCE(tm.{column}, 0) + v.amount,
+                    last_turnover_update = :now
+                FROM (VALUES {values}) AS v(user_id, amount)
+                WHERE tm.user_id = v.user_id AND tm.depth = 0
+            """),
+            params
+        )
+    else:
+        db.execute(
+            text(f"""
+                UPDATE team_members
+                SET {column} = COALESCE({column}, 0) + :amount,
+                    last_turnover_update = :now
+                WHERE user_id = :user_id AND depth = 0
+            """).bindparams(bindparam("amount", type_=Numeric(12, 2))),
+            [{"user_id": user_id, "amount": amount, "now": now} for user_id, amount in rows]
+        )
+
+
+def apply_pending_deltas(db: Session, batch_size: int = 5000) -> int:
+    """Fold one batch of pending deltas into team_members and commit.
+
+    Deltas are claimed with SKIP LOCKED so several aggregators can run at
+    once, coalesced per user/ancestor, and applied with one UPDATE per
+    turnover column. Returns the number of deltas applied.
+    """
+    deltas = db.query(
+        TurnoverDelta.id, TurnoverDelta.user_id, TurnoverDelta.amount
+    ).filter(
+        TurnoverDelta.applied_at.is_(None)
+    ).order_by(
+        TurnoverDelta.id
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not deltas:
+        return 0
+
+    now = datetime.utcnow()
+    personal, team = _coalesce(db, deltas)
+
+    # Lock upline rows in a stable order to avoid deadlocks between aggregators
+    _apply_amounts(db, "personal_turnover", dict(sorted(personal.items())), now)
+    _apply_amounts(db, "total_turnover", dict(sorted(team.items())), now)
+    add_turnover_to_aggregates(db, team)
+
+    db.query(TurnoverDelta).filter(
+        TurnoverDelta.id.in_([delta.id for delta in deltas])
+    ).update({TurnoverDelta.applied_at: now}, synchronize_session=False)
+
+    db.commit()
+    logger.info(f"Applied {len(deltas)} turnover deltas to {len(personal)} users and {len(team)} ancestors")
+    return len(deltas)
+
+
+def drain_pending_deltas(db: Session, batch_size: int = 5000, max_batches: int = 100) -> int:
+    """Apply pending deltas until the ledger is empty (or max_batches is hit)"""
+    total = 0
+    for _ in range(max_batches):
+        applied = apply_pending_deltas(db, batch_size)
+        total += applied
+        if applied < batch_size:
+            break
+    return total
+
+
+def get_pending_turnover(db: Session, user_ids: Iterable[int]) -> Dict[int, Dict[str, float]]:
+    """Turnover recorded but not yet applied, keyed by user id.
+
+    Add these to the stored personal_turnover / total_turnover values for
+    an up-to-date read.
+    """
+    user_ids = list(user_ids)
+    pending = {user_id: {"personal": 0.0, "total": 0.0} for user_id in user_ids}
+    if not user_ids:
+        return pending
+
+    personal_rows = db.query(
+        TurnoverDelta.user_id, func.sum(TurnoverDelta.amount)
+    ).filter(
+        TurnoverDelta.applied_at.is_(None),
+        TurnoverDelta.user_id.in_(user_ids)
+    ).group_by(TurnoverDelta.user_id).all()
+    for user_id, amount in personal_rows:
+        pending[user_id]["personal"] = float(amount or 0)
+
+    team_rows = db.query(
+        TeamMember.ancestor_id, func.sum(TurnoverDelta.amount)
+    ).join(
+        TeamMember, TeamMember.user_id == TurnoverDelta.user_id
+    ).filter(
+        TurnoverDelta.applied_at.is_(None),
+        TeamMember.ancestor_id.in_(user_ids),
+        TeamMember.depth > 0
+    ).group_by(TeamMember.ancestor_id).all()
+    for ancestor_id, amount in team_rows:
+        pending[ancestor_id]["total"] = float(amount or 0)
+
+    return pending
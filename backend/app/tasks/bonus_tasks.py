@@ -1,7 +1,6 @@
 from celery import Celery
 from app.core.config import settings
 from app.core.database import SessionLocal
-from app.services.bonus_engine import calculate_infinity_bonus
 from datetime import datetime
 
 celery_app = Celery(
@@ -12,7 +11,9 @@ celery_app = Celery(
 
 @celery_app.task
 def calculate_monthly_infinity_bonuses():
-    """Calculate infinity bonuses for the previous month"""
+    """Pay infinity bonuses for the previous month (safe to run daily)"""
+    from app.services.bonus_run_service import run_infinity_bonus
+    
     db = SessionLocal()
     try:
         # Get previous month
@@ -24,12 +25,14 @@ def calculate_monthly_infinity_bonuses():
             month = now.month - 1
             year = now.year
         
-        bonuses = calculate_infinity_bonus(db, month, year)
+        # A completed month is a no-op; an interrupted one resumes
+        run = run_infinity_bonus(db, month, year)
         return {
             "success": True,
             "month": month,
             "year": year,
-            "bonuses_created": len(bonuses)
+            "status": run.status if run else "disabled",
+            "users_paid": run.users_paid if run else 0
         }
     except Exception as e:
         return {
@@ -42,24 +45,195 @@ def calculate_monthly_infinity_bonuses():
 @celery_app.task
 def recalculate_all_ranks():
     """Recalculate ranks for all users (daily batch job)"""
-    from app.services.rank_service import calculate_user_rank
-    from app.models.user import User
+    from app.services.rank_engine import recalculate_ranks
+    from app.services.turnover_ledger import drain_pending_deltas
     
     db = SessionLocal()
     try:
-        users = db.query(User).filter(User.is_active == True).all()
-        updated_count = 0
-        
-        for user in users:
-            if calculate_user_rank(db, user.id):
-                updated_count += 1
+        # Fold in pending turnover so the snapshot is complete
+        if settings.TURNOVER_WRITE_BEHIND:
+            drain_pending_deltas(db, batch_size=settings.TURNOVER_BATCH_SIZE)
+        result = recalculate_ranks(db)
         
         return {
             "success": True,
-            "users_checked": len(users),
-            "ranks_updated": updated_count
+            "users_checked": result["users_checked"],
+            "ranks_updated": result["ranks_updated"]
         }
     except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def dispatch_outbox():
+    """Send queued emails and notifications from the outbox"""
+    from app.services.outbox import dispatch_outbox as dispatch
+    
+    db = SessionLocal()
+    try:
+        sent = failed = 0
+        # Keep draining while batches come back full, bounded so one run
+        # cannot hold the worker indefinitely
+        for _ in range(10):
+            result = dispatch(db)
+            sent += result["sent"]
+            failed += result["failed"]
+            if result["claimed"] < settings.OUTBOX_BATCH_SIZE:
+                break
+        return {
+            "success": True,
+            "sent": sent,
+            "failed": failed
+        }
+    except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def recover_unprocessed_bonuses():
+    """Pay bonuses for completed purchases the bonus worker never processed"""
+    from app.services.bonus_worker import BonusBatchWorker, find_unprocessed_purchases, get_dead_lettered_purchases
+    
+    db = SessionLocal()
+    try:
+        transaction_ids = find_unprocessed_purchases(
+            db, settings.BONUS_RECOVERY_DELAY, exclude=get_dead_lettered_purchases()
+        )
+        # Same failure handling as the worker: per-purchase retry, attempt
+        # counts and the dead-letter list
+        worker = BonusBatchWorker()
+        bonuses = 0
+        for start in range(0, len(transaction_ids), settings.BONUS_BATCH_SIZE):
+            bonuses += worker.process(transaction_ids[start:start + settings.BONUS_BATCH_SIZE])
+        return {
+            "success": True,
+            "transactions_recovered": worker.processed,
+            "transactions_failed": worker.failed,
+            "bonuses_created": bonuses
+        }
+    except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def run_purchase_completion(transaction_id: int):
+    """Run the follow-up steps of a completed purchase"""
+    from app.services.purchase_completion import run_purchase_completion as run_completion
+    
+    db = SessionLocal()
+    try:
+        completion = run_completion(db, transaction_id)
+        return {
+            "success": completion is not None and completion.status == "completed",
+            "status": completion.status if completion else "skipped"
+        }
+    except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def resume_purchase_completions():
+    """Run purchase completions that are due for a retry or were never dispatched"""
+    from app.services.purchase_completion import find_due_completions, run_purchase_completion as run_completion
+    
+    db = SessionLocal()
+    try:
+        completed = 0
+        transaction_ids = find_due_completions(db)
+        for transaction_id in transaction_ids:
+            completion = run_completion(db, transaction_id)
+            if completion is not None and completion.status == "completed":
+                completed += 1
+        return {
+            "success": True,
+            "completions_resumed": len(transaction_ids),
+            "completions_finished": completed
+        }
+    except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def apply_turnover_deltas():
+    """Fold pending turnover deltas into team_members"""
+    from app.services.turnover_ledger import drain_pending_deltas
+    
+    db = SessionLocal()
+    try:
+        applied = drain_pending_deltas(db, batch_size=settings.TURNOVER_BATCH_SIZE)
+        return {
+            "success": True,
+            "deltas_applied": applied
+        }
+    except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def apply_team_aggregate_deltas():
+    """Count pending registrations into the upline's team_aggregates"""
+    from app.services.team_aggregate_service import drain_pending_member_deltas
+    
+    db = SessionLocal()
+    try:
+        applied = drain_pending_member_deltas(db, batch_size=settings.TEAM_AGGREGATE_BATCH_SIZE)
+        return {
+            "success": True,
+            "deltas_applied": applied
+        }
+    except Exception as e:
+        db.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    finally:
+        db.close()
+
+@celery_app.task
+def rebuild_team_aggregates():
+    """Recompute team_aggregates from scratch (nightly verification)"""
+    from app.services.team_aggregate_service import rebuild_team_aggregates as rebuild
+    
+    db = SessionLocal()
+    try:
+        result = rebuild(db)
+        return {
+            "success": True,
+            **result
+        }
+    except Exception as e:
+        db.rollback()
         return {
             "success": False,
             "error": str(e)
@@ -77,4 +251,28 @@ celery_app.conf.beat_schedule = {
         'task': 'app.tasks.bonus_tasks.recalculate_all_ranks',
         'schedule': 86400.0,  # Daily
     },
+    'rebuild-team-aggregates-nightly': {
+        'task': 'app.tasks.bonus_tasks.rebuild_team_aggregates',
+        'schedule': 86400.0,  # Daily
+    },
+    'recover-unprocessed-bonuses': {
+        'task': 'app.tasks.bonus_tasks.recover_unprocessed_bonuses',
+        'schedule': 60.0,
+    },
+    'resume-purchase-completions': {
+        'task': 'app.tasks.bonus_tasks.resume_purchase_completions',
+        'schedule': 30.0,
+    },
+    'dispatch-outbox': {
+        'task': 'app.tasks.bonus_tasks.dispatch_outbox',
+        'schedule': settings.OUTBOX_DISPATCH_INTERVAL,
+    },
+    'apply-turnover-deltas': {
+        'task': 'app.tasks.bonus_tasks.apply_turnover_deltas',
+        'schedule': settings.TURNOVER_FLUSH_INTERVAL,
+    },
+    'apply-team-aggregate-deltas': {
+        'task': 'app.tasks.bonus_tasks.apply_team_aggregate_deltas',
+        'schedule': settings.TEAM_AGGREGATE_FLUSH_INTERVAL,
+    },
 }
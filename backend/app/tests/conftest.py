@@ -35,6 +35,14 @@ def event_loop():
     yield loop
     loop.close()
 
+@pytest.fixture(autouse=True)
+def clear_config_cache():
+    """Each test gets a fresh database, so drop config values cached by earlier tests."""
+    from app.core.config_cache import config_cache
+    config_cache.clear()
+    yield
+    config_cache.clear()
+
 @pytest.fixture(scope="function")
 def test_db():
     """Create a fresh database for each test."""
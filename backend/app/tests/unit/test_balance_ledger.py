@@ -0,0 +1,39 @@
+import pytest
+from app.models.balance_ledger import BalanceLedgerEntry
+from app.services.balance_ledger import apply_balance_deltas
+
+class TestBalanceLedger:
+    """Test suite for the batched balance ledger writer."""
+
+    def test_applies_deltas_and_records_audit_rows(self, test_db, create_user):
+        """Test that every delta moves the balance, earnings and leaves an audit row."""
+        alice = create_user(test_db)
+        bob = create_user(test_db)
+
+        balances = apply_balance_deltas(test_db, {
+            alice.id: {"NGN": 100, "USDT": 5},
+            bob.id: {"ngn": 40, "USDT": 0}
+        }, "infinity_bonus", reference_id=7)
+        test_db.commit()
+        test_db.expire_all()
+
+        assert balances == {alice.id: {"NGN": 100.0, "USDT": 5.0}, bob.id: {"NGN": 40.0}}
+        assert float(alice.balance_ngn) == 100
+        assert float(alice.total_earnings) == 105
+        assert float(bob.balance_usdt or 0) == 0
+
+        entries = test_db.query(BalanceLedgerEntry).order_by(BalanceLedgerEntry.id).all()
+        assert [(e.user_id, e.currency, float(e.amount), float(e.balance_after)) for e in entries] == [
+            (alice.id, "NGN", 100.0, 100.0),
+            (bob.id, "NGN", 40.0, 40.0),
+            (alice.id, "USDT", 5.0, 5.0)
+        ]
+        assert {e.reason for e in entries} == {"infinity_bonus"}
+
+    def test_rejects_unknown_currency_and_users(self, test_db, create_user):
+        """Test that bad currencies and missing users raise instead of being dropped."""
+        user = create_user(test_db)
+        with pytest.raises(ValueError):
+            apply_balance_deltas(test_db, {user.id: {"EUR": 10}}, "rank_bonus")
+        with pytest.raises(ValueError):
+            apply_balance_deltas(test_db, {user.id + 999: {"NGN": 10}}, "rank_bonus")
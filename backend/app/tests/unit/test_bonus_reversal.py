@@ -0,0 +1,125 @@
+from datetime import datetime
+from sqlalchemy import event
+from app.core.config import settings
+from app.models.team import TeamMember
+from app.models.bonus import Bonus, BonusType, BonusStatus
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.balance_ledger import BalanceLedgerEntry
+from app.models.processed_purchase import ProcessedPurchase
+from app.services.bonus_engine import reverse_bonuses_bulk
+from app.services.closure_service import add_member_closure
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from app.services.transaction_service import refund_transactions
+
+class TestBonusReversal:
+    """Test suite for bulk bonus reversal and refunds."""
+
+    def _purchase(self, db, user_id, amount=1000):
+        purchase = Transaction(
+            user_id=user_id,
+            transaction_type=TransactionType.purchase,
+            amount=amount,
+            currency="NGN",
+            status=TransactionStatus.completed,
+            completed_at=datetime.utcnow()
+        )
+        db.add(purchase)
+        db.commit()
+        return purchase
+
+    def _bonus(self, db, user_id, source_id, amount, status=BonusStatus.paid):
+        db.add(Bonus(
+            user_id=user_id,
+            bonus_type=BonusType.direct,
+            amount=amount,
+            currency="NGN",
+            status=status,
+            source_transaction_id=source_id,
+            calculation_date=datetime.utcnow().date()
+        ))
+
+    def test_reverses_paid_bonuses_for_many_transactions(self, test_db, create_user):
+        """Test that paid bonuses are cancelled, debited and mirrored by reversal rows."""
+        sponsor = create_user(test_db)
+        sponsor.balance_ngn = 500
+        buyer = create_user(test_db, sponsor_id=sponsor.id)
+        first = self._purchase(test_db, buyer.id)
+        second = self._purchase(test_db, buyer.id)
+        self._bonus(test_db, sponsor.id, first.id, 100)
+        self._bonus(test_db, sponsor.id, second.id, 50)
+        self._bonus(test_db, sponsor.id, second.id, 20, status=BonusStatus.cancelled)
+        test_db.commit()
+
+        assert reverse_bonuses_bulk(test_db, [first.id, second.id, second.id]) == 2
+        test_db.commit()
+        test_db.expire_all()
+
+        assert float(sponsor.balance_ngn) == 350
+        statuses = test_db.query(Bonus.status).filter(Bonus.user_id == sponsor.id).all()
+        assert [status for status, in statuses] == [BonusStatus.cancelled] * 3
+        reversals = test_db.query(Transaction).filter(Transaction.transaction_type == TransactionType.fee).all()
+        assert sorted(float(r.amount) for r in reversals) == [-100.0, -50.0]
+        assert {r.related_transaction_id for r in reversals} == {first.id, second.id}
+        ledger = test_db.query(BalanceLedgerEntry).one()
+        assert (float(ledger.amount), ledger.reason) == (-150.0, "bonus_reversal")
+
+        # Already reversed bonuses are left alone
+        assert reverse_bonuses_bulk(test_db, [first.id]) == 0
+
+    def test_refund_transactions_skips_ineligible(self, test_db, create_user):
+        """Test that only completed transactions are refunded and the rest reported."""
+        sponsor = create_user(test_db)
+        buyer = create_user(test_db, sponsor_id=sponsor.id)
+        purchase = self._purchase(test_db, buyer.id)
+        self._bonus(test_db, sponsor.id, purchase.id, 100)
+        test_db.commit()
+
+        result = refund_transactions(test_db, [purchase.id, purchase.id + 999], "chargeback")
+        test_db.expire_all()
+
+        assert result == {"refunded": [purchase.id], "skipped": [purchase.id + 999]}
+        assert purchase.status == TransactionStatus.cancelled
+        refund = test_db.query(Transaction).filter(Transaction.transaction_type == TransactionType.refund).one()
+        assert refund.related_transaction_id == purchase.id
+        assert refund.meta_data == {"reason": "chargeback"}
+        assert float(sponsor.balance_ngn) == -100
+
+        assert refund_transactions(test_db, [purchase.id])["refunded"] == []
+
+    def test_refund_claims_the_purchase_for_bonuses(self, test_db, create_user):
+        """Test that a refunded purchase is marked processed so no unilevel payout follows it."""
+        sponsor = create_user(test_db)
+        buyer = create_user(test_db, sponsor_id=sponsor.id)
+        purchase = self._purchase(test_db, buyer.id)
+
+        refund_transactions(test_db, [purchase.id])
+
+        assert test_db.get(ProcessedPurchase, purchase.id) is not None
+        assert OptimizedBonusEngine.claim_purchases(test_db, [purchase.id]) == []
+
+    def test_refund_commits_once_with_direct_turnover(self, test_db, create_user, monkeypatch):
+        """Test that direct turnover reversal and rank evaluation join the refund's single commit."""
+        monkeypatch.setattr(settings, "TURNOVER_WRITE_BEHIND", False)
+        sponsor = create_user(test_db)
+        buyer = create_user(test_db, sponsor_id=sponsor.id)
+        add_member_closure(test_db, sponsor.id)
+        add_member_closure(test_db, buyer.id, sponsor.id)
+        test_db.commit()
+        first = self._purchase(test_db, buyer.id)
+        second = self._purchase(test_db, buyer.id, amount=500)
+
+        commits = []
+        listener = lambda session: commits.append(session)
+        event.listen(test_db, "after_commit", listener)
+        try:
+            result = refund_transactions(test_db, [first.id, second.id])
+        finally:
+            event.remove(test_db, "after_commit", listener)
+
+        assert result["refunded"] == [first.id, second.id]
+        assert len(commits) == 1
+        test_db.expire_all()
+        self_row = test_db.query(TeamMember).filter(TeamMember.user_id == buyer.id, TeamMember.depth == 0).one()
+        sponsor_row = test_db.query(TeamMember).filter(TeamMember.user_id == sponsor.id, TeamMember.depth == 0).one()
+        assert float(self_row.personal_turnover) == -1500
+        assert float(sponsor_row.total_turnover) == -1500
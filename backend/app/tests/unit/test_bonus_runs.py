@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime
+from app.models.bonus import Bonus
+from app.models.rank import Rank
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services import bonus_run_service
+from app.services.bonus_run_service import run_infinity_bonus
+from app.services.config_service import set_config
+
+class TestInfinityBonusRuns:
+    """Test suite for idempotent, checkpointed infinity bonus runs."""
+
+    def _setup(self, db, create_user):
+        set_config(db, "infinity_enabled", "true")
+        for name, level, percentage in [("Emerald", 5, None), ("Diamond", 6, 2)]:
+            db.add(Rank(
+                name=name, level=level, team_turnover_required=0, first_leg_requirement=0,
+                second_leg_requirement=0, other_legs_requirement=0, infinity_bonus_percentage=percentage
+            ))
+        diamonds = [create_user(db, current_rank="Diamond") for _ in range(3)]
+        create_user(db, current_rank="Emerald")
+        db.add(Transaction(
+            user_id=diamonds[0].id, transaction_type=TransactionType.purchase, amount=1000,
+            currency="NGN", status=TransactionStatus.completed, created_at=datetime(2026, 9, 15)
+        ))
+        db.commit()
+        return diamonds
+
+    def test_month_is_paid_once(self, test_db, create_user):
+        """Test chunked payout and that retriggering a completed month is a no-op."""
+        diamonds = self._setup(test_db, create_user)
+
+        run = run_infinity_bonus(test_db, 9, 2026, chunk_size=2)
+        assert run.status == "completed"
+        assert run.users_paid == 3
+        assert float(run.total_amount) == 60
+
+        assert run_infinity_bonus(test_db, 9, 2026, chunk_size=2).id == run.id
+        bonuses = test_db.query(Bonus).all()
+        assert sorted(b.user_id for b in bonuses) == sorted(d.id for d in diamonds)
+        assert {float(b.amount) for b in bonuses} == {20.0}
+
+    def test_crashed_run_resumes_from_checkpoint(self, test_db, create_user, monkeypatch):
+        """Test that a failure keeps paid chunks and a rerun pays only the rest."""
+        self._setup(test_db, create_user)
+        pay_chunk = bonus_run_service._pay_chunk
+        calls = []
+
+        def failing_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return pay_chunk(*args, **kwargs)
+
+        monkeypatch.setattr(bonus_run_service, "_pay_chunk", failing_second_chunk)
+        with pytest.raises(RuntimeError):
+            run_infinity_bonus(test_db, 9, 2026, chunk_size=2)
+        assert test_db.query(Bonus).count() == 2
+
+        with pytest.raises(ValueError):
+            run_infinity_bonus(test_db, 9, 2026, chunk_size=2, resume=False)
+
+        run = run_infinity_bonus(test_db, 9, 2026, chunk_size=2)
+        assert run.status == "completed"
+        assert run.users_paid == 3
+        assert test_db.query(Bonus).count() == 3
@@ -0,0 +1,139 @@
+from collections import deque
+from datetime import datetime, timedelta
+from app.models.bonus import Bonus
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.bonus_worker import (
+    BonusBatchWorker, BONUS_QUEUE_KEY, BONUS_ATTEMPTS_KEY, find_unprocessed_purchases, get_dead_lettered_purchases
+)
+from app.services.closure_service import add_member_closure
+from app.services.config_service import set_config
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+
+class _ListQueue:
+    """Just the list and hash commands the worker uses"""
+
+    def __init__(self):
+        self.items = deque()
+        self.hashes = {}
+
+    def rpush(self, key, *values):
+        self.items.extend(values)
+
+    def blpop(self, key, timeout=0):
+        return (key, self.items.popleft()) if self.items else None
+
+    def lpop(self, key, count=None):
+        popped = []
+        while self.items and len(popped) < (count or 1):
+            popped.append(self.items.popleft())
+        return popped or None
+
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[str(field)] = int(fields.get(str(field), 0)) + amount
+        return fields[str(field)]
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[str(field)] = value
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(str(field), None)
+
+    def hkeys(self, key):
+        return list(self.hashes.get(key, {}))
+
+class _Unclosed:
+    """Shares the test session with the worker without letting it close it"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def close(self):
+        pass
+
+class TestBonusWorker:
+    """Test suite for micro-batched unilevel bonus processing."""
+
+    def _setup(self, db, create_user, monkeypatch, purchases=3):
+        set_config(db, "unilevel_enabled", "true")
+        set_config(db, "unilevel_percentages", "[10]")
+        sponsor = create_user(db)
+        buyer = create_user(db, sponsor_id=sponsor.id)
+        sponsor.last_activity_date = datetime.utcnow()
+        add_member_closure(db, sponsor.id)
+        add_member_closure(db, buyer.id, sponsor.id)
+        transactions = [
+            Transaction(
+                user_id=buyer.id, transaction_type=TransactionType.purchase, amount=100,
+                currency="NGN", status=TransactionStatus.completed,
+                completed_at=datetime.utcnow() - timedelta(minutes=10)
+            )
+            for _ in range(purchases)
+        ]
+        db.add_all(transactions)
+        db.commit()
+        return [t.id for t in transactions]
+
+    def test_batches_are_paid_exactly_once(self, test_db, create_user, monkeypatch):
+        """Test that reprocessing a batch does not pay the same purchase twice."""
+        ids = self._setup(test_db, create_user, monkeypatch)
+
+        assert len(OptimizedBonusEngine.calculate_unilevel_bonuses_batch(test_db, ids[:2])) == 2
+        assert len(OptimizedBonusEngine.calculate_unilevel_bonuses_batch(test_db, ids)) == 1
+        assert OptimizedBonusEngine.calculate_unilevel_bonuses_batch(test_db, ids) == []
+        assert test_db.query(Bonus).count() == 3
+        assert find_unprocessed_purchases(test_db, older_than=60) == []
+
+    def test_worker_groups_queue_into_micro_batches(self, test_db, create_user, monkeypatch):
+        """Test that queued purchases are consumed in size-bounded batches."""
+        ids = self._setup(test_db, create_user, monkeypatch, purchases=5)
+        assert find_unprocessed_purchases(test_db, older_than=60) == ids
+
+        queue = _ListQueue()
+        queue.rpush(BONUS_QUEUE_KEY, *ids)
+        worker = BonusBatchWorker(
+            batch_size=3, max_wait=0.05, session_factory=lambda: _Unclosed(test_db), client=queue
+        )
+
+        first = worker.next_batch()
+        assert first == ids[:3]
+        assert worker.process(first) == 3
+        assert worker.process(worker.next_batch()) == 2
+        assert worker.next_batch(block_timeout=0) == []
+        assert worker.batches == 2
+        assert test_db.query(Bonus).count() == 5
+
+    def test_failing_purchase_is_isolated_and_dead_lettered(self, test_db, create_user, monkeypatch):
+        """Test that one bad purchase doesn't block its batch and stops being retried."""
+        ids = self._setup(test_db, create_user, monkeypatch, purchases=3)
+        bad = ids[1]
+        pay = OptimizedBonusEngine.calculate_unilevel_bonuses_batch
+
+        def flaky(db, transaction_ids):
+            if bad in transaction_ids:
+                raise RuntimeError("corrupt purchase")
+            return pay(db, transaction_ids)
+
+        monkeypatch.setattr(OptimizedBonusEngine, "calculate_unilevel_bonuses_batch", staticmethod(flaky))
+        queue = _ListQueue()
+        worker = BonusBatchWorker(
+            batch_size=10, max_wait=0, session_factory=lambda: _Unclosed(test_db), client=queue, max_attempts=2
+        )
+
+        assert worker.process(ids) == 2
+        assert list(queue.items) == [bad]
+        assert queue.hashes[BONUS_ATTEMPTS_KEY] == {str(bad): 1}
+
+        assert worker.process(worker.next_batch(block_timeout=0)) == 0
+        assert list(queue.items) == []
+        assert get_dead_lettered_purchases(queue) == {bad}
+        assert queue.hashes[BONUS_ATTEMPTS_KEY] == {}
+        assert (worker.processed, worker.failed) == (2, 2)
+
+        # The recovery sweep leaves dead-lettered purchases alone
+        assert find_unprocessed_purchases(test_db, older_than=60) == [bad]
+        assert find_unprocessed_purchases(test_db, older_than=60, exclude=get_dead_lettered_purchases(queue)) == []
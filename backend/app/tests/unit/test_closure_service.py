@@ -0,0 +1,55 @@
+import pytest
+from app.models.team import TeamMember
+from app.services.closure_service import add_member_closure, bulk_add_member_closures
+
+def _closure(db, user_id):
+    rows = db.query(TeamMember).filter(TeamMember.user_id == user_id).all()
+    return sorted((row.ancestor_id, row.depth, row.path) for row in rows)
+
+class TestClosureService:
+    """Test suite for the team_members closure writer."""
+
+    def test_add_member_copies_sponsor_ancestors(self, test_db, create_user):
+        """Test that a new member gets a self row plus one row per sponsor ancestor."""
+        root = create_user(test_db)
+        sponsor = create_user(test_db, sponsor_id=root.id)
+        member = create_user(test_db, sponsor_id=sponsor.id)
+
+        add_member_closure(test_db, root.id)
+        add_member_closure(test_db, sponsor.id, root.id)
+        add_member_closure(test_db, member.id, sponsor.id)
+        test_db.commit()
+
+        assert _closure(test_db, member.id) == sorted([
+            (member.id, 0, f"{member.id}"),
+            (sponsor.id, 1, f"{sponsor.id}.{member.id}"),
+            (root.id, 2, f"{root.id}.{sponsor.id}.{member.id}"),
+        ])
+
+    def test_bulk_import_matches_single_inserts(self, test_db, create_user):
+        """Test bulk mode with sponsors both in the tree and later in the batch."""
+        root = create_user(test_db)
+        add_member_closure(test_db, root.id)
+        a = create_user(test_db)
+        b = create_user(test_db)
+        c = create_user(test_db)
+
+        # c is listed before its sponsor b
+        written = bulk_add_member_closures(test_db, [(c.id, b.id), (a.id, root.id), (b.id, a.id)])
+        test_db.commit()
+
+        assert written == 2 + 3 + 4
+        assert _closure(test_db, c.id) == sorted([
+            (c.id, 0, f"{c.id}"),
+            (b.id, 1, f"{b.id}.{c.id}"),
+            (a.id, 2, f"{a.id}.{b.id}.{c.id}"),
+            (root.id, 3, f"{root.id}.{a.id}.{b.id}.{c.id}"),
+        ])
+
+    def test_bulk_import_rejects_unknown_sponsor_and_cycles(self, test_db):
+        """Test that invalid imports fail before writing anything."""
+        with pytest.raises(ValueError):
+            bulk_add_member_closures(test_db, [(1, 999)])
+        with pytest.raises(ValueError):
+            bulk_add_member_closures(test_db, [(1, 2), (2, 1)])
+        assert test_db.query(TeamMember).count() == 0
@@ -0,0 +1,70 @@
+import pytest
+from app.core.config_cache import ConfigCache
+from app.services.config_service import get_config, set_config, delete_config, get_config_bool, get_config_json
+
+class TestConfigCache:
+    """Test suite for the system config cache."""
+    
+    def test_local_hit_skips_loader(self):
+        """Test that a cached value is served without calling the loader again."""
+        cache = ConfigCache(client=None)
+        calls = []
+        
+        def loader():
+            calls.append(1)
+            return "42"
+        
+        assert cache.get("answer", loader) == "42"
+        assert cache.get("answer", loader) == "42"
+        assert len(calls) == 1
+        
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["local_hits"] == 1
+    
+    def test_missing_values_are_cached(self):
+        """Test that absent keys don't hit the loader on every call."""
+        cache = ConfigCache(client=None)
+        calls = []
+        
+        def loader():
+            calls.append(1)
+            return None
+        
+        assert cache.get("absent", loader) is None
+        assert cache.get("absent", loader) is None
+        assert len(calls) == 1
+    
+    def test_invalidate_reloads_and_notifies(self):
+        """Test that invalidation forces a reload and runs listeners."""
+        cache = ConfigCache(client=None)
+        changed = []
+        cache.add_listener(changed.append)
+        
+        cache.get("key", lambda: "old")
+        cache.invalidate("key")
+        
+        assert cache.get("key", lambda: "new") == "new"
+        assert changed == ["key"]
+    
+    def test_lru_eviction(self):
+        """Test that the local tier is bounded."""
+        cache = ConfigCache(client=None, maxsize=2)
+        cache.get("a", lambda: "1")
+        cache.get("b", lambda: "2")
+        cache.get("c", lambda: "3")
+        
+        assert cache.stats()["local_size"] == 2
+    
+    def test_service_write_through(self, test_db):
+        """Test that set_config/delete_config invalidate cached values."""
+        assert get_config(test_db, "unilevel_enabled") is None
+        
+        set_config(test_db, "unilevel_enabled", "true")
+        assert get_config_bool(test_db, "unilevel_enabled") is True
+        
+        set_config(test_db, "unilevel_percentages", "[10, 5]")
+        assert get_config_json(test_db, "unilevel_percentages") == [10, 5]
+        
+        delete_config(test_db, "unilevel_enabled")
+        assert get_config(test_db, "unilevel_enabled", "false") == "false"
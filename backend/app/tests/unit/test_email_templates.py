@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+import time
+from app.core.config import settings
+from app.services.email_service import load_template, send_templated_emails
+from app.services.email_templates import TemplateEngine, TEMPLATES_DIR
+
+class TestEmailTemplates:
+    """Test suite for the compiled email template engine."""
+
+    def test_compiled_render_matches_replace(self):
+        """Test that single-pass rendering keeps CSS braces and unknown placeholders intact."""
+        engine = TemplateEngine(TEMPLATES_DIR)
+        assert engine.load() == len(list(TEMPLATES_DIR.glob("*.html")))
+
+        with open(TEMPLATES_DIR / "team_member_joined.html") as f:
+            expected = f.read()
+        values = {"member_name": "Ada {{team_url}}", "member_email": "ada@example.com", "team_size": 12, "first_line": 3, "team_url": "/team"}
+        for key, value in values.items():
+            expected = expected.replace(f"{{{{{key}}}}}", str(value))
+
+        # The value's own {{team_url}} is not substituted a second time
+        assert engine.render("team_member_joined.html", **values) == expected.replace("Ada /team", "Ada {{team_url}}")
+        assert "{{member_name[0]}}" in expected
+        assert load_template("welcome.html", name="Ada", dashboard_url="/d") == engine.render("welcome.html", name="Ada", dashboard_url="/d")
+
+    def test_auto_reload_and_batch_rendering(self, tmp_path, test_db, monkeypatch):
+        """Test hot reload of an edited template and rendering for many recipients."""
+        path = tmp_path / "note.html"
+        path.write_text("<style>p {color: red}</style><p>Hi {{name}}</p>")
+        engine = TemplateEngine(tmp_path, auto_reload=True, reload_interval=0)
+        engine.load()
+        assert engine.render_many("note.html", [{"name": "A"}, {"name": "B"}]) == [
+            "<style>p {color: red}</style><p>Hi A</p>", "<style>p {color: red}</style><p>Hi B</p>"
+        ]
+
+        path.write_text("<p>Bye {{name}}</p>")
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        assert engine.render("note.html", name="A") == "<p>Bye A</p>"
+
+        outbox = tmp_path / "emails.jsonl"
+        monkeypatch.setattr(settings, "EMAIL_BACKEND", "file")
+        monkeypatch.setattr(settings, "EMAIL_FILE_PATH", str(outbox))
+        recipients = [{"email": f"d{i}@example.com", "user_name": f"D{i}"} for i in range(3)]
+        results = asyncio.run(send_templated_emails(
+            test_db, "kyc_approved.html", "Announcement", recipients, shared={"dashboard_url": "/dashboard"}
+        ))
+
+        sent = [json.loads(line) for line in outbox.read_text().splitlines()]
+        assert results == [True] * 3
+        assert [m["to"] for m in sent] == [["d0@example.com"], ["d1@example.com"], ["d2@example.com"]]
+        assert all("{{" not in m["html"] for m in sent)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import httpx
+from app.core.config import settings
+from app.services.config_service import set_config
+from app.services.email_service import send_bonus_earned_email
+from app.services.email_transport import ResendTransport, FileTransport, get_email_transport
+
+def _message(to):
+    return {"from": "noreply@restempire.com", "to": [to], "subject": "Hi", "html": "<p>Hi</p>"}
+
+class TestEmailTransport:
+    """Test suite for the pooled, batching email transport."""
+
+    def _resend(self, handler, **kwargs):
+        return ResendTransport("re_test", backoff=0, http_transport=httpx.MockTransport(handler), **kwargs)
+
+    def test_concurrent_sends_share_batch_requests(self):
+        """Test that sends issued together go out as batch calls on one client."""
+        requests = []
+        def handler(request):
+            requests.append((request.url.path, json.loads(request.content), request.headers["authorization"]))
+            body = json.loads(request.content)
+            return httpx.Response(200, json={"data": [{"id": str(i)} for i in range(len(body))]} if isinstance(body, list) else {"id": "1"})
+        transport = self._resend(handler)
+        transport.BATCH_LIMIT = 3
+
+        async def run():
+            results = await transport.send_batch([_message(f"u{i}@example.com") for i in range(4)])
+            single = await transport.send(_message("solo@example.com"))
+            await transport.aclose()
+            return results, single
+
+        results, single = asyncio.run(run())
+
+        assert results == [True] * 4 and single is True
+        assert [(path, len(body) if isinstance(body, list) else 1) for path, body, _ in requests] == [
+            ("/emails/batch", 3), ("/emails", 1), ("/emails", 1)
+        ]
+        assert {auth for _, _, auth in requests} == {"Bearer re_test"}
+
+    def test_rate_limited_requests_are_retried(self):
+        """Test that a 429 is retried after Retry-After and a 4xx fails without retrying."""
+        responses = [
+            httpx.Response(429, headers={"retry-after": "0"}, json={"message": "slow down"}),
+            httpx.Response(200, json={"id": "1"}),
+            httpx.Response(422, json={"message": "invalid to"})
+        ]
+        transport = self._resend(lambda request: responses.pop(0))
+
+        async def run():
+            first = await transport.send(_message("a@example.com"))
+            second = await transport.send(_message("bad"))
+            await transport.aclose()
+            return first, second
+
+        assert asyncio.run(run()) == (True, False)
+        assert transport.stats() == {"messages": 2, "requests": 3, "retries": 1, "failed": 1}
+
+    def test_rejected_batch_is_resent_individually(self):
+        """Test that one bad address in a batch fails only its own message."""
+        requests = []
+        def handler(request):
+            body = json.loads(request.content)
+            requests.append(request.url.path)
+            if isinstance(body, list):
+                return httpx.Response(422, json={"message": "invalid to"})
+            if body["to"] == ["bad"]:
+                return httpx.Response(422, json={"message": "invalid to"})
+            return httpx.Response(200, json={"id": "1"})
+        transport = self._resend(handler)
+
+        async def run():
+            results = await transport.send_batch([_message("a@example.com"), _message("bad"), _message("b@example.com")])
+            await transport.aclose()
+            return results
+
+        assert asyncio.run(run()) == [True, False, True]
+        assert requests == ["/emails/batch", "/emails", "/emails", "/emails"]
+        assert transport.stats() == {"messages": 3, "requests": 4, "retries": 0, "failed": 1}
+
+    def test_file_backend_captures_rendered_emails(self, test_db, tmp_path, monkeypatch):
+        """Test that the file sink records what email_service would have sent."""
+        path = tmp_path / "emails.jsonl"
+        monkeypatch.setattr(settings, "EMAIL_BACKEND", "file")
+        monkeypatch.setattr(settings, "EMAIL_FILE_PATH", str(path))
+        set_config(test_db, "from_email", "bonus@restempire.com")
+
+        assert isinstance(get_email_transport(test_db), FileTransport)
+        assert asyncio.run(send_bonus_earned_email("user@example.com", "Unilevel Level 1", 100.0, 250.0, test_db)) is True
+
+        sent = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [(m["from"], m["to"], m["subject"]) for m in sent] == [
+            ("bonus@restempire.com", ["user@example.com"], "💰 Bonus Earned: ₦100.00")
+        ]
+        assert "250.00" in sent[0]["html"]
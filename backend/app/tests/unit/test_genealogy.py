@@ -0,0 +1,171 @@
+from app.core.genealogy import GenealogyIndex
+from app.models.user import User
+from app.services.closure_service import add_member_closure
+
+class _Rows:
+    """Already-fetched query result"""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+class TestGenealogyIndex:
+    """Test suite for the in-memory sponsor tree index."""
+
+    def _build_tree(self, db, create_user):
+        #        root
+        #       /    \
+        #      a      b
+        #     / \
+        #    c   d
+        root = create_user(db)
+        a = create_user(db, sponsor_id=root.id)
+        b = create_user(db, sponsor_id=root.id)
+        c = create_user(db, sponsor_id=a.id)
+        d = create_user(db, sponsor_id=a.id)
+        for user in (root, a, b, c, d):
+            add_member_closure(db, user.id, user.sponsor_id)
+        db.commit()
+        return root, a, b, c, d
+
+    def test_queries_after_load(self, test_db, create_user):
+        """Test ancestor, subtree and level queries against a loaded tree."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        index = GenealogyIndex()
+        assert index.team_size(root.id) is None  # not loaded: caller falls back to SQL
+
+        index.load(test_db)
+
+        assert index.ancestors(c.id) == [(a.id, 1), (root.id, 2)]
+        assert index.ancestors(c.id, max_depth=1) == [(a.id, 1)]
+        assert index.team_size(root.id) == 4
+        assert index.team_size(a.id) == 2
+        assert index.team_size(b.id) == 0
+        assert index.is_in_downline(a.id, d.id) is True
+        assert index.is_in_downline(b.id, d.id) is False
+        assert index.is_in_downline(d.id, d.id) is False
+        assert index.depth_below(root.id, d.id) == 2
+        assert index.level_counts(root.id) == {1: 2, 2: 2}
+        assert sorted(index.downline_ids(root.id, max_depth=1)) == sorted([a.id, b.id])
+
+    def test_new_members_before_and_after_tour_rebuild(self, test_db, create_user):
+        """Test that registrations are visible immediately and survive a rebuild."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        index = GenealogyIndex(rebuild_threshold=100)
+        index.load(test_db)
+
+        e = create_user(test_db, sponsor_id=b.id)
+        f = create_user(test_db, sponsor_id=e.id)
+        index.add_member(e.id, b.id)
+        index.add_member(f.id, e.id)
+
+        assert index.ancestors(f.id) == [(e.id, 1), (b.id, 2), (root.id, 3)]
+        assert index.team_size(root.id) == 6
+        assert index.team_size(b.id) == 2
+        assert index.is_in_downline(b.id, f.id) is True
+        assert index.is_in_downline(a.id, f.id) is False
+        assert index.level_counts(root.id) == {1: 2, 2: 3, 3: 1}
+
+        index._rebuild_tour()
+
+        assert index.stats()["pending_tour_inserts"] == 0
+        assert index.team_size(root.id) == 6
+        assert index.level_counts(b.id) == {1: 1, 2: 1}
+
+    def test_consistency_check_against_closure(self, test_db, create_user):
+        """Test that the checker reports users whose closure rows disagree."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        index = GenealogyIndex()
+        index.load(test_db)
+
+        assert index.check_consistency(test_db)["mismatched_count"] == 0
+
+        # Closure row missing for a user the index knows about
+        from app.models.team import TeamMember
+        test_db.query(TeamMember).filter(
+            TeamMember.user_id == d.id, TeamMember.ancestor_id == root.id
+        ).delete()
+        test_db.commit()
+
+        result = index.check_consistency(test_db)
+        assert result["mismatched"] == [d.id]
+
+    def test_unknown_users_fall_back_to_closure(self, test_db, create_user, monkeypatch):
+        """Test that users the index hasn't heard of are answered from team_members."""
+        from app.services import team_service
+
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        index = GenealogyIndex()
+        index.load(test_db)
+        monkeypatch.setattr(team_service, "genealogy_index", index)
+
+        # Registered by another worker; the events haven't arrived here yet
+        e = create_user(test_db, sponsor_id=c.id)
+        f = create_user(test_db, sponsor_id=e.id)
+        add_member_closure(test_db, e.id, c.id)
+        add_member_closure(test_db, f.id, e.id)
+        test_db.commit()
+
+        assert index.ancestor_path(e.id) is None
+        assert index.team_size(e.id) is None
+        assert index.depth_below(root.id, e.id) is None
+        assert index.downline_ids(e.id) is None
+        assert list(index.ancestor_paths([c.id, e.id])) == [c.id]
+
+        assert team_service.get_team_sizes(test_db, [a.id, e.id]) == {a.id: 2, e.id: 1}
+        assert team_service.get_downline_depths(test_db, root.id, [c.id, e.id]) == {c.id: 2, e.id: 3}
+        assert team_service.get_downline_ids(test_db, e.id) == [f.id]
+
+        # A member whose sponsor is still unknown stays unknown too
+        index.add_member(f.id, e.id, broadcast=False)
+        assert index.ancestors(f.id) is None
+        index.add_member(e.id, c.id, broadcast=False)
+        index.add_member(f.id, e.id, broadcast=False)
+        assert index.ancestors(f.id) == [(e.id, 1), (c.id, 2), (a.id, 3), (root.id, 4)]
+
+    def test_registrations_during_load_are_replayed(self, test_db, create_user):
+        """Test that a member committed after the load's SELECT is not lost."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        e = create_user(test_db, sponsor_id=b.id)
+        index = GenealogyIndex()
+        query = test_db.query
+
+        def select_then_register(*entities):
+            # The SELECT misses e, whose commit event arrives mid-load
+            rows = query(*entities).filter(User.id != e.id)
+            index.add_member(e.id, b.id, broadcast=False)
+            return rows
+
+        test_db.query = select_then_register
+        try:
+            index.load(test_db)
+        finally:
+            del test_db.query
+
+        assert index.ancestors(e.id) == [(b.id, 1), (root.id, 2)]
+        assert index.team_size(b.id) == 1
+
+    def test_invalidation_during_load_is_not_lost(self, test_db, create_user):
+        """Test that a sponsor change invalidated mid-load keeps the old rows from being served."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        index = GenealogyIndex()
+        query = test_db.query
+
+        def select_then_move(*entities):
+            rows = query(*entities).all()
+            # d moves under b after the rows were read
+            index.invalidate(broadcast=False)
+            return _Rows(rows)
+
+        test_db.query = select_then_move
+        try:
+            assert index.load(test_db) is False
+        finally:
+            del test_db.query
+
+        assert index.ready is False
+        assert index.team_size(root.id) is None
+        assert index.load(test_db) is True
+        assert index.team_size(root.id) == 4
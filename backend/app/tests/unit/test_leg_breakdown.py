@@ -0,0 +1,54 @@
+from app.services.closure_service import add_member_closure
+from app.services.team_service import get_leg_breakdown, update_team_turnover
+from app.services.turnover_ledger import record_turnover_delta
+
+class TestLegBreakdown:
+    """Test suite for the set-based first-line leg breakdown."""
+
+    def _build_tree(self, db, create_user):
+        #        root
+        #       /    \
+        #      a      b
+        #     / \
+        #    c   d
+        root = create_user(db)
+        a = create_user(db, sponsor_id=root.id)
+        b = create_user(db, sponsor_id=root.id)
+        c = create_user(db, sponsor_id=a.id)
+        d = create_user(db, sponsor_id=a.id)
+        for user in (root, a, b, c, d):
+            add_member_closure(db, user.id, user.sponsor_id)
+        db.commit()
+        return root, a, b, c, d
+
+    def test_legs_include_whole_subtree(self, test_db, create_user):
+        """Test that each leg sums the personal turnover of its whole subtree."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        update_team_turnover(test_db, a.id, 100)
+        update_team_turnover(test_db, c.id, 300)
+        update_team_turnover(test_db, d.id, 200)
+        update_team_turnover(test_db, b.id, 400)
+
+        breakdown = get_leg_breakdown(test_db, root.id)
+
+        assert [leg.member_id for leg in breakdown.legs] == [a.id, b.id]
+        assert breakdown.first_leg.turnover == 600
+        assert breakdown.first_leg.team_size == 3
+        assert breakdown.second_leg_turnover == 400
+        assert breakdown.other_legs_turnover == 0
+        assert breakdown.total_turnover == 1000
+        assert abs(breakdown.first_leg.percentage - 60) < 0.01
+
+    def test_memoized_until_commit_and_includes_pending(self, test_db, create_user):
+        """Test that the breakdown is shared within a request and refreshed after a commit."""
+        root, a, b, c, d = self._build_tree(test_db, create_user)
+        first = get_leg_breakdown(test_db, root.id)
+        assert get_leg_breakdown(test_db, root.id) is first
+
+        record_turnover_delta(test_db, d.id, 50)
+        test_db.commit()
+
+        breakdown = get_leg_breakdown(test_db, root.id)
+        assert breakdown is not first
+        assert breakdown.first_leg.member_id == a.id
+        assert breakdown.first_leg_turnover == 50
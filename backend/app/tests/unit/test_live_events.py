@@ -0,0 +1,62 @@
+import asyncio
+import json
+from app.core import live_events as live_module
+from app.core.live_events import LiveEventHub
+from app.services.balance_ledger import apply_balance_deltas
+from app.services.notification_service import create_notification
+
+class TestLiveEvents:
+    """Test suite for the server-sent event stream of per-user changes."""
+
+    def test_events_publish_after_commit_only(self, test_db, create_user, monkeypatch):
+        """Test that writes publish small deltas on commit and nothing on rollback."""
+        published = []
+        monkeypatch.setattr(live_module.live_events, "publish", published.extend)
+        user = create_user(test_db)
+
+        apply_balance_deltas(test_db, {user.id: {"NGN": 25}}, "unilevel_bonus")
+        test_db.rollback()
+        assert published == []
+
+        apply_balance_deltas(test_db, {user.id: {"NGN": 25}}, "unilevel_bonus")
+        test_db.commit()
+        create_notification(test_db, user.id, "Bonus Earned!", "You earned 25")
+        user.balance_usdt = 3
+        test_db.commit()
+
+        assert [(e["user_id"], e["type"]) for e in published] == [
+            (user.id, "balance"), (user.id, "notification"), (user.id, "balance")
+        ]
+        assert published[0]["data"] == {"currency": "NGN", "balance": 25.0, "delta": 25.0, "reason": "unilevel_bonus"}
+        assert published[2]["data"] == {"currency": "USDT", "balance": 3.0}
+
+    def test_stream_routes_events_to_the_right_user(self):
+        """Test framing, per-user routing and the resync marker for a stalled stream."""
+        hub = LiveEventHub(client=None, queue_size=2, heartbeat=0.05)
+
+        async def run():
+            mine, theirs = hub.stream(1), hub.stream(2)
+            frames = [await mine.__anext__(), await theirs.__anext__()]
+            assert hub.stats()["streams"] == 2
+
+            hub.publish([{"user_id": 2, "type": "payout", "data": {"id": 9}}])
+            hub.publish([{"user_id": 1, "type": "balance", "data": {"balance": 5.0}}])
+            await asyncio.sleep(0)
+            frames.append(await mine.__anext__())
+            frames.append(await mine.__anext__())  # nothing else queued: heartbeat
+
+            hub.publish([{"user_id": 1, "type": "notification", "data": {"n": n}} for n in range(3)])
+            await asyncio.sleep(0)
+            frames.append(await mine.__anext__())
+
+            await mine.aclose()
+            await theirs.aclose()
+            return frames
+
+        frames = asyncio.run(run())
+
+        assert frames[0].startswith("retry: 5000\nevent: ready")
+        assert frames[2] == f"event: balance\ndata: {json.dumps({'balance': 5.0})}\n\n"
+        assert frames[3] == ": keep-alive\n\n"
+        assert frames[4] == "event: resync\ndata: {}\n\n"
+        assert hub.stats() == {"published": 5, "delivered": 4, "dropped": 1, "streams": 0, "users": 0}
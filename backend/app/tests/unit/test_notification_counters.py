@@ -0,0 +1,101 @@
+from sqlalchemy import event
+from app.core import notification_counters as counters_module
+from app.models.notification import Notification, NotificationType
+from app.services.notification_service import (
+    create_notifications, create_notification, mark_as_read, mark_all_as_read,
+    delete_notification, get_notification_counts, get_unread_count
+)
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client, self.ops = client, []
+
+    def hset(self, key, mapping):
+        self.ops.append(lambda: self.client.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()}))
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        for op in self.ops:
+            op()
+
+class _Redis:
+    """Hash subset of redis-py; the delta script keeps its only-if-present rule."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+
+    def register_script(self, source):
+        def run(keys, args, client):
+            def apply():
+                counts = self.hashes.get(keys[0])
+                if counts is not None:
+                    counts["total"] = str(int(counts["total"]) + args[0])
+                    counts["unread"] = str(int(counts["unread"]) + args[1])
+            client.ops.append(apply)
+        return run
+
+class TestNotificationCounters:
+    """Test suite for batched notification writes and the Redis unread counters."""
+
+    def test_batch_insert_is_one_statement(self, test_db, create_user):
+        """Test that a fan-out is written with one insert and one commit."""
+        users = [create_user(test_db) for _ in range(5)]
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_db.bind, "before_cursor_execute", listener)
+        try:
+            count = create_notifications(test_db, [
+                (user.id, "bonus_earned", {"bonus_type": "Infinity", "amount": 12.5}) for user in users
+            ])
+        finally:
+            event.remove(test_db.bind, "before_cursor_execute", listener)
+
+        assert count == 5
+        assert sum("INSERT INTO notifications" in statement for statement in statements) == 1
+        notification = test_db.query(Notification).filter(Notification.user_id == users[0].id).one()
+        assert (notification.title, notification.message, notification.type) == (
+            "Bonus Earned!", "You earned €12.50 from Infinity bonus", NotificationType.success
+        )
+
+    def test_counters_follow_writes_without_recounting(self, test_db, create_user, monkeypatch):
+        """Test that reads are served from Redis and kept in step by committed changes."""
+        client = _Redis()
+        counters = counters_module.notification_counters
+        monkeypatch.setattr(counters, "client", client)
+        monkeypatch.setattr(counters, "_script", client.register_script(None))
+        user = create_user(test_db)
+        create_notifications(test_db, [(user.id, "rank_achieved", {"rank_name": "Pearl"})] * 3)
+
+        assert get_notification_counts(test_db, user.id) == {"total": 3, "unread": 3}
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_db.bind, "before_cursor_execute", listener)
+        try:
+            first = create_notification(test_db, user.id, "Hi", "there")
+            mark_as_read(test_db, first.id, user.id)
+            mark_as_read(test_db, first.id, user.id)
+            assert get_unread_count(test_db, user.id) == 3
+            delete_notification(test_db, first.id, user.id)
+            assert get_notification_counts(test_db, user.id) == {"total": 3, "unread": 3}
+            mark_all_as_read(test_db, user.id)
+            assert get_notification_counts(test_db, user.id) == {"total": 3, "unread": 0}
+        finally:
+            event.remove(test_db.bind, "before_cursor_execute", listener)
+        assert not any("count(" in statement.lower() for statement in statements)
+
+        create_notifications(test_db, [(user.id, "rank_achieved", {"rank_name": "Ruby"})], commit=False)
+        test_db.rollback()
+        assert get_notification_counts(test_db, user.id) == {"total": 3, "unread": 0}
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from app.models.notification import Notification
+from app.models.outbox import OutboxMessage
+from app.services import email_service
+from app.services.notification_service import notify_rank_achieved
+from app.services.outbox import enqueue_email, dispatch_outbox, outbox_stats
+
+class TestOutbox:
+    """Test suite for the transactional email/notification outbox."""
+
+    def test_rollback_discards_messages(self, test_db, create_user):
+        """Test that messages only exist once the transaction that queued them commits."""
+        user = create_user(test_db)
+        enqueue_email(test_db, "bonus_earned", email=user.email, bonus_type="Rank", amount=10.0, new_balance=10.0)
+        notify_rank_achieved(test_db, user.id, "Pearl")
+        test_db.rollback()
+
+        assert test_db.query(OutboxMessage).count() == 0
+
+        notify_rank_achieved(test_db, user.id, "Pearl")
+        test_db.commit()
+        assert outbox_stats(test_db)["pending"] == 1
+        assert test_db.query(Notification).count() == 0
+
+    def test_dispatch_delivers_batch(self, test_db, create_user, monkeypatch):
+        """Test that one dispatch writes notifications and sends emails."""
+        sent = []
+        async def fake_send(email, bonus_type, amount, new_balance, db):
+            sent.append((email, amount))
+            return True
+        monkeypatch.setattr(email_service, "send_bonus_earned_email", fake_send)
+        user = create_user(test_db)
+        enqueue_email(test_db, "bonus_earned", email=user.email, bonus_type="Rank", amount=10.0, new_balance=10.0)
+        notify_rank_achieved(test_db, user.id, "Pearl")
+        test_db.commit()
+
+        result = dispatch_outbox(test_db)
+
+        assert (result["claimed"], result["sent"], result["failed"]) == (2, 2, 0)
+        assert sent == [(user.email, 10.0)]
+        assert test_db.query(Notification).filter(Notification.user_id == user.id).one().title == "Rank Achievement!"
+        assert dispatch_outbox(test_db)["claimed"] == 0
+
+    def test_failures_back_off_then_give_up(self, test_db, create_user, monkeypatch):
+        """Test that a failing email is retried later and marked failed after the last attempt."""
+        monkeypatch.setattr("app.services.outbox.settings.OUTBOX_MAX_ATTEMPTS", 2)
+        async def broken_send(**kwargs):
+            raise ConnectionError("provider down")
+        monkeypatch.setattr(email_service, "send_bonus_earned_email", broken_send)
+        user = create_user(test_db)
+        message = enqueue_email(test_db, "bonus_earned", email=user.email, bonus_type="Rank", amount=10.0, new_balance=10.0)
+        test_db.commit()
+
+        assert dispatch_outbox(test_db)["failed"] == 1
+        assert (message.status, message.attempts, message.last_error) == ("pending", 1, "provider down")
+        assert message.available_at > datetime.utcnow()
+        assert dispatch_outbox(test_db)["claimed"] == 0  # backing off
+
+        message.available_at = datetime.utcnow() - timedelta(seconds=1)
+        test_db.commit()
+        dispatch_outbox(test_db)
+
+        assert (message.status, message.attempts) == ("failed", 2)
+        assert outbox_stats(test_db)["failed"] == 1
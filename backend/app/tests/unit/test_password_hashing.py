@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import pytest
+from app.core.password_hashing import PasswordHasher, HashingOverloadedError
+
+
+class TestPasswordHasher:
+    """Test suite for the bounded bcrypt worker pool."""
+
+    def test_hash_and_verify(self):
+        """Test sync and async hashing round-trip through the pool."""
+        hasher = PasswordHasher(workers=2, max_pending=4, rounds=4)
+
+        hashed = hasher.hash("SecurePassword123!")
+        assert hasher.verify("SecurePassword123!", hashed)
+        assert not asyncio.run(hasher.verify_async("wrong", hashed))
+        assert hasher.stats()["completed"] == 3
+        assert hasher.stats()["pending"] == 0
+
+    def test_rehash_on_work_factor_change(self):
+        """Test that outdated hashes are upgraded on successful verification."""
+        old = PasswordHasher(workers=1, max_pending=4, rounds=4)
+        new = PasswordHasher(workers=1, max_pending=4, rounds=5)
+        hashed = old.hash("pw")
+
+        assert old.verify_and_update("pw", hashed) == (True, None)
+        assert new.verify_and_update("wrong", hashed) == (False, None)
+
+        verified, new_hash = new.verify_and_update("pw", hashed)
+        assert verified
+        assert new_hash.startswith("$2b$05$")
+        assert not new.needs_rehash(new_hash)
+
+    def test_rejects_when_queue_full(self):
+        """Test admission control once max_pending hashes are queued."""
+        hasher = PasswordHasher(workers=1, max_pending=1, rounds=4)
+        release = threading.Event()
+        blocked = hasher._submit(release.wait)
+
+        with pytest.raises(HashingOverloadedError):
+            hasher.hash("pw")
+
+        release.set()
+        blocked.result()
+        assert hasher.stats()["rejected"] == 1
+        assert hasher.hash("pw")
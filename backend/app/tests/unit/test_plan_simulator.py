@@ -0,0 +1,84 @@
+from datetime import datetime
+from app.models.bonus import Bonus
+from app.models.rank import Rank
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.closure_service import add_member_closure
+from app.services.config_service import set_config
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from app.services.plan_simulator import PlanConfig, load_snapshot, simulate
+
+class TestPlanSimulator:
+    """Test suite for the what-if compensation plan simulator."""
+
+    def _setup(self, db, create_user):
+        for name, level, total, infinity in (("Amber", 1, 0, None), ("Jade", 2, 1500, 1)):
+            db.add(Rank(
+                name=name, level=level, team_turnover_required=total, first_leg_requirement=0,
+                second_leg_requirement=0, other_legs_requirement=0, infinity_bonus_percentage=infinity
+            ))
+        set_config(db, "unilevel_enabled", "true")
+        set_config(db, "unilevel_percentages", "[10, 5, 2]")
+        set_config(db, "rank_bonus_enabled", "true")
+        set_config(db, "rank_bonus_amounts", '{"Jade": 300}')
+        set_config(db, "infinity_enabled", "false")
+
+        users, sponsor = [], None
+        for _ in range(4):
+            user = create_user(db, sponsor_id=sponsor.id if sponsor else None)
+            user.last_activity_date = datetime.utcnow()
+            add_member_closure(db, user.id, user.sponsor_id)
+            users.append(user)
+            sponsor = user
+        users[1].last_activity_date = None
+        db.commit()
+
+        now = datetime.utcnow()
+        purchases = []
+        for buyer, amount in ((users[3], 1000), (users[2], 600)):
+            purchase = Transaction(
+                user_id=buyer.id, transaction_type=TransactionType.purchase, amount=amount,
+                currency="NGN", status=TransactionStatus.completed, completed_at=now
+            )
+            db.add(purchase)
+            purchases.append(purchase)
+        db.commit()
+        return users, purchases, now
+
+    def test_replay_matches_engine_payouts(self, test_db, create_user, monkeypatch):
+        """Test that the replayed unilevel payout equals what the engine pays."""
+        users, purchases, now = self._setup(test_db, create_user)
+        snapshot = load_snapshot(test_db, now.month, now.year)
+        result = simulate(snapshot, PlanConfig.from_db(test_db))
+
+        OptimizedBonusEngine.calculate_unilevel_bonuses_batch(test_db, [p.id for p in purchases])
+        paid = sum(float(b.amount) for b in test_db.query(Bonus).all())
+
+        assert snapshot.purchase_count == 2
+        assert result.purchase_volume == {"NGN": 1600.0}
+        assert result.payouts["unilevel"] == {"NGN": paid}
+        # The top two reach Jade on 1600 of team turnover
+        assert result.promotions == 2
+        assert result.payouts["rank_bonus"] == {"NGN": 600.0}
+        assert result.total_payout == {"NGN": round(paid + 600, 2)}
+        assert result.rank_distribution["Jade"]["users"] == 2
+        assert result.payout_ratio == {"NGN": round((paid + 600) / 1600, 4)}
+
+    def test_candidate_plan_changes_payout(self, test_db, create_user):
+        """Test that candidate percentages, thresholds and infinity are applied without touching the db."""
+        self._setup(test_db, create_user)
+        now = datetime.utcnow()
+        snapshot = load_snapshot(test_db, now.month, now.year)
+        current = PlanConfig.from_db(test_db)
+
+        candidate = current.with_changes({
+            "unilevel": {"percentages": [20, 10, 4]},
+            "infinity_bonus": {"enabled": True},
+            "ranks": [{"name": "Jade", "team_turnover_required": 5000}]
+        })
+        baseline, result = simulate(snapshot, current), simulate(snapshot, candidate)
+
+        assert result.payouts["unilevel"]["NGN"] == baseline.payouts["unilevel"]["NGN"] * 2
+        assert result.promotions == 0
+        assert result.payouts["rank_bonus"] == {}
+        assert result.payouts["infinity"] == {}
+        assert test_db.query(Rank).filter(Rank.name == "Jade").one().team_turnover_required == 1500
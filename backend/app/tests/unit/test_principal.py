@@ -0,0 +1,47 @@
+import pytest
+from app.core.principal import AuthenticatedPrincipal, get_principal
+
+class TestAuthenticatedPrincipal:
+    """Test suite for the slim authenticated principal."""
+    
+    def test_principal_loads_slim_fields(self, test_db, create_user):
+        """Test that the principal carries identity and balance fields."""
+        user = create_user(test_db, email="principal@example.com")
+        test_db.expunge_all()
+        
+        principal = get_principal(test_db, user.id)
+        
+        assert isinstance(principal, AuthenticatedPrincipal)
+        assert principal.id == user.id
+        assert principal.email == "principal@example.com"
+        assert principal.is_active is True
+        assert principal._user is None  # full row not loaded yet
+    
+    def test_principal_is_memoized_per_session(self, test_db, create_user):
+        """Test that one request resolves the principal only once."""
+        user = create_user(test_db)
+        
+        assert get_principal(test_db, user.id) is get_principal(test_db, user.id)
+    
+    def test_unknown_attributes_load_full_row(self, test_db, create_user):
+        """Test lazy fallback to the full User row."""
+        user = create_user(test_db, full_name="Lazy Loader")
+        principal = get_principal(test_db, user.id)
+        
+        assert principal.referral_code == user.referral_code
+        assert principal._user is not None
+    
+    def test_writes_go_to_user_row(self, test_db, create_user):
+        """Test that assigning through the principal updates the database row."""
+        user = create_user(test_db)
+        principal = get_principal(test_db, user.id)
+        
+        principal.full_name = "Renamed"
+        test_db.commit()
+        
+        assert principal.full_name == "Renamed"
+        assert test_db.get(type(user), user.id).full_name == "Renamed"
+    
+    def test_missing_user(self, test_db):
+        """Test that unknown ids resolve to None."""
+        assert get_principal(test_db, 999999) is None
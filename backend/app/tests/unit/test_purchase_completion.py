@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from app.models.activity import ActivityLog
+from app.models.purchase_completion import PurchaseCompletion
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.models.turnover_delta import TurnoverDelta
+from app.services import purchase_completion, transaction_service
+from app.services.purchase_completion import run_purchase_completion, find_due_completions, get_completion_status
+
+class TestPurchaseCompletion:
+    """Test suite for the background purchase completion pipeline."""
+
+    def _complete(self, db, create_user, monkeypatch):
+        dispatched = []
+        monkeypatch.setattr(transaction_service, "dispatch_purchase_completion", lambda tid: dispatched.append(tid) or True)
+        user = create_user(db)
+        transaction = Transaction(
+            user_id=user.id, transaction_type=TransactionType.purchase,
+            amount=500, currency="NGN", status=TransactionStatus.pending
+        )
+        db.add(transaction)
+        db.commit()
+
+        assert transaction_service.complete_purchase_transaction(db, transaction.id) is True
+        assert dispatched == [transaction.id]
+        return transaction
+
+    def test_request_only_records_the_job(self, test_db, create_user, monkeypatch):
+        """Test that completing a purchase defers every step and the job then runs them once."""
+        transaction = self._complete(test_db, create_user, monkeypatch)
+
+        assert transaction.status == TransactionStatus.completed
+        assert test_db.query(TurnoverDelta).count() == 0
+        assert get_completion_status(test_db, transaction)["status"] == "pending"
+        assert find_due_completions(test_db) == [transaction.id]
+
+        completion = run_purchase_completion(test_db, transaction.id)
+
+        assert completion.status == "completed"
+        assert get_completion_status(test_db, transaction)["steps"] == {
+            "turnover": True, "activity": True, "rank": True, "bonuses": True, "log": True
+        }
+        assert test_db.query(TurnoverDelta).filter(TurnoverDelta.transaction_id == transaction.id).count() == 1
+        assert test_db.query(ActivityLog).filter(ActivityLog.action == "purchase_completed").count() == 1
+        assert run_purchase_completion(test_db, transaction.id) is None
+        assert find_due_completions(test_db) == []
+
+    def test_failed_step_retries_from_checkpoint(self, test_db, create_user, monkeypatch):
+        """Test that a failing step backs off and the retry resumes without repeating earlier steps."""
+        transaction = self._complete(test_db, create_user, monkeypatch)
+
+        def broken_rank(db, user_id):
+            raise RuntimeError("rank table locked")
+        monkeypatch.setattr(purchase_completion, "calculate_user_rank", broken_rank)
+        completion = run_purchase_completion(test_db, transaction.id)
+
+        assert (completion.status, completion.attempts) == ("pending", 1)
+        assert completion.completed_steps == ["turnover", "activity"]
+        assert completion.last_error == "rank: rank table locked"
+        assert run_purchase_completion(test_db, transaction.id) is None  # backing off
+
+        monkeypatch.setattr(purchase_completion, "calculate_user_rank", lambda db, user_id: None)
+        test_db.get(PurchaseCompletion, transaction.id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        test_db.commit()
+        completion = run_purchase_completion(test_db, transaction.id)
+
+        assert completion.status == "completed"
+        assert test_db.query(TurnoverDelta).filter(TurnoverDelta.transaction_id == transaction.id).count() == 1
@@ -0,0 +1,55 @@
+from app.models.rank import Rank
+from app.models.activity import ActivityLog
+from app.services.closure_service import add_member_closure
+from app.services.rank_engine import recalculate_ranks
+from app.services.rank_service import check_rank_qualification
+from app.services.team_service import update_team_turnover
+
+def _add_rank(db, name, level, total=0, first=0, second=0, other=0):
+    rank = Rank(
+        name=name, level=level, team_turnover_required=total,
+        first_leg_requirement=first, second_leg_requirement=second,
+        other_legs_requirement=other
+    )
+    db.add(rank)
+    return rank
+
+class TestRankEngine:
+    """Test suite for the batch rank recalculation."""
+
+    def _build_tree(self, db, create_user):
+        root = create_user(db)
+        a = create_user(db, sponsor_id=root.id)
+        b = create_user(db, sponsor_id=root.id)
+        c = create_user(db, sponsor_id=a.id)
+        for user in (root, a, b, c):
+            add_member_closure(db, user.id, user.sponsor_id)
+        db.commit()
+        return root, a, b, c
+
+    def test_batch_matches_per_user_check(self, test_db, create_user):
+        """Test that the batch engine promotes exactly who the per-user check qualifies."""
+        _add_rank(test_db, "Amber", 0)
+        jade = _add_rank(test_db, "Jade", 1, total=500, first=300, second=100)
+        pearl = _add_rank(test_db, "Pearl", 2, total=2000)
+        test_db.commit()
+        root, a, b, c = self._build_tree(test_db, create_user)
+        update_team_turnover(test_db, c.id, 400)
+        update_team_turnover(test_db, b.id, 150)
+
+        assert check_rank_qualification(test_db, root.id, jade)["qualified"] is True
+        assert check_rank_qualification(test_db, root.id, pearl)["qualified"] is False
+        assert check_rank_qualification(test_db, a.id, jade)["qualified"] is False
+
+        result = recalculate_ranks(test_db, award_bonuses=False)
+
+        assert result["ranks_updated"] == 1
+        assert result["changes"] == [(root.id, "Amber", "Jade")]
+        test_db.expire_all()
+        assert root.current_rank == "Jade"
+        assert root.highest_rank_achieved == "Jade"
+        assert a.current_rank == "Amber"
+        assert test_db.query(ActivityLog).filter(ActivityLog.action == "rank_advancement").count() == 1
+
+        # Nothing changes on a second run
+        assert recalculate_ranks(test_db, award_bonuses=False)["ranks_updated"] == 0
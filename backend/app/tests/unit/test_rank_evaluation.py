@@ -0,0 +1,80 @@
+import pytest
+from app.models.bonus import Bonus, BonusType
+from app.models.rank import Rank
+from app.models.user import User
+from app.services.config_service import set_config
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from app.services.closure_service import add_member_closure
+from app.services.rank_service import (
+    evaluate_rank_qualification, calculate_rank_advancement, get_rank_progress
+)
+from app.services.team_service import update_team_turnover
+
+class TestRankEvaluation:
+    """Test suite for single-pass rank qualification."""
+
+    def _setup(self, db, create_user):
+        for name, level, total, first, second in [
+            ("Amber", 0, 0, 0, 0),
+            ("Jade", 1, 500, 300, 100),
+            ("Pearl", 2, 1000, 600, 300),
+            ("Sapphire", 3, 5000, 0, 0),
+        ]:
+            db.add(Rank(
+                name=name, level=level, team_turnover_required=total,
+                first_leg_requirement=first, second_leg_requirement=second,
+                other_legs_requirement=0
+            ))
+        root = create_user(db)
+        a = create_user(db, sponsor_id=root.id)
+        b = create_user(db, sponsor_id=root.id)
+        for user in (root, a, b):
+            add_member_closure(db, user.id, user.sponsor_id)
+        db.commit()
+        update_team_turnover(db, a.id, 700)
+        update_team_turnover(db, b.id, 400)
+        return root
+
+    def test_highest_rank_and_progress_from_one_evaluation(self, test_db, create_user):
+        """Test that one evaluation yields the promotion and next-rank progress."""
+        root = self._setup(test_db, create_user)
+
+        evaluation = evaluate_rank_qualification(test_db, root.id)
+        assert evaluation.highest_qualified_rank.name == "Pearl"
+        assert evaluation.next_rank.name == "Jade"
+
+        assert calculate_rank_advancement(test_db, root.id, evaluation) == "Pearl"
+
+        progress = get_rank_progress(test_db, root.id)
+        assert progress["next_rank"] == "Sapphire"
+        assert progress["total_turnover"] == 1100
+        assert abs(progress["progress_percentage"] - 22) < 0.01
+        assert progress["first_leg_progress"] == 100
+        assert progress["requirements_met"] == {
+            "team_turnover": False, "first_leg": True, "second_leg": True, "other_legs": True
+        }
+
+    def test_single_user_promotion_pays_rank_bonus_atomically(self, test_db, create_user, monkeypatch):
+        """Test that a per-user promotion pays its rank bonus, and both roll back together."""
+        set_config(test_db, "rank_bonus_enabled", "true")
+        set_config(test_db, "rank_bonus_amounts", '{"Pearl": 5000}')
+        root = self._setup(test_db, create_user)
+        pay = OptimizedBonusEngine.calculate_rank_bonuses_batch
+
+        def broken(db, changes, commit=True):
+            pay(db, changes, commit)
+            raise RuntimeError("ledger unavailable")
+
+        monkeypatch.setattr(OptimizedBonusEngine, "calculate_rank_bonuses_batch", staticmethod(broken))
+        with pytest.raises(RuntimeError):
+            calculate_rank_advancement(test_db, root.id)
+        test_db.rollback()
+        assert test_db.get(User, root.id).current_rank == "Amber"
+        assert test_db.query(Bonus).count() == 0
+
+        monkeypatch.setattr(OptimizedBonusEngine, "calculate_rank_bonuses_batch", staticmethod(pay))
+        assert calculate_rank_advancement(test_db, root.id) == "Pearl"
+        test_db.expire_all()
+        bonus = test_db.query(Bonus).one()
+        assert (bonus.user_id, bonus.bonus_type, float(bonus.amount)) == (root.id, BonusType.rank_bonus, 5000)
+        assert test_db.get(User, root.id).highest_rank_achieved == "Pearl"
@@ -0,0 +1,109 @@
+from sqlalchemy import event
+from app.core import rbac
+from app.core.rbac import get_permission_snapshot, invalidate_user_permissions, invalidate_all_permissions, SNAPSHOT_KEY
+from app.models.permission import Permission
+from app.models.role import Role
+from app.models.role_permission import RolePermission
+from app.models.user_role import UserRole
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client, self.ops = client, []
+
+    def incr(self, key):
+        self.ops.append(lambda: self.client.incr(key))
+
+    def delete(self, key):
+        self.ops.append(lambda: self.client.values.pop(key, None))
+
+    def execute(self):
+        for op in self.ops:
+            op()
+
+class _Redis:
+    """String subset of redis-py used by the RBAC cache."""
+
+    def __init__(self):
+        self.values = {}
+
+    def mget(self, *keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+class TestRbacCache:
+    """Test suite for the per-request and shared permission snapshot cache."""
+
+    def _grant(self, db, user, role_name, permission_name):
+        role = Role(name=role_name, display_name=role_name)
+        permission = Permission(name=permission_name, resource=permission_name.split(":")[0], action="read")
+        db.add_all([role, permission])
+        db.flush()
+        db.add_all([RolePermission(role_id=role.id, permission_id=permission.id), UserRole(user_id=user.id, role_id=role.id)])
+        db.commit()
+        return role
+
+    def _count_queries(self, db, func):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.bind, "before_cursor_execute", listener)
+        try:
+            result = func()
+        finally:
+            event.remove(db.bind, "before_cursor_execute", listener)
+        return result, len(statements)
+
+    def test_snapshot_is_memoized_per_session(self, test_db, create_user, monkeypatch):
+        """Test that repeated checks in one request load roles and permissions once."""
+        monkeypatch.setattr(rbac, "redis_client", None)
+        user = create_user(test_db)
+        self._grant(test_db, user, "support", "tickets:read")
+
+        first, first_queries = self._count_queries(test_db, lambda: get_permission_snapshot(test_db, user))
+        second, second_queries = self._count_queries(test_db, lambda: get_permission_snapshot(test_db, user))
+
+        assert first.has_role("support") and first.has_permission("tickets:read")
+        assert second is first
+        assert first_queries > 0 and second_queries == 0
+
+    def test_version_bumps_invalidate_shared_copies(self, test_db, create_user, monkeypatch):
+        """Test that role and assignment changes make cached snapshots stale everywhere."""
+        client = _Redis()
+        monkeypatch.setattr(rbac, "redis_client", client)
+        user = create_user(test_db)
+        role = self._grant(test_db, user, "support", "tickets:read")
+
+        get_permission_snapshot(test_db, user)
+        test_db.info.pop(rbac.SESSION_INFO_KEY)
+        _, queries = self._count_queries(test_db, lambda: get_permission_snapshot(test_db, user))
+        assert queries == 0  # served from Redis
+
+        test_db.query(UserRole).filter(UserRole.user_id == user.id).delete()
+        test_db.commit()
+        invalidate_user_permissions(test_db, user.id)
+        assert not get_permission_snapshot(test_db, user).has_role("support")
+
+        test_db.add(UserRole(user_id=user.id, role_id=role.id))
+        role.is_active = False
+        test_db.commit()
+        invalidate_all_permissions(test_db)
+        snapshot = get_permission_snapshot(test_db, user)
+        assert not snapshot.has_role("support") and snapshot.has_permission("tickets:read")
+
+    def test_corrupt_entry_falls_back_to_database(self, test_db, create_user, monkeypatch):
+        """Test that an unreadable cache entry is rebuilt instead of raising."""
+        client = _Redis()
+        monkeypatch.setattr(rbac, "redis_client", client)
+        user = create_user(test_db)
+        self._grant(test_db, user, "support", "tickets:read")
+        client.values[SNAPSHOT_KEY.format(user_id=user.id)] = "{not json"
+
+        assert get_permission_snapshot(test_db, user).has_permission("tickets:read")
+        assert client.values[SNAPSHOT_KEY.format(user_id=user.id)].startswith('{"v"')
@@ -0,0 +1,115 @@
+from sqlalchemy import event
+from app.models.team_aggregate import TeamAggregate
+from app.services.closure_service import add_member_closure
+from app.services.team_aggregate_service import (
+    get_team_aggregate, get_pending_member_counts, apply_pending_member_deltas, rebuild_team_aggregates
+)
+from app.services.optimized_team_service import OptimizedTeamService
+from app.services.turnover_ledger import record_turnover_delta, apply_pending_deltas
+
+class TestTeamAggregates:
+    """Test suite for incrementally maintained team aggregates."""
+
+    def _register(self, db, create_user, sponsor=None, **kwargs):
+        user = create_user(db, sponsor_id=sponsor.id if sponsor else None, **kwargs)
+        add_member_closure(db, user.id, user.sponsor_id)
+        db.commit()
+        return user
+
+    def test_incremental_updates_match_rebuild(self, test_db, create_user):
+        """Test registration, activity and turnover maintenance against a full rebuild."""
+        root = self._register(test_db, create_user)
+        a = self._register(test_db, create_user, root)
+        b = self._register(test_db, create_user, a)
+        self._register(test_db, create_user, a, is_active=False)
+
+        assert get_team_aggregate(test_db, root.id).team_size == 0
+        assert get_pending_member_counts(test_db, root.id) == {"team_size": 3, "first_line_count": 1, "active_count": 2}
+
+        assert apply_pending_member_deltas(test_db) == 4
+        test_db.expire_all()
+        aggregate = get_team_aggregate(test_db, root.id)
+        assert aggregate.team_size == 3
+        assert aggregate.first_line_count == 1
+        assert aggregate.active_count == 2
+        assert aggregate.max_depth == 2
+        assert aggregate.level_counts == {"1": 1, "2": 2}
+        assert get_pending_member_counts(test_db, root.id)["team_size"] == 0
+
+        b.activity_status = "inactive"
+        test_db.commit()
+        record_turnover_delta(test_db, b.id, 250)
+        test_db.commit()
+        apply_pending_deltas(test_db)
+        test_db.expire_all()
+
+        aggregate = get_team_aggregate(test_db, root.id)
+        assert aggregate.active_count == 1
+        assert float(aggregate.team_turnover) == 250
+        assert float(get_team_aggregate(test_db, a.id).team_turnover) == 250
+
+        result = rebuild_team_aggregates(test_db)
+        assert result == {"rebuilt": 4, "drifted": 0}
+
+    def test_team_stats_include_pending_turnover(self, test_db, create_user):
+        """Test that bulk team stats add turnover still waiting in the ledger."""
+        root = self._register(test_db, create_user)
+        a = self._register(test_db, create_user, root)
+        b = self._register(test_db, create_user, a)
+        apply_pending_member_deltas(test_db)
+        record_turnover_delta(test_db, b.id, 250)
+        test_db.commit()
+
+        assert OptimizedTeamService.get_team_stats_bulk(test_db, root.id)["total_turnover"] == 250
+
+        apply_pending_deltas(test_db)
+        test_db.expire_all()
+        assert OptimizedTeamService.get_team_stats_bulk(test_db, root.id)["total_turnover"] == 250
+
+    def test_registration_does_not_touch_upline_rows(self, test_db, create_user):
+        """Test that registering only appends a delta, and the batch writes each ancestor once."""
+        root = self._register(test_db, create_user)
+        a = self._register(test_db, create_user, root)
+        apply_pending_member_deltas(test_db)
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_db.bind, "before_cursor_execute", listener)
+        try:
+            members = [self._register(test_db, create_user, a) for _ in range(3)]
+        finally:
+            event.remove(test_db.bind, "before_cursor_execute", listener)
+        assert not any("UPDATE team_aggregates" in statement for statement in statements)
+
+        # Activity changes of a pending member ride on its delta
+        members[0].is_active = False
+        test_db.commit()
+        apply_pending_member_deltas(test_db)
+        test_db.expire_all()
+
+        aggregate = get_team_aggregate(test_db, root.id)
+        assert (aggregate.team_size, aggregate.active_count, aggregate.level_counts) == (4, 3, {"1": 1, "2": 3})
+        assert rebuild_team_aggregates(test_db)["drifted"] == 0
+
+    def test_rebuild_creates_missing_rows_and_reports_drift(self, test_db, create_user):
+        """Test that the nightly rebuild backfills and corrects aggregates."""
+        root = self._register(test_db, create_user)
+        self._register(test_db, create_user, root)
+        apply_pending_member_deltas(test_db)
+        test_db.query(TeamAggregate).filter(TeamAggregate.user_id == root.id).update({"team_size": 99})
+        test_db.commit()
+
+        assert rebuild_team_aggregates(test_db, [root.id])["drifted"] == 1
+        test_db.expire_all()
+        assert get_team_aggregate(test_db, root.id).team_size == 1
+
+    def test_rebuild_leaves_pending_registrations_to_the_aggregator(self, test_db, create_user):
+        """Test that a rebuild before the deltas are applied doesn't count members twice."""
+        root = self._register(test_db, create_user)
+        self._register(test_db, create_user, root)
+
+        rebuild_team_aggregates(test_db, [root.id])
+        apply_pending_member_deltas(test_db)
+        test_db.expire_all()
+
+        assert get_team_aggregate(test_db, root.id).team_size == 1
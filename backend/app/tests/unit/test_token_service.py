@@ -0,0 +1,45 @@
+import pytest
+from datetime import timedelta
+from jose import JWTError
+from app.core.token_service import TokenService
+from app.services.config_service import set_config
+
+
+class TestTokenService:
+    """Test suite for the cached token service."""
+
+    def test_token_pair_uses_configured_expiry(self, test_db):
+        """Test that expiry settings are loaded once and reloaded on change."""
+        service = TokenService("secret", "HS256")
+        set_config(test_db, "access_token_expire_minutes", "15")
+
+        access, refresh = service.create_token_pair(42, db=test_db)
+        access_payload = service.verify(access, "access")
+        refresh_payload = service.verify(refresh, "refresh")
+
+        assert access_payload["sub"] == "42"
+        assert access_payload["exp"] - access_payload["iat"] == 15 * 60
+        assert refresh_payload["exp"] - refresh_payload["iat"] == 7 * 24 * 3600
+
+        set_config(test_db, "access_token_expire_minutes", "45")
+        assert service.get_settings(test_db).access_expires == timedelta(minutes=45)
+
+    def test_verify_rejects_wrong_type_and_bad_signature(self):
+        """Test that cached verification still enforces type and signature."""
+        service = TokenService("secret", "HS256")
+        other = TokenService("other-secret", "HS256")
+        access, refresh = service.create_token_pair(1)
+
+        assert service.verify(access)["sub"] == "1"
+        with pytest.raises(JWTError):
+            service.verify(refresh, "access")
+        with pytest.raises(JWTError):
+            other.verify(access)
+
+    def test_expired_token_is_not_served_from_cache(self):
+        """Test that a verified token stops verifying once it expires."""
+        service = TokenService("secret", "HS256")
+        token = service.create_access_token({"sub": "1"}, expires_delta=timedelta(seconds=-1))
+
+        with pytest.raises(JWTError):
+            service.verify(token)
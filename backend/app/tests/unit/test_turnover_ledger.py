@@ -0,0 +1,54 @@
+from app.models.team import TeamMember
+from app.models.turnover_delta import TurnoverDelta
+from app.services.closure_service import add_member_closure
+from app.services.turnover_ledger import (
+    record_turnover_delta, apply_pending_deltas, get_pending_turnover
+)
+
+def _self_row(db, user_id):
+    return db.query(TeamMember).filter(TeamMember.user_id == user_id, TeamMember.depth == 0).one()
+
+class TestTurnoverLedger:
+    """Test suite for the write-behind turnover ledger."""
+
+    def _build_chain(self, db, create_user):
+        root = create_user(db)
+        sponsor = create_user(db, sponsor_id=root.id)
+        buyer = create_user(db, sponsor_id=sponsor.id)
+        add_member_closure(db, root.id)
+        add_member_closure(db, sponsor.id, root.id)
+        add_member_closure(db, buyer.id, sponsor.id)
+        db.commit()
+        return root, sponsor, buyer
+
+    def test_pending_deltas_are_visible_before_apply(self, test_db, create_user):
+        """Test that reads see recorded turnover before the aggregator runs."""
+        root, sponsor, buyer = self._build_chain(test_db, create_user)
+        record_turnover_delta(test_db, buyer.id, 100)
+        record_turnover_delta(test_db, sponsor.id, 40)
+        test_db.commit()
+
+        pending = get_pending_turnover(test_db, [root.id, sponsor.id, buyer.id])
+
+        assert pending[buyer.id] == {"personal": 100.0, "total": 0.0}
+        assert pending[sponsor.id] == {"personal": 40.0, "total": 100.0}
+        assert pending[root.id] == {"personal": 0.0, "total": 140.0}
+        assert float(_self_row(test_db, root.id).total_turnover) == 0
+
+    def test_apply_coalesces_deltas_per_ancestor(self, test_db, create_user):
+        """Test that a batch is folded into team_members and marked applied."""
+        root, sponsor, buyer = self._build_chain(test_db, create_user)
+        record_turnover_delta(test_db, buyer.id, 100)
+        record_turnover_delta(test_db, buyer.id, 50)
+        record_turnover_delta(test_db, buyer.id, -30)
+        test_db.commit()
+
+        assert apply_pending_deltas(test_db) == 3
+        test_db.expire_all()
+
+        assert float(_self_row(test_db, buyer.id).personal_turnover) == 120
+        assert float(_self_row(test_db, sponsor.id).total_turnover) == 120
+        assert float(_self_row(test_db, root.id).total_turnover) == 120
+        assert test_db.query(TurnoverDelta).filter(TurnoverDelta.applied_at.is_(None)).count() == 0
+        assert get_pending_turnover(test_db, [root.id])[root.id]["total"] == 0
+        assert apply_pending_deltas(test_db) == 0
@@ -0,0 +1,84 @@
+from datetime import datetime
+from sqlalchemy import event
+from app.models.bonus import Bonus
+from app.models.outbox import OutboxMessage
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.closure_service import add_member_closure
+from app.services.config_service import set_config
+from app.services.optimized_bonus_engine import (
+    OptimizedBonusEngine, is_unilevel_enabled, get_unilevel_percentages
+)
+
+class TestUnilevelPipeline:
+    """Test suite for the set-based unilevel payout on purchase completion."""
+
+    def _chain(self, db, create_user, length):
+        users, sponsor = [], None
+        for _ in range(length):
+            user = create_user(db, sponsor_id=sponsor.id if sponsor else None)
+            user.last_activity_date = datetime.utcnow()
+            add_member_closure(db, user.id, user.sponsor_id)
+            users.append(user)
+            sponsor = user
+        db.commit()
+        return users
+
+    def _purchase(self, db, buyer):
+        transaction = Transaction(
+            user_id=buyer.id, transaction_type=TransactionType.purchase,
+            amount=1000, currency="NGN", status=TransactionStatus.completed
+        )
+        db.add(transaction)
+        db.commit()
+        return transaction
+
+    def _run(self, db, transaction_id):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.bind, "before_cursor_execute", listener)
+        try:
+            OptimizedBonusEngine.calculate_purchase_unilevel_bonuses(db, transaction_id)
+        finally:
+            event.remove(db.bind, "before_cursor_execute", listener)
+        return len(statements)
+
+    def test_pays_active_upline_and_queues_emails(self, test_db, create_user, monkeypatch):
+        """Test payouts, skipped inactive levels, balances and the queued emails."""
+        set_config(test_db, "unilevel_enabled", "true")
+        set_config(test_db, "unilevel_percentages", "[10, 5, 2]")
+        root, mid, buyer = self._chain(test_db, create_user, 3)
+        mid.last_activity_date = None
+        test_db.commit()
+
+        transaction = self._purchase(test_db, buyer)
+        OptimizedBonusEngine.calculate_purchase_unilevel_bonuses(test_db, transaction.id)
+        test_db.expire_all()
+
+        bonuses = test_db.query(Bonus).all()
+        assert [(b.user_id, b.level, float(b.amount)) for b in bonuses] == [(root.id, 2, 50.0)]
+        assert float(root.balance_ngn) == 50
+        assert float(root.total_earnings) == 50
+        assert test_db.query(Transaction).filter(
+            Transaction.transaction_type == TransactionType.bonus,
+            Transaction.related_transaction_id == transaction.id
+        ).count() == 1
+        queued = test_db.query(OutboxMessage).all()
+        assert [(m.topic, m.payload) for m in queued] == [
+            ("bonus_earned", {"email": root.email, "bonus_type": "Unilevel Level 2", "amount": 50.0, "new_balance": 50.0})
+        ]
+
+    def test_statement_count_does_not_grow_with_depth(self, test_db, create_user, monkeypatch):
+        """Test that a deeper upline runs the same number of statements."""
+        set_config(test_db, "unilevel_enabled", "true")
+        set_config(test_db, "unilevel_percentages", "[10, 5, 2, 1, 1, 1]")
+
+        short = self._chain(test_db, create_user, 3)
+        deep = self._chain(test_db, create_user, 7)
+        # Warm the config cache so both runs see the same lookups
+        is_unilevel_enabled(test_db)
+        get_unilevel_percentages(test_db)
+        short_count = self._run(test_db, self._purchase(test_db, short[-1]).id)
+        deep_count = self._run(test_db, self._purchase(test_db, deep[-1]).id)
+
+        assert test_db.query(Bonus).count() == 2 + 6
+        assert deep_count == short_count
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.core import activity_index as activity_module
+from app.core import genealogy as genealogy_module
+from app.core.activity_index import ActivityIndex
+from app.core.genealogy import GenealogyIndex
+from app.models.bonus import Bonus
+from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.closure_service import add_member_closure
+from app.services.config_service import set_config
+from app.services.optimized_bonus_engine import OptimizedBonusEngine
+from app.services.optimized_team_service import OptimizedTeamService
+
+class _Rows:
+    """Already-fetched query result"""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+class TestUplineCache:
+    """Test suite for cached ancestor paths and the in-memory activity index."""
+
+    def _chain(self, db, create_user, length):
+        users, sponsor = [], None
+        for _ in range(length):
+            user = create_user(db, sponsor_id=sponsor.id if sponsor else None)
+            user.last_activity_date = datetime.utcnow()
+            add_member_closure(db, user.id, user.sponsor_id)
+            users.append(user)
+            sponsor = user
+        db.commit()
+        return users
+
+    def _indexes(self, db, monkeypatch):
+        genealogy, activity = GenealogyIndex(), ActivityIndex()
+        genealogy.load(db)
+        activity.load(db)
+        monkeypatch.setattr(genealogy_module, "genealogy_index", genealogy)
+        monkeypatch.setattr(activity_module, "activity_index", activity)
+        return genealogy, activity
+
+    def test_paths_and_activity_follow_commits(self, test_db, create_user, monkeypatch):
+        """Test cached paths, and that committed activity changes reach the bitmap."""
+        root, a, b, c = self._chain(test_db, create_user, 4)
+        genealogy, activity = self._indexes(test_db, monkeypatch)
+
+        assert list(genealogy.ancestor_path(c.id)) == [b.id, a.id, root.id]
+        assert list(genealogy.ancestor_path(c.id, max_depth=2)) == [b.id, a.id]
+        assert genealogy.ancestor_path(c.id) is genealogy.ancestor_path(c.id)
+        assert activity.active_ids([root.id, a.id, b.id]) == {root.id, a.id, b.id}
+
+        a.activity_status = "inactive"
+        b.last_activity_date = datetime.utcnow() - timedelta(days=45)
+        test_db.commit()
+
+        assert activity.is_active(a.id) is False
+        assert activity.active_since([a.id, b.id], datetime.utcnow() - timedelta(days=30)) == {a.id}
+        assert OptimizedTeamService.get_active_ancestors_batch(test_db, [c.id]) == {c.id: [b.id, root.id]}
+
+        d = create_user(test_db, sponsor_id=c.id)
+        assert activity.is_active(d.id) is True
+
+    def test_unilevel_from_memory_matches_sql(self, test_db, create_user, monkeypatch):
+        """Test that the in-memory upline path pays exactly what the closure join pays, with fewer queries."""
+        set_config(test_db, "unilevel_enabled", "true")
+        set_config(test_db, "unilevel_percentages", "[10, 5, 2, 1]")
+        users = self._chain(test_db, create_user, 5)
+        users[2].last_activity_date = None
+        test_db.commit()
+
+        def purchase():
+            transaction = Transaction(
+                user_id=users[-1].id, transaction_type=TransactionType.purchase,
+                amount=1000, currency="NGN", status=TransactionStatus.completed
+            )
+            test_db.add(transaction)
+            test_db.commit()
+            return transaction.id
+
+        def pay(transaction_id):
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(test_db.bind, "before_cursor_execute", listener)
+            try:
+                OptimizedBonusEngine.calculate_unilevel_bonuses_batch(test_db, [transaction_id])
+            finally:
+                event.remove(test_db.bind, "before_cursor_execute", listener)
+            bonuses = test_db.query(Bonus).filter(Bonus.source_transaction_id == transaction_id).order_by(Bonus.level).all()
+            return [(b.user_id, b.level, float(b.amount)) for b in bonuses], statements
+
+        from_sql, sql_statements = pay(purchase())
+        self._indexes(test_db, monkeypatch)
+        from_memory, memory_statements = pay(purchase())
+
+        assert from_memory == from_sql == [(users[3].id, 1, 100.0), (users[1].id, 3, 20.0), (users[0].id, 4, 10.0)]
+        assert not any("team_members" in statement for statement in memory_statements)
+        assert len(memory_statements) <= len(sql_statements)
+
+    def test_changes_broadcast_without_a_local_index(self, test_db, create_user, monkeypatch):
+        """Test that a process that never loaded the indexes still publishes its writes."""
+        published = []
+
+        class _Redis:
+            def publish(self, channel, message):
+                published.append((channel, message))
+
+        genealogy, activity = GenealogyIndex(client=_Redis()), ActivityIndex(client=_Redis())
+        monkeypatch.setattr(genealogy_module, "genealogy_index", genealogy)
+        monkeypatch.setattr(activity_module, "activity_index", activity)
+
+        root = create_user(test_db)
+        published.clear()
+        a = create_user(test_db, sponsor_id=root.id)
+        root.activity_status = "inactive"
+        test_db.commit()
+
+        assert (genealogy_module.EVENTS_CHANNEL, f"add:{a.id}:{root.id}") in published
+        assert any(channel == activity_module.EVENTS_CHANNEL and message.startswith(f"set:{root.id}:0:")
+                   for channel, message in published)
+        assert genealogy.team_size(root.id) is None and activity.is_active(root.id) is None
+
+    def test_activity_updates_during_load_are_replayed(self, test_db, create_user):
+        """Test that an activity change committed after the load's SELECT is kept."""
+        user = create_user(test_db)
+        user.activity_status = "inactive"
+        test_db.commit()
+        activity = ActivityIndex()
+        query = test_db.query
+
+        def select_then_update(*entities):
+            rows = query(*entities).all()
+            activity.update(user.id, True, 1700000000, broadcast=False)
+            return _Rows(rows)
+
+        test_db.query = select_then_update
+        try:
+            activity.load(test_db)
+        finally:
+            del test_db.query
+
+        assert activity.is_active(user.id) is True
+        assert activity.active_since([user.id], datetime(2023, 1, 1)) == {user.id}
@@ -0,0 +1,17 @@
+-- Audit trail for batched balance updates: one row per (user, currency)
+-- delta applied by app.services.balance_ledger, with the resulting balance.
+
+CREATE TABLE IF NOT EXISTS balance_ledger (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    currency VARCHAR NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL,
+    balance_after NUMERIC(10, 2),
+    reason VARCHAR NOT NULL,
+    reference_id INTEGER,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_balance_ledger_user_id ON balance_ledger(user_id);
+CREATE INDEX IF NOT EXISTS ix_balance_ledger_reason ON balance_ledger(reason);
+CREATE INDEX IF NOT EXISTS ix_balance_ledger_created_at ON balance_ledger(created_at);
@@ -0,0 +1,18 @@
+-- One row per periodic bonus payout (bonus type + period). Guards against
+-- paying a month twice and stores the checkpoint a crashed run resumes from.
+
+CREATE TABLE IF NOT EXISTS bonus_runs (
+    id SERIAL PRIMARY KEY,
+    bonus_type VARCHAR NOT NULL,
+    period VARCHAR NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'running',
+    base_amount NUMERIC(14, 2),
+    checkpoint_user_id INTEGER NOT NULL DEFAULT 0,
+    users_paid INTEGER NOT NULL DEFAULT 0,
+    total_amount NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    completed_at TIMESTAMP,
+    CONSTRAINT uq_bonus_runs_type_period UNIQUE (bonus_type, period)
+);
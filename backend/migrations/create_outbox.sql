@@ -0,0 +1,18 @@
+-- Transactional outbox: emails and notifications are inserted in the same
+-- transaction as the balance or status change that triggers them, and a
+-- background dispatcher sends them in batches.
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR NOT NULL,
+    topic VARCHAR NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at TIMESTAMP DEFAULT NOW(),
+    created_at TIMESTAMP DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_status_available ON outbox (status, available_at);
@@ -0,0 +1,16 @@
+-- Exactly-once marker for unilevel bonus payouts. The bonus engine inserts
+-- the marker in the same database transaction as the bonuses; a purchase
+-- whose marker already exists is skipped.
+
+CREATE TABLE IF NOT EXISTS processed_purchases (
+    transaction_id INTEGER PRIMARY KEY REFERENCES transactions(id),
+    processed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Purchases completed before the bonus worker existed were paid by the
+-- synchronous path; mark them so the recovery sweep never pays them again.
+INSERT INTO processed_purchases (transaction_id, processed_at)
+SELECT id, COALESCE(completed_at, NOW())
+FROM transactions
+WHERE transaction_type = 'purchase' AND status IN ('completed', 'cancelled')
+ON CONFLICT (transaction_id) DO NOTHING;
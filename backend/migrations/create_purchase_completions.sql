@@ -0,0 +1,18 @@
+-- One row per completed purchase: the follow-up steps (turnover, activity,
+-- rank, bonuses, activity log) run in the background and record progress
+-- here so a failed or interrupted run resumes at the next step.
+
+CREATE TABLE IF NOT EXISTS purchase_completions (
+    transaction_id INTEGER PRIMARY KEY REFERENCES transactions(id) ON DELETE CASCADE,
+    status VARCHAR NOT NULL DEFAULT 'pending',
+    completed_steps JSON NOT NULL DEFAULT '[]',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP DEFAULT NOW(),
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_purchase_completions_due
+    ON purchase_completions (status, next_attempt_at);
@@ -0,0 +1,16 @@
+-- Write-behind registrations for team_aggregates.
+-- A registration inserts one delta; the aggregator task counts pending
+-- deltas into every upline aggregate in batches and stamps applied_at.
+
+CREATE TABLE IF NOT EXISTS team_aggregate_deltas (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    active INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    applied_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_team_aggregate_deltas_user_id ON team_aggregate_deltas(user_id);
+
+-- Pending deltas only; keeps the aggregator scan and read-side lookups small
+CREATE INDEX IF NOT EXISTS idx_team_aggregate_deltas_pending ON team_aggregate_deltas(id) WHERE applied_at IS NULL;
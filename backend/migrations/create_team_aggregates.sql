@@ -0,0 +1,17 @@
+-- Precomputed downline statistics for /team/stats and the dashboards.
+-- Maintained incrementally on registration, activation changes and turnover
+-- application; rebuilt nightly by the rebuild_team_aggregates task.
+
+CREATE TABLE IF NOT EXISTS team_aggregates (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    team_size INTEGER NOT NULL DEFAULT 0,
+    first_line_count INTEGER NOT NULL DEFAULT 0,
+    active_count INTEGER NOT NULL DEFAULT 0,
+    team_turnover NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    max_depth INTEGER NOT NULL DEFAULT 0,
+    level_counts JSON NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT NOW(),
+    rebuilt_at TIMESTAMP
+);
+
+-- Populate with: from app.tasks.bonus_tasks import rebuild_team_aggregates; rebuild_team_aggregates()
@@ -0,0 +1,17 @@
+-- Append-only turnover ledger for write-behind team turnover updates.
+-- Purchases insert a delta; the aggregator task folds pending deltas into
+-- team_members in batches and stamps applied_at.
+
+CREATE TABLE IF NOT EXISTS turnover_deltas (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    amount NUMERIC(12, 2) NOT NULL,
+    transaction_id INTEGER REFERENCES transactions(id),
+    created_at TIMESTAMP DEFAULT NOW(),
+    applied_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_turnover_deltas_user_id ON turnover_deltas(user_id);
+
+-- Pending deltas only; keeps the aggregator scan and read-side lookups small
+CREATE INDEX IF NOT EXISTS idx_turnover_deltas_pending ON turnover_deltas(id) WHERE applied_at IS NULL;